@@ -0,0 +1,429 @@
+# Benchmarks/Bench_Parsers.py
+
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import platform
+
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable, Iterator, Tuple
+
+from Libraries import Common_Helpers as helpers
+from Libraries import Flow_Base
+from Libraries import Flow_Reasoning as flow_reason
+from Libraries import Tools_Json_Repair
+
+from . import Legacy_Parsers
+from .Bench_Pipeline import ROOT, REPORT_DIR, _git_revision
+
+# ==============================
+
+# Bench_Parsers.py
+# Corpus + benchmark cho các parser JSON, dựng từ lịch sử đã chạy (Output/Histories-*.json):
+#   1) extract : lấy output của reasoner (chuỗi JSON "reasoning") và critic (evaluation + feedback)
+#   2) corrupt : thêm biến thể hỏng có seed (cắt cụt, code fence, nháy cong, key trùng, ...)
+#   3) bench   : chạy mọi parser trên corpus → parses/s, tỉ lệ thành công, độ khớp từng trường
+# Corpus là JSONL có phiên bản (dòng đầu = header: version, seed, sha256 file nguồn),
+# sinh lại được bất cứ lúc nào → không commit; báo cáo lưu vào Reports/Benchmarks.
+#
+# Lưu ý: lịch sử chỉ giữ output đã chuẩn hoá (không phải text thô của model);
+# critic được dựng lại thành JSON {"scoring", "feedback_text"} như model trả về.
+#
+#   python -m Benchmarks.Bench_Parsers --build
+#   python -m Benchmarks.Bench_Parsers --kind critic --repeat 5
+
+CORPUS_VERSION = 1
+CORPUS_DIR = ROOT / "Output" / "Corpus"
+HISTORY_FILES = [
+    ROOT / "Output" / "Histories-Batch-EN-calced.json",
+    ROOT / "Output" / "Histories-Batch-EN-merged.json",
+]
+
+KINDS = ("reasoning", "critic")
+FIELDS: Dict[str, List[str]] = {
+    "reasoning": list(Tools_Json_Repair.REASONING_FIELDS) + ["summary"],
+    "critic": list(Tools_Json_Repair.SCORE_KEYS) + ["feedback_text"],
+}
+# Trường chính: rỗng → coi như parse thất bại
+PRIMARY_FIELD = {"reasoning": "summary", "critic": "feedback_text"}
+
+# Chỉ số dùng để so sánh: (tên, cao hơn là tốt?)
+COMPARE_METRICS = [
+    ("parses_per_s", True),
+    ("success_rate", True),
+    ("agreement", True),
+]
+
+
+# ---------------- EXTRACT ----------------
+def iter_rounds(path: Path) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(key bài, record vòng) cho cả hai định dạng: {index_N: [rounds]} và {index_N: {"rounds": [...]}}."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    for key, entry in data.items():
+        rounds = entry.get("rounds") if isinstance(entry, dict) else entry
+        if not isinstance(rounds, list):
+            continue    # __GLOBAL_SUMMARY__, ...
+        for rec in rounds:
+            if isinstance(rec, dict):
+                yield key, rec
+
+def extract_responses(paths: List[Path]) -> List[Dict[str, Any]]:
+    """Output sạch (JSON hợp lệ) của reasoner/critic; trùng nội dung chỉ giữ một."""
+    out: List[Dict[str, Any]] = []
+    seen: set = set()
+
+    def _add(rid: str, kind: str, raw: str):
+        digest = hashlib.sha1(f"{kind}:{raw}".encode("utf-8")).hexdigest()
+        if digest not in seen:
+            seen.add(digest)
+            out.append({"id": rid, "kind": kind, "raw": raw})
+
+    for path in paths:
+        for key, rec in iter_rounds(path):
+            rid = f"{path.stem}:{key}:{rec.get('round', '')}"
+            reasoning = rec.get("reasoning")
+            if isinstance(reasoning, str) and reasoning.strip():
+                _add(rid, "reasoning", reasoning)
+            scoring = helpers.parse_evaluation(rec.get("evaluation"))
+            if scoring:
+                feedback = rec.get("feedback")
+                obj = {"scoring": scoring, "feedback_text": feedback if isinstance(feedback, str) else ""}
+                _add(rid, "critic", json.dumps(obj, ensure_ascii=False, indent=2))
+    return out
+
+
+# ---------------- EXPECTED / FIELDS ----------------
+def _canon(v: Any) -> Any:
+    """So sánh theo nội dung: bỏ khác biệt khoảng trắng; điểm giữ nguyên số."""
+    if isinstance(v, bool) or v is None:
+        return v
+    if isinstance(v, (int, float)):
+        return v
+    if isinstance(v, (list, tuple)):
+        return [_canon(x) for x in v]
+    return " ".join(str(v).split())
+
+def fields_of(kind: str, obj: Any) -> Dict[str, Any]:
+    """Kết quả parser (lồng hoặc phẳng) → {trường: giá trị}; thiếu → None."""
+    if not isinstance(obj, dict):
+        return {f: None for f in FIELDS[kind]}
+    nested = obj.get("reasoning" if kind == "reasoning" else "scoring")
+    nested = nested if isinstance(nested, dict) else {}
+    out = {}
+    for f in FIELDS[kind]:
+        v = nested.get(f, obj.get(f))
+        out[f] = _canon(v)
+    return out
+
+
+# ---------------- CORRUPTIONS ----------------
+def _truncate(raw: str, rng: random.Random) -> str:
+    return raw[: max(1, int(len(raw) * rng.uniform(0.5, 0.95)))]
+
+def _fence(raw: str, rng: random.Random) -> str:
+    # đôi khi thiếu fence đóng (model dừng ngay sau JSON)
+    return "```json\n" + raw + ("\n```" if rng.random() < 0.7 else "")
+
+def _smart_quotes(raw: str, rng: random.Random) -> str:
+    parts = raw.split('"')
+    return "".join(p + ("“" if i % 2 == 0 else "”") for i, p in enumerate(parts[:-1])) + parts[-1]
+
+def _duplicate_key(raw: str, rng: random.Random) -> str:
+    # key trùng đứng trước → json.loads giữ giá trị sau (= giá trị đúng)
+    key = rng.choice(["summary", "feedback_text"] if '"summary"' not in raw else ["summary"])
+    return raw.replace("{", '{"%s": "draft", ' % key, 1)
+
+def _trailing_comma(raw: str, rng: random.Random) -> str:
+    return raw.replace("\n}", ",\n}").replace('"\n  }', '",\n  }')
+
+def _prose(raw: str, rng: random.Random) -> str:
+    return rng.choice(["Sure! Here is the JSON:\n", "Kết quả:\n", "Output:\n"]) + raw + "\nHope this helps."
+
+def _single_quotes(raw: str, rng: random.Random) -> str:
+    return raw.replace('"', "'")
+
+CORRUPTIONS: Dict[str, Callable[[str, random.Random], str]] = {
+    "truncate": _truncate,
+    "fence": _fence,
+    "smart_quotes": _smart_quotes,
+    "duplicate_key": _duplicate_key,
+    "trailing_comma": _trailing_comma,
+    "prose": _prose,
+    "single_quotes": _single_quotes,
+}
+
+
+# ---------------- CORPUS ----------------
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def corpus_path(version: int = CORPUS_VERSION, out_dir: Path = CORPUS_DIR) -> Path:
+    return Path(out_dir) / f"parsers-v{version}.jsonl"
+
+def build_corpus(paths: Optional[List[Path]] = None,
+                 seed: int = 0,
+                 variants: int = 1) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Mỗi output sạch → 1 bản "clean" + `variants` bản hỏng (xoay vòng qua CORRUPTIONS).
+    expected = trường của bản sạch (json.loads) → mọi biến thể so với cùng đáp án.
+    """
+    paths = [Path(p) for p in (paths or HISTORY_FILES) if Path(p).exists()]
+    rng = random.Random(seed)
+    names = list(CORRUPTIONS)
+    records: List[Dict[str, Any]] = []
+    i = 0
+    for item in extract_responses(paths):
+        try:
+            expected = fields_of(item["kind"], json.loads(item["raw"]))
+        except json.JSONDecodeError:
+            continue
+        records.append({**item, "variant": "clean", "expected": expected})
+        for _ in range(max(0, variants)):
+            name = names[i % len(names)]
+            i += 1
+            records.append({**item, "id": f"{item['id']}~{name}", "variant": name,
+                            "raw": CORRUPTIONS[name](item["raw"], rng), "expected": expected})
+    header = {
+        "corpus_version": CORPUS_VERSION,
+        "seed": seed,
+        "variants": variants,
+        "sources": {p.name: _sha256(p) for p in paths},
+        "count": len(records),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return header, records
+
+def save_corpus(header: Dict[str, Any], records: List[Dict[str, Any]], path: Optional[Path] = None) -> Path:
+    path = Path(path or corpus_path(header["corpus_version"]))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"header": header}, ensure_ascii=False) + "\n")
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    return path
+
+def load_corpus(path: Path) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        header = json.loads(f.readline()).get("header", {})
+        if header.get("corpus_version") != CORPUS_VERSION:
+            raise ValueError(f"Corpus {path} has version {header.get('corpus_version')}, "
+                             f"expected {CORPUS_VERSION}; rebuild with --build")
+        records = [json.loads(line) for line in f if line.strip()]
+    return header, records
+
+
+# ---------------- PARSERS ----------------
+_BASE = Flow_Base.FlowBase(client=lambda prompt, **kw: "")
+_REASON = flow_reason.ReasoningFlow(client=lambda prompt, **kw: "")
+
+def _first_json(raw: str) -> Optional[Dict[str, Any]]:
+    # FlowBase.extract_first_json + json.loads (không sửa lỗi)
+    try:
+        return _BASE.parse_first_json(raw)
+    except Flow_Base.FlowError:
+        return None
+
+def _critic_strict(raw: str) -> Optional[Dict[str, Any]]:
+    # mốc "không sửa": JSON hợp lệ, đủ 6 điểm nguyên 1–5 (vd. decode có grammar)
+    res = Tools_Json_Repair.parse_critic(raw)
+    return res.value if res.clean else None
+
+PARSERS: Dict[str, Dict[str, Callable[[str], Any]]] = {
+    "reasoning": {
+        "legacy_regex": Legacy_Parsers.parse_reasoning_legacy,
+        "json_repair": lambda raw: Tools_Json_Repair.parse_reasoning(raw).value,
+        "reasoning_flow": _REASON._parse_best_json,
+        "extract_first_json": _first_json,
+    },
+    "critic": {
+        "legacy_regex": Legacy_Parsers.sanitize_and_parse_critic_legacy,
+        "json_repair": lambda raw: Tools_Json_Repair.parse_critic(raw).value,
+        "critic_strict": _critic_strict,
+        "extract_first_json": _first_json,
+    },
+}
+
+
+# ---------------- BENCH ----------------
+def _time_parser(fn: Callable[[str], Any], raws: List[str], repeat: int) -> float:
+    """Thời gian tốt nhất qua `repeat` lượt (giây)."""
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        for raw in raws:
+            try:
+                fn(raw)
+            except Exception:
+                pass
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def bench_parser(kind: str, fn: Callable[[str], Any], records: List[Dict[str, Any]], repeat: int = 3) -> Dict[str, Any]:
+    fields = FIELDS[kind]
+    primary = PRIMARY_FIELD[kind]
+    ok = errors = 0
+    agree = {f: 0 for f in fields}
+    by_variant: Dict[str, List[int]] = {}      # variant → [số bản ghi, thành công, trường khớp]
+
+    for rec in records:
+        try:
+            got = fields_of(kind, fn(rec["raw"]))
+        except Exception:
+            errors += 1
+            got = fields_of(kind, None)
+        success = bool(got.get(primary))
+        matched = [f for f in fields if got[f] == rec["expected"].get(f)]
+        ok += success
+        for f in matched:
+            agree[f] += 1
+        row = by_variant.setdefault(rec["variant"], [0, 0, 0])
+        row[0] += 1
+        row[1] += success
+        row[2] += len(matched)
+
+    n = len(records) or 1
+    seconds = _time_parser(fn, [r["raw"] for r in records], repeat)
+    field_agreement = {f: round(agree[f] / n, 4) for f in fields}
+    return {
+        "records": len(records),
+        "parses_per_s": round(len(records) / seconds, 1) if seconds > 0 else 0.0,
+        "success_rate": round(ok / n, 4),
+        "exceptions": errors,
+        "agreement": round(sum(agree.values()) / (n * len(fields)), 4),
+        "field_agreement": field_agreement,
+        "by_variant": {v: {"records": c, "success_rate": round(s / c, 4),
+                           "agreement": round(m / (c * len(fields)), 4)}
+                       for v, (c, s, m) in sorted(by_variant.items())},
+    }
+
+def run_suite(records: List[Dict[str, Any]],
+              header: Dict[str, Any],
+              kinds: Optional[List[str]] = None,
+              parsers: Optional[List[str]] = None,
+              repeat: int = 3) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        "meta": {
+            "scenario": "parsers",
+            "corpus": header,
+            "repeat": repeat,
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {},
+    }
+    for kind in kinds or list(KINDS):
+        subset = [r for r in records if r["kind"] == kind]
+        for name, fn in PARSERS[kind].items():
+            if parsers and name not in parsers:
+                continue
+            print(f"⏱️ {kind}/{name} ({len(subset)} bản ghi) ...")
+            result = bench_parser(kind, fn, subset, repeat)
+            report["results"][f"{kind}/{name}"] = result
+            print(f"   {result['parses_per_s']} parses/s · thành công {result['success_rate']:.2%} · "
+                  f"khớp {result['agreement']:.2%}")
+    return report
+
+
+# ---------------- REPORT ----------------
+def save_report(report: Dict[str, Any], out_dir: Path = REPORT_DIR) -> Path:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = out_dir / f"parsers-{stamp}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+def latest_report(out_dir: Path, exclude: Optional[Path] = None) -> Optional[Path]:
+    paths = sorted(p for p in Path(out_dir).glob("parsers-*.json") if p != exclude)
+    return paths[-1] if paths else None
+
+def compare_reports(current: Dict[str, Any], previous: Dict[str, Any], threshold: float = 0.10) -> Dict[str, Any]:
+    """
+    parses/s: regression khi chậm đi quá threshold (tương đối).
+    success_rate / agreement: regression khi giảm bất kỳ (corpus cùng phiên bản) — độ chính xác không được đổi lấy tốc độ.
+    """
+    out: Dict[str, Any] = {"baseline_revision": previous.get("meta", {}).get("revision", ""), "parsers": {},
+                           "regressions": []}
+    same_corpus = (current.get("meta", {}).get("corpus", {}).get("sources")
+                   == previous.get("meta", {}).get("corpus", {}).get("sources"))
+    for name, cur in current.get("results", {}).items():
+        prev = previous.get("results", {}).get(name)
+        if not prev:
+            continue
+        rows = {}
+        for metric, higher_better in COMPARE_METRICS:
+            a, b = prev.get(metric), cur.get(metric)
+            if a is None or b is None:
+                continue
+            change = (b - a) / a if a else (0.0 if b == a else float("inf"))
+            rows[metric] = {"before": a, "after": b, "change": round(change, 4)}
+            if metric == "parses_per_s":
+                if -change > threshold:
+                    out["regressions"].append(f"{name}.{metric}: {a} → {b} ({change:+.1%})")
+            elif same_corpus and b < a:
+                out["regressions"].append(f"{name}.{metric}: {a} → {b}")
+        out["parsers"][name] = rows
+    return out
+
+def _print_table(report: Dict[str, Any]):
+    print(f"\n{'parser':<32}{'parses/s':>12}{'success':>10}{'agree':>10}")
+    for name, r in report["results"].items():
+        print(f"{name:<32}{r['parses_per_s']:>12}{r['success_rate']:>10.2%}{r['agreement']:>10.2%}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m Benchmarks.Bench_Parsers",
+                                     description="Benchmark các parser JSON trên corpus dựng từ lịch sử.")
+    parser.add_argument("--history", type=Path, action="append", help="file lịch sử (mặc định: Output/Histories-Batch-EN-*)")
+    parser.add_argument("--corpus", type=Path, help=f"file corpus (mặc định: {corpus_path().relative_to(ROOT)})")
+    parser.add_argument("--build", action="store_true", help="dựng lại corpus từ lịch sử")
+    parser.add_argument("--variants", type=int, default=1, help="số bản hỏng cho mỗi output sạch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--kind", action="append", choices=list(KINDS))
+    parser.add_argument("--parser", action="append", help="chỉ chạy parser có tên này (lặp lại được)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", type=Path, default=REPORT_DIR)
+    parser.add_argument("--compare", type=Path, help="báo cáo để so sánh (mặc định: báo cáo parsers trước)")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    path = args.corpus or corpus_path()
+    if args.build or not path.exists():
+        header, records = build_corpus(args.history, seed=args.seed, variants=args.variants)
+        if not records:
+            print("❌ Không có output nào trong file lịch sử.")
+            return 1
+        save_corpus(header, records, path)
+        print(f"📦 Corpus v{CORPUS_VERSION}: {len(records)} bản ghi → {path}")
+    header, records = load_corpus(path)
+
+    report = run_suite(records, header, args.kind, args.parser, args.repeat)
+    _print_table(report)
+    baseline = args.compare or latest_report(args.out)
+    if baseline and baseline.exists():
+        with open(baseline, "r", encoding="utf-8") as f:
+            report["comparison"] = compare_reports(report, json.load(f), args.threshold)
+        report["comparison"]["baseline"] = str(baseline)
+
+    out = save_report(report, args.out)
+    print(f"💾 Báo cáo: {out}")
+
+    regressions = report.get("comparison", {}).get("regressions", [])
+    for r in regressions:
+        print(f"⚠️ Regression: {r}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
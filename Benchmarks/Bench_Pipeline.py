@@ -0,0 +1,453 @@
+# Benchmarks/Bench_Pipeline.py
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable
+
+from Libraries import Client_Llama
+from Libraries import Client_Retry
+from Libraries import Flow_Base
+from Libraries import Flow_Reasoning as flow_reason
+from Libraries import Flow_Critical as flow_critic
+from Libraries import Flow_Main as flow_main
+from Libraries import Flow_Scheduler as flow_sched
+from Libraries import Tools_Json_Repair
+
+from .Fake_Llama_Server import FakeLlamaServer
+
+# ==============================
+
+# Bench_Pipeline.py
+# Đo pipeline trên CPU với FakeLlamaServer (không cần GPU / model thật):
+#   client    : LocalLlamaClient gọi thẳng /completion
+#   reasoning : ReasoningFlow.run_reason_or_refine
+#   critic    : CriticalFlow.run_critic
+#   pipeline  : MainFlow.arun nhiều vòng qua Flow_Scheduler (nhiều bài song song)
+# Báo cáo: samples/s, latency p50/p95, overhead phía Python / request (latency − thời gian server bận),
+# tỉ lệ parse thất bại; lưu JSON vào Reports/Benchmarks để so sánh giữa các phiên bản.
+
+ROOT = Path(__file__).resolve().parents[1]
+REPORT_DIR = ROOT / "Reports" / "Benchmarks"
+
+# Kịch bản server giả lập
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "baseline": {"latency": 0.02, "token_rate": 4000, "slots": 4},
+    "slow":     {"latency": 0.10, "token_rate": 400, "slots": 2},
+    "faulty":   {"latency": 0.02, "token_rate": 4000, "slots": 4, "fail_rate": 0.05, "garbage_rate": 0.15},
+    "faulty_nogrammar": {"latency": 0.02, "token_rate": 4000, "slots": 4, "fail_rate": 0.05,
+                         "garbage_rate": 0.15, "grammar": False},
+}
+
+# Chỉ số dùng để so sánh: (đường dẫn, cao hơn là tốt?)
+COMPARE_METRICS = [
+    ("ops_per_s", True),
+    ("latency.p50_ms", False),
+    ("latency.p95_ms", False),
+    ("overhead_ms", False),
+    ("parse_failure_rate", False),
+]
+
+GEN_PARAMS = {"max_new_tokens": 512, "temperature": 0.7, "top_p": 0.9}
+
+_WORDS = ("city council budget project report growth market price company river school hospital "
+          "energy policy minister weather storm vaccine study export rice coffee bank rate").split()
+
+def make_articles(n: int, words: int = 220, seed: int = 0) -> List[str]:
+    """Bài viết tổng hợp, tất định (có số liệu/ngày tháng như bài báo thật)."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        body = []
+        for j in range(words):
+            body.append(str(rng.randint(1, 2025)) if j % 17 == 5 else rng.choice(_WORDS))
+            if j % 19 == 18:
+                body[-1] += "."
+        out.append(f"Article {i}: " + " ".join(body) + ".")
+    return out
+
+def load_prompts(lang: str = "EN") -> Dict[str, str]:
+    def read(name: str) -> str:
+        path = ROOT / "Prompts" / f"{lang}-{name}.txt"
+        return path.read_text(encoding="utf-8").strip() if path.exists() else ""
+    return {
+        "no_reason": read("Reason-No"),
+        "no_critic": "",
+        "first_reason": read("Reason-First"),
+        "refine_reason": read("Reason-Refine"),
+        "first_critic": read("Critic-First"),
+        "refine_critic": read("Critic-Refine"),
+    }
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+def _latency(latencies: List[float]) -> Dict[str, float]:
+    vals = sorted(latencies)
+    return {
+        "p50_ms": round(_percentile(vals, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(vals, 0.95) * 1000, 2),
+        "mean_ms": round(sum(vals) / len(vals) * 1000, 2) if vals else 0.0,
+    }
+
+_JSON = Flow_Base.FlowBase(client=lambda prompt, **kw: "")
+
+def _strict_json_ok(raw: str) -> bool:
+    """JSON đầu tiên load được bằng json.loads, không cần sửa."""
+    try:
+        _JSON.parse_first_json(raw)
+        return True
+    except Flow_Base.FlowError:
+        return False
+
+
+# ---------------- PROBED FLOWS ----------------
+class _RawProbe:
+    """Mixin giữ lại text thô của mọi lần gọi LLM để tính tỉ lệ parse thất bại."""
+
+    def _invoke_client(self, prompt: str, **kwargs) -> str:
+        raw = super()._invoke_client(prompt, **kwargs)
+        self.raws.append(raw)
+        return raw
+
+class _ProbedReasoningFlow(_RawProbe, flow_reason.ReasoningFlow):
+    raws: List[str]
+
+    def parse_failed(self, raw: str) -> bool:
+        return not self._is_usable(self._parse_best_json(raw))
+
+class _ProbedCriticalFlow(_RawProbe, flow_critic.CriticalFlow):
+    raws: List[str]
+
+    def parse_failed(self, raw: str) -> bool:
+        # parse_critic luôn "thành công" (điền điểm mặc định) → đo theo JSON sạch, không cần sửa
+        return not Tools_Json_Repair.parse_critic(raw).clean
+
+
+class _TimedClient:
+    """
+    Bọc client đồng bộ, đo thời gian từng request. MainFlow gửi request reasoner / critic
+    chồng lên nhau trong một bài → overhead phải tính theo request, không theo latency bài.
+    """
+
+    def __init__(self, client: Client_Llama.LocalLlamaClient):
+        self._client = client
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
+    def __call__(self, prompt: str, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return self._client(prompt, **kwargs)
+        finally:
+            dt = time.perf_counter() - t0
+            with self._lock:
+                self.latencies.append(dt)
+
+
+# ---------------- RUNNER ----------------
+def _run_ops(server: FakeLlamaServer, n: int, concurrency: int, op: Callable[[int], Dict[str, Any]]) -> Dict[str, Any]:
+    """Chạy op(i) cho i < n trên concurrency luồng; gom latency, lỗi, raw text và thời gian server bận."""
+    before = server.snapshot()
+    latencies: List[float] = []
+    raws: List[Dict[str, Any]] = []
+    errors: List[str] = []
+
+    def timed(i: int):
+        t0 = time.perf_counter()
+        try:
+            out = op(i)
+        except Exception as e:
+            return time.perf_counter() - t0, None, f"{type(e).__name__}: {e}"
+        return time.perf_counter() - t0, out, None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for dt, out, err in pool.map(timed, range(n)):
+            latencies.append(dt)
+            if err:
+                errors.append(err)
+            elif out:
+                raws.append(out)
+    elapsed = time.perf_counter() - started
+    after = server.snapshot()
+
+    busy = after["busy_seconds"] - before["busy_seconds"]
+    ok = n - len(errors)
+    return {
+        "ops": n,
+        "ok": ok,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "elapsed_s": round(elapsed, 4),
+        "ops_per_s": round(ok / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency": _latency(latencies),
+        "server_busy_s": round(busy, 4),
+        "overhead_ms": round(max(0.0, sum(latencies) - busy) / max(n, 1) * 1000, 3),
+        "server_requests": after["requests"] - before["requests"],
+        "slot_waits": after["slot_waits"] - before["slot_waits"],
+        "_outs": raws,
+    }
+
+def _parse_rates(result: Dict[str, Any]) -> Dict[str, Any]:
+    outs = result.pop("_outs")
+    total = sum(o["calls"] for o in outs)
+    result["llm_calls"] = total
+    result["parse_failure_rate"] = round(sum(o["parse_failed"] for o in outs) / total, 4) if total else 0.0
+    result["strict_json_failure_rate"] = round(sum(o["strict_failed"] for o in outs) / total, 4) if total else 0.0
+    return result
+
+def _probe_stats(flow) -> Dict[str, Any]:
+    return {
+        "calls": len(flow.raws),
+        "parse_failed": sum(flow.parse_failed(r) for r in flow.raws),
+        "strict_failed": sum(not _strict_json_ok(r) for r in flow.raws),
+    }
+
+def bench_client(server: FakeLlamaServer, client: Client_Llama.LocalLlamaClient,
+                 articles: List[str], concurrency: int) -> Dict[str, Any]:
+    prompt = load_prompts()["first_reason"]
+
+    def op(i: int) -> Dict[str, Any]:
+        resp = client(f"{prompt}\n\nVăn bản gốc:\n\n{articles[i % len(articles)]}", max_tokens=512)
+        if "error" in resp:
+            raise RuntimeError(resp["error"])
+        raw = resp["choices"][0]["text"]
+        return {"calls": 1, "parse_failed": int(not Tools_Json_Repair.parse_reasoning(raw).ok),
+                "strict_failed": int(not _strict_json_ok(raw))}
+
+    return _parse_rates(_run_ops(server, len(articles), concurrency, op))
+
+def bench_reasoning(server: FakeLlamaServer, client: Client_Llama.LocalLlamaClient,
+                    articles: List[str], concurrency: int) -> Dict[str, Any]:
+    prompts = load_prompts()
+
+    def op(i: int) -> Dict[str, Any]:
+        rf = _ProbedReasoningFlow(client, request_kwargs=flow_reason._request_kwargs(GEN_PARAMS))
+        rf.raws = []
+        rf.run_reason_or_refine(prompts["first_reason"], prompts["refine_reason"], "", articles[i])
+        return _probe_stats(rf)
+
+    return _parse_rates(_run_ops(server, len(articles), concurrency, op))
+
+def bench_critic(server: FakeLlamaServer, client: Client_Llama.LocalLlamaClient,
+                 articles: List[str], concurrency: int) -> Dict[str, Any]:
+    prompts = load_prompts()
+    reasoning = json.dumps({"reasoning": {"topic": "t", "key_ideas": "k", "filtered_ideas": "f"},
+                            "summary": "A short summary with 2024 figures."})
+
+    def op(i: int) -> Dict[str, Any]:
+        cf = _ProbedCriticalFlow(client, request_kwargs=flow_critic._request_kwargs(GEN_PARAMS))
+        cf.raws = []
+        cf.run_critic(prompts["first_critic"], prompts["refine_critic"], articles[i], reasoning)
+        return _probe_stats(cf)
+
+    return _parse_rates(_run_ops(server, len(articles), concurrency, op))
+
+def bench_pipeline(server: FakeLlamaServer, client: Client_Llama.LocalLlamaClient,
+                   articles: List[str], concurrency: int, max_iters: int = 3) -> Dict[str, Any]:
+    """Vòng lặp đầy đủ (MainFlow.arun) qua scheduler; ops = số bài."""
+    timed = _TimedClient(client)
+    async_client = Client_Llama.AsyncLocalLlamaClient(client=timed, max_concurrency=concurrency * 2)
+    main = flow_main.MainFlow(async_client, async_client, load_prompts(), GEN_PARAMS, GEN_PARAMS, verbose=False)
+    latencies: Dict[int, float] = {}
+    rounds: List[int] = []
+    error_rounds = 0
+    starts: Dict[int, float] = {}
+
+    def source():
+        for i, text in enumerate(articles):
+            starts[i] = time.perf_counter()
+            yield i, text
+
+    def on_result(i: int, result: dict):
+        nonlocal error_rounds
+        latencies[i] = time.perf_counter() - starts[i]
+        its = result["history"]["iterations"]
+        rounds.append(len(its))
+        error_rounds += sum("error" in r for r in its)
+
+    before = server.snapshot()
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull      # scheduler in log từng bài
+            try:
+                summary = asyncio.run(flow_sched.run_batch_async(
+                    main, source(), Path(tmp) / "history.json", max_in_flight=concurrency,
+                    max_iters=max_iters, fail_fast=False, on_result=on_result))
+            finally:
+                sys.stdout = stdout
+    after = server.snapshot()
+    async_client._executor.shutdown(wait=True)
+
+    busy = after["busy_seconds"] - before["busy_seconds"]
+    n = len(articles)
+    ok = summary["successful"]
+    elapsed = summary["elapsed"]
+    total_rounds = sum(rounds)
+    return {
+        "ops": n,
+        "ok": ok,
+        "errors": len(summary["failed"]),
+        "error_samples": list(summary["failed"].values())[:3],
+        "elapsed_s": round(elapsed, 4),
+        "ops_per_s": round(ok / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency": _latency(list(latencies.values())),
+        "server_busy_s": round(busy, 4),
+        # latency request (phía client) − thời gian server xử lý, chia theo số request
+        "overhead_ms": round(max(0.0, sum(timed.latencies) - busy) / max(len(timed.latencies), 1) * 1000, 3),
+        "server_requests": after["requests"] - before["requests"],
+        "slot_waits": after["slot_waits"] - before["slot_waits"],
+        "rounds_per_sample": round(total_rounds / ok, 3) if ok else 0.0,
+        "parse_failure_rate": round(error_rounds / total_rounds, 4) if total_rounds else 0.0,
+    }
+
+BENCHES = {
+    "client": bench_client,
+    "reasoning": bench_reasoning,
+    "critic": bench_critic,
+    "pipeline": bench_pipeline,
+}
+
+
+# ---------------- SUITE / REPORT ----------------
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return ""
+
+def run_suite(scenario: str = "baseline",
+              samples: int = 16,
+              concurrency: int = 4,
+              benches: Optional[List[str]] = None,
+              stream: bool = True,
+              seed: int = 0,
+              server_overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    server_params = {**SCENARIOS[scenario], **(server_overrides or {}), "seed": seed}
+    articles = make_articles(samples, seed=seed)
+    report: Dict[str, Any] = {
+        "meta": {
+            "scenario": scenario,
+            "server": server_params,
+            "samples": samples,
+            "concurrency": concurrency,
+            "stream": stream,
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {},
+    }
+
+    with FakeLlamaServer(**server_params).start() as server:
+        for name in benches or list(BENCHES):
+            client = Client_Llama.LocalLlamaClient(server.url, wait_timeout=30, pool_size=concurrency * 2,
+                                                   stream_json=stream, retry_policy=Client_Retry.RetryPolicy())
+            try:
+                print(f"⏱️ {scenario}/{name} ...")
+                result = BENCHES[name](server, client, articles, concurrency)
+                result["retry"] = client.retry_policy.stats()
+                report["results"][name] = result
+                print(f"   {result['ops_per_s']} ops/s · p50 {result['latency']['p50_ms']} ms · "
+                      f"p95 {result['latency']['p95_ms']} ms · overhead {result['overhead_ms']} ms · "
+                      f"parse fail {result['parse_failure_rate']:.2%}")
+            finally:
+                client.close()
+        report["server_stats"] = server.snapshot()
+    return report
+
+def save_report(report: Dict[str, Any], out_dir: Path = REPORT_DIR) -> Path:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = out_dir / f"bench-{report['meta']['scenario']}-{stamp}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+def latest_report(out_dir: Path, scenario: str, exclude: Optional[Path] = None) -> Optional[Path]:
+    paths = sorted(p for p in Path(out_dir).glob(f"bench-{scenario}-*.json") if p != exclude)
+    return paths[-1] if paths else None
+
+def _get(d: Dict[str, Any], dotted: str) -> Optional[float]:
+    for k in dotted.split("."):
+        if not isinstance(d, dict) or k not in d:
+            return None
+        d = d[k]
+    return d
+
+def compare_reports(current: Dict[str, Any], previous: Dict[str, Any], threshold: float = 0.10) -> Dict[str, Any]:
+    """
+    So sánh từng bench/chỉ số với báo cáo trước.
+    regression = xấu đi quá threshold (tương đối).
+    """
+    out: Dict[str, Any] = {"baseline_revision": previous.get("meta", {}).get("revision", ""), "benches": {},
+                           "regressions": []}
+    for name, cur in current.get("results", {}).items():
+        prev = previous.get("results", {}).get(name)
+        if not prev:
+            continue
+        rows = {}
+        for metric, higher_better in COMPARE_METRICS:
+            a, b = _get(prev, metric), _get(cur, metric)
+            if a is None or b is None:
+                continue
+            change = (b - a) / a if a else (0.0 if b == a else float("inf"))
+            worse = -change if higher_better else change
+            rows[metric] = {"before": a, "after": b, "change": round(change, 4)}
+            if worse > threshold and abs(b - a) > 1e-9:
+                out["regressions"].append(f"{name}.{metric}: {a} → {b} ({change:+.1%})")
+        out["benches"][name] = rows
+    return out
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m Benchmarks",
+                                     description="Benchmark pipeline với fake llama.cpp server (CPU).")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="baseline")
+    parser.add_argument("--samples", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--bench", action="append", choices=list(BENCHES), help="lặp lại để chọn nhiều bench")
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=REPORT_DIR)
+    parser.add_argument("--compare", type=Path, help="báo cáo để so sánh (mặc định: báo cáo trước cùng scenario)")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.scenario, args.samples, args.concurrency, args.bench,
+                       stream=not args.no_stream, seed=args.seed)
+    baseline = args.compare or latest_report(args.out, args.scenario)
+    if baseline and baseline.exists():
+        with open(baseline, "r", encoding="utf-8") as f:
+            report["comparison"] = compare_reports(report, json.load(f), args.threshold)
+        report["comparison"]["baseline"] = str(baseline)
+
+    path = save_report(report, args.out)
+    print(f"💾 Báo cáo: {path}")
+
+    regressions = report.get("comparison", {}).get("regressions", [])
+    for r in regressions:
+        print(f"⚠️ Regression: {r}")
+    return 1 if regressions and args.fail_on_regression else 0
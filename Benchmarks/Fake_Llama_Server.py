@@ -0,0 +1,277 @@
+# Benchmarks/Fake_Llama_Server.py
+
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, Any, List
+
+# ==============================
+
+# Fake_Llama_Server.py
+# Server giả lập llama.cpp (chạy trên CPU, không cần model) để đo pipeline:
+#   GET  /health, /props
+#   POST /completion (thường + SSE streaming), /tokenize
+# Tham số:
+#   latency      : thời gian xử lý prompt (giây) trước token đầu tiên
+#   token_rate   : tốc độ sinh (token/giây); 0 → trả ngay
+#   slots        : số slot song song (--parallel); request dư phải xếp hàng
+#                  id_slot trong request → chờ đúng slot đó (như llama.cpp), kể cả khi slot khác rảnh;
+#                  stats["slot_waits"] đếm các lần phải chờ như vậy (khóa slot trùng nhau)
+#   fail_rate    : tỉ lệ trả HTTP 500
+#   garbage_rate : tỉ lệ trả JSON hỏng (cắt cụt / văn xuôi / dấu phẩy thừa)
+#   grammar      : nhận "grammar"/"json_schema" (decode có ràng buộc → không bao giờ hỏng);
+#                  False → trả 400 như server không hỗ trợ grammar
+#   seed         : cố định chuỗi ngẫu nhiên → kết quả lặp lại được
+
+_SCORE_KEYS = ["factuality", "clarity", "logical_coherence", "coverage", "utility", "consistency"]
+_WORD_RE = re.compile(r"\w+")
+_CHARS_PER_TOKEN = 4
+
+def _tokenize(text: str) -> List[int]:
+    # ~4 ký tự / token, id ổn định theo nội dung
+    return [int(hashlib.md5(text[i:i + _CHARS_PER_TOKEN].encode("utf-8")).hexdigest()[:6], 16)
+            for i in range(0, len(text), _CHARS_PER_TOKEN)]
+
+def _source_words(prompt: str) -> List[str]:
+    tail = prompt.rsplit("Văn bản gốc:", 1)[-1]
+    return _WORD_RE.findall(tail)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeLlamaServer"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code: int, obj: Dict[str, Any]):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> Dict[str, Any]:
+        n = int(self.headers.get("Content-Length", 0))
+        try:
+            return json.loads(self.rfile.read(n) or b"{}")
+        except json.JSONDecodeError:
+            return {}
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self._send(200, {"status": "ok"})
+        if self.path == "/props":
+            return self._send(200, {"total_slots": self.server.slots, "model_path": self.server.model_path,
+                                    "default_generation_settings": {"n_ctx": self.server.n_ctx}})
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = self._body()
+        if self.path == "/tokenize":
+            return self._send(200, {"tokens": _tokenize(body.get("content", ""))})
+        if self.path != "/completion":
+            return self._send(404, {"error": "not found"})
+
+        srv = self.server
+        started = time.perf_counter()
+        if srv.roll("fail_rate"):
+            srv.count("failed")
+            return self._send(500, {"error": {"code": 500, "message": "injected failure"}})
+
+        constrained = bool(body.get("grammar") or body.get("json_schema"))
+        if constrained and not srv.grammar:
+            return self._send(400, {"error": {"code": 400, "message": "grammar is not supported"}})
+
+        prompt = body.get("prompt", "")
+        n_predict = int(body.get("n_predict", 512))
+        text = srv.respond(prompt, constrained)
+        tokens = [text[i:i + _CHARS_PER_TOKEN] for i in range(0, len(text), _CHARS_PER_TOKEN)][:max(1, n_predict)]
+        prompt_n = len(_tokenize(prompt))
+
+        with srv.slot(body.get("id_slot")):
+            queued = time.perf_counter() - started
+            if srv.latency:
+                time.sleep(srv.latency)
+            if body.get("stream"):
+                sent = self._stream(tokens, prompt_n)
+            else:
+                if srv.token_rate:
+                    time.sleep(len(tokens) / srv.token_rate)
+                sent = len(tokens)
+                self._send(200, {"content": "".join(tokens), "tokens_evaluated": prompt_n,
+                                 "tokens_predicted": sent, "stop": True,
+                                 "timings": {"prompt_n": prompt_n, "cache_n": 0, "predicted_n": sent}})
+
+        srv.record(time.perf_counter() - started - queued, sent)
+
+    def _stream(self, tokens: List[str], prompt_n: int) -> int:
+        """SSE như llama.cpp; client đóng kết nối sớm → ngừng sinh (như server thật)."""
+        srv = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        self.close_connection = True
+        delay = 1.0 / srv.token_rate if srv.token_rate else 0.0
+        sent = 0
+        try:
+            for tok in tokens:
+                if delay:
+                    time.sleep(delay)
+                sent += 1
+                event = {"content": tok, "stop": False,
+                         "timings": {"prompt_n": prompt_n, "cache_n": 0, "predicted_n": sent}}
+                self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            final = {"content": "", "stop": True, "tokens_evaluated": prompt_n, "tokens_predicted": sent,
+                     "timings": {"prompt_n": prompt_n, "cache_n": 0, "predicted_n": sent}}
+            self.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            srv.count("stream_aborted")
+        return sent
+
+
+class FakeLlamaServer(ThreadingHTTPServer):
+    """
+    Ví dụ:
+        with FakeLlamaServer(latency=0.05, token_rate=400, slots=4).start() as srv:
+            client = Client_Llama.LocalLlamaClient(srv.url)
+    """
+
+    daemon_threads = True
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency: float = 0.0,
+                 token_rate: float = 0.0,
+                 slots: int = 4,
+                 fail_rate: float = 0.0,
+                 garbage_rate: float = 0.0,
+                 grammar: bool = True,
+                 n_ctx: int = 4096,
+                 seed: Optional[int] = 0,
+                 model_path: str = "/models/fake-llama.gguf"):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.token_rate = token_rate
+        self.slots = max(1, int(slots))
+        self.fail_rate = fail_rate
+        self.garbage_rate = garbage_rate
+        self.grammar = grammar
+        self.n_ctx = n_ctx
+        self.model_path = model_path
+        self._busy: List[bool] = [False] * self.slots
+        self._slot_cond = threading.Condition()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"requests": 0, "failed": 0, "garbage": 0, "stream_aborted": 0, "slot_waits": 0,
+                      "tokens_generated": 0, "busy_seconds": 0.0}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # ---------------- LIFECYCLE ----------------
+    def start(self) -> "FakeLlamaServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-llama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------------- SLOTS ----------------
+    @contextmanager
+    def slot(self, id_slot: Any = None):
+        """Giữ một slot trong lúc xử lý: id_slot hợp lệ → đúng slot đó; None / -1 → slot rảnh bất kỳ."""
+        pinned = id_slot if isinstance(id_slot, int) and 0 <= id_slot < self.slots else None
+        with self._slot_cond:
+            if pinned is not None and self._busy[pinned] and not all(self._busy):
+                self.count("slot_waits")
+            while (self._busy[pinned] if pinned is not None else all(self._busy)):
+                self._slot_cond.wait()
+            idx = pinned if pinned is not None else self._busy.index(False)
+            self._busy[idx] = True
+        try:
+            yield idx
+        finally:
+            with self._slot_cond:
+                self._busy[idx] = False
+                self._slot_cond.notify_all()
+
+    # ---------------- STATS ----------------
+    def roll(self, rate_attr: str) -> bool:
+        rate = getattr(self, rate_attr)
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def record(self, busy: float, tokens: int):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["busy_seconds"] += busy
+            self.stats["tokens_generated"] += tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats)
+
+    # ---------------- RESPONSES ----------------
+    def respond(self, prompt: str, constrained: bool = False) -> str:
+        """Prompt của critic (có "Json suy luận:" / "scoring") → JSON chấm điểm; còn lại → reasoning + summary."""
+        is_critic = "Json suy luận:" in prompt or '"scoring"' in prompt
+        text = self._critic(prompt) if is_critic else self._reasoning(prompt)
+        if not constrained and self.roll("garbage_rate"):
+            self.count("garbage")
+            return self._garble(text)
+        return text
+
+    def _reasoning(self, prompt: str) -> str:
+        words = _source_words(prompt) or ["empty"]
+        obj = {
+            "reasoning": {
+                "topic": " ".join(words[:6]),
+                "key_ideas": ", ".join(words[6:18:3]),
+                "filtered_ideas": ", ".join(words[18:30:4]),
+            },
+            "summary": " ".join(words[:60]),
+        }
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+
+    def _critic(self, prompt: str) -> str:
+        with self._lock:
+            scores = {k: self._rng.choice([3, 4, 4, 5, 5]) for k in _SCORE_KEYS}
+        obj = {"scoring": scores, "feedback_text": "Add the main numeric detail and tighten the wording."}
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+
+    def _garble(self, text: str) -> str:
+        with self._lock:
+            mode = self._rng.randrange(3)
+        if mode == 0:
+            return text[: len(text) // 2]                      # cắt cụt giữa chừng
+        if mode == 1:
+            return "Sure! Here is the result:\n" + text.replace('"', "'")   # văn xuôi + nháy đơn
+        return text.replace("\n}", ",\n}").replace('": "', '": "“')     # dấu phẩy thừa + nháy cong
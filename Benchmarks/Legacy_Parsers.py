@@ -0,0 +1,146 @@
+# Benchmarks/Legacy_Parsers.py
+
+import re
+import json
+
+from Libraries.Tools_Json_Parser import (KEY_SIG, extract_json_like, collapse_symbols, cut_feedback,
+                                         normalize_key, normalize_value)
+
+# ==============================
+
+# Legacy_Parsers.py
+# Parser cũ (chuỗi regex sửa lỗi) trước Tools_Json_Repair — chỉ dùng làm mốc so sánh
+# độ chính xác / tốc độ trong Bench_Parsers, không dùng trong pipeline.
+#   sanitize_and_parse_critic_legacy : Tools_Json_Parser.sanitize_and_parse_critic bản cũ
+#   parse_reasoning_legacy           : ReasoningFlow._parse_best_json bản cũ
+
+def sanitize_and_parse_critic_legacy(raw):
+    
+    chunk = extract_json_like(raw)
+    chunk = collapse_symbols(chunk)
+
+    m_fb = re.search(r'"feedback[_\s]*text"\s*:\s*"([^"]+)"', chunk, re.IGNORECASE)
+    fast_feedback = m_fb.group(1) if m_fb else None
+    if fast_feedback:
+        fast_feedback = cut_feedback(fast_feedback)
+
+    tokens = re.split(r'([{,}])', chunk)
+    
+    scoring = {}
+    feedback = ""
+    current_key = None
+    in_feedback = False
+
+    for tk in tokens:
+        tk = tk.strip()
+        if not tk:
+            continue
+
+        if ":" in tk:
+            parts = tk.split(":",1)
+            k = parts[0].strip().replace('"','').replace("'", "")
+            v = parts[1].strip().rstrip(",")
+
+            nk = normalize_key(k)
+            if nk:
+                current_key = nk
+
+                if nk == "feedback_text":
+                    in_feedback = True
+
+                    if v.startswith('"'):
+                        m = re.search(r'"([^"]+)"', chunk)
+                        if m:
+                            feedback = m.group(1)
+                            in_feedback = False
+                            current_key = None
+                            continue
+                        else:
+                            feedback += " " + v.lstrip('"')
+                            continue
+
+                nv = normalize_value(v)
+                if nk != "feedback_text" and nv is not None:
+                    scoring[nk] = nv
+                elif nk == "feedback_text":
+                    feedback += " " + v
+
+                continue
+
+        if in_feedback:
+            if tk not in "{}[]":
+                if tk != ",":
+                    feedback += " " + tk
+            continue
+
+        if current_key and current_key != "feedback_text":
+            nv = normalize_value(tk)
+            if nv is not None:
+                scoring[current_key] = nv
+                current_key = None
+
+    feedback = cut_feedback(feedback.strip())
+    if not feedback and fast_feedback:
+        feedback = fast_feedback
+
+    out = {"scoring":{}, "feedback_text":feedback}
+    for k in KEY_SIG:
+        if k == "feedback_text": 
+            continue
+        out["scoring"][k] = scoring.get(k, 3)
+
+    return out
+
+
+def _ensure_reasoning_fields(obj):
+    if not isinstance(obj, dict):
+        obj = {}
+    if "reasoning" not in obj or not isinstance(obj["reasoning"], dict):
+        obj["reasoning"] = {"topic": "", "key_ideas": "", "filtered_ideas": ""}
+    for k in ["topic", "key_ideas", "filtered_ideas"]:
+        if k not in obj["reasoning"]:
+            obj["reasoning"][k] = ""
+    if "summary" not in obj or not isinstance(obj["summary"], str):
+        obj["summary"] = ""
+    return obj
+
+def parse_reasoning_legacy(raw):
+    """ReasoningFlow._parse_best_json trước Tools_Json_Repair (fast path json + chuỗi regex sửa lỗi)."""
+    if not raw or not isinstance(raw, str):
+        return {"reasoning": {"topic": "", "key_ideas": "", "filtered_ideas": ""}, "summary": ""}
+
+    try:
+        blob = extract_json_like(raw)
+        obj = json.loads(blob)
+        if isinstance(obj, dict) and isinstance(obj.get("reasoning"), dict):
+            return _ensure_reasoning_fields(obj)
+    except Exception:
+        pass
+
+    text = raw.strip()
+    text = re.sub(r"[\u0000-\u001F]+", " ", text)
+    text = text.replace("’", "'").replace("“", '"').replace("”", '"')
+    text = text.replace("\\'", "'").replace('\\"', '"')
+
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if match:
+        text = match.group(0)
+
+    text = re.sub(r'([{,]\s*)([A-Za-z_][A-Za-z0-9_\-]*)\s*:',
+                  lambda m: m.group(1) + f'"{m.group(2)}":', text)
+
+    text = re.sub(r":\s*'([^']*)'", lambda m: ':"{}"'.format(m.group(1).replace('"', '\\"')), text)
+    text = re.sub(r"'\s*,", lambda m: '",', text)
+    text = re.sub(r",\s*([}\]])", r"\1", text)
+
+    try:
+        obj = json.loads(text)
+    except Exception:
+        summary_match = re.search(r'"summary"\s*:\s*"([^"]+)"', text)
+        summary = summary_match.group(1).strip() if summary_match else ""
+        obj = {"reasoning": {"topic": "", "key_ideas": "", "filtered_ideas": ""}, "summary": summary}
+
+    if isinstance(obj, dict) and "summary" in obj and "reasoning" not in obj:
+        obj["reasoning"] = {"topic": "", "key_ideas": "", "filtered_ideas": ""}
+
+    return _ensure_reasoning_fields(obj)
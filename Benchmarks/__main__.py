@@ -0,0 +1,9 @@
+# Benchmarks/__main__.py
+#   python -m Benchmarks --scenario baseline --samples 16 --concurrency 4
+#   python -m Benchmarks.Bench_Parsers --build      (corpus + benchmark parser JSON)
+
+import sys
+
+from .Bench_Pipeline import main
+
+sys.exit(main())
@@ -0,0 +1,124 @@
+# Libraries/Client_Cache.py
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+# ==============================
+
+# Client_Cache.py
+# Cache đĩa (SQLite) cho phản hồi LLM, định danh theo nội dung:
+#     key = sha256(model file + full prompt + generation params, kể cả seed)
+# - LRU theo last_access, giới hạn tổng dung lượng (max_bytes)
+# - Đếm hits / misses / puts / evictions / deletes
+# - bypass=True: bỏ qua hoàn toàn (không đọc, không ghi)
+# - delete(key): bỏ một phản hồi bị flow từ chối (vd. reasoning không parse được)
+
+# Tham số không ảnh hưởng nội dung sinh ra → không đưa vào key
+_NON_SEMANTIC_KEYS = {"slot_key", "cache_prompt"}
+
+class ResponseCache:
+    def __init__(self, path: Path, max_bytes: int = 512 * 1024 * 1024, bypass: bool = False):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.stats = {"hits": 0, "misses": 0, "puts": 0, "evictions": 0, "deletes": 0}
+        self._lock = threading.Lock()
+
+        if self.path.parent:
+            os.makedirs(self.path.parent, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model_id: str, prompt: str, params: Dict[str, Any]) -> str:
+        semantic = {k: v for k, v in params.items() if k not in _NON_SEMANTIC_KEYS}
+        blob = json.dumps({"model": model_id or "", "prompt": prompt, "params": semantic},
+                          sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if self.bypass:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.stats["hits"] += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        if self.bypass or not value:
+            return
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses(key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()))
+            self._total += size - (old[0] if old else 0)
+            self.stats["puts"] += 1
+            self._evict()
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        if self.bypass:
+            return
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is None:
+                return
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total -= old[0]
+            self.stats["deletes"] += 1
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Xóa mục lâu chưa dùng nhất cho đến khi tổng dung lượng <= max_bytes."""
+        while self._total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 64").fetchall()
+            if not rows:
+                self._total = 0
+                return
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total -= size
+                self.stats["evictions"] += 1
+                if self._total <= self.max_bytes:
+                    return
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total = 0
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {**self.stats, "entries": entries, "bytes": self._total, "max_bytes": self.max_bytes,
+                "bypass": self.bypass}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -2,28 +2,242 @@
 
 import json
 import time
+import asyncio
+import threading
+import contextvars
 import requests
-from typing import Optional, Dict, Any, List
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, Any, List, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from . import Client_Retry
 
 # ==============================
 
+# (endpoint, dialect) theo thứ tự ưu tiên khi dò server.
+#   - "llama"       : llama.cpp native  → {"prompt", "n_predict"}  → {"content"}
+#   - "openai"      : OpenAI completions → {"prompt", "max_tokens"} → {"choices":[{"text"}]}
+#   - "openai_chat" : OpenAI chat        → {"messages", "max_tokens"} → {"choices":[{"message"}]}
+ENDPOINT_DIALECTS: List[Tuple[str, str]] = [
+    ("/completion", "llama"),
+    ("/v1/completions", "openai"),
+    ("/v1/chat/completions", "openai_chat"),
+]
+
+# Khóa payload ràng buộc decode; server không hỗ trợ → bỏ đi và gửi lại
+_GRAMMAR_KEYS = ("grammar", "json_schema")
+
+# Breaker half_open: mỗi lần chờ request thăm dò (giây); số lần chờ ≤ retry
+_PROBE_WAIT = 0.1
+
+class JsonObjectTracker:
+    """
+    Theo dõi độ sâu ngoặc khi token đến dần (streaming).
+    Object top-level đầu tiên được coi là "đóng" khi CẢ HAI bộ đếm về 0:
+      - bộ đếm thô (giống FlowBase.extract_first_json / extract_json_like)
+      - bộ đếm có nhận biết chuỗi "..." và escape
+    nên phần văn bản giữ lại luôn chứa đúng object mà các parser sẽ trích ra.
+    """
+
+    def __init__(self):
+        self.raw_depth = 0
+        self.raw_closed = False
+        self.depth = 0
+        self.closed = False
+        self.in_string = False
+        self.escape = False
+
+    @property
+    def done(self) -> bool:
+        return self.raw_closed and self.closed
+
+    def feed(self, chunk: str) -> int:
+        """Trả về vị trí (exclusive) trong chunk nơi object đóng, hoặc -1."""
+        for i, ch in enumerate(chunk):
+            if not self.raw_closed:
+                if ch == "{":
+                    self.raw_depth += 1
+                elif ch == "}" and self.raw_depth > 0:
+                    self.raw_depth -= 1
+                    self.raw_closed = self.raw_depth == 0
+
+            if not self.closed:
+                if self.in_string:
+                    if self.escape:
+                        self.escape = False
+                    elif ch == "\\":
+                        self.escape = True
+                    elif ch == '"':
+                        self.in_string = False
+                elif ch == '"' and self.depth > 0:
+                    self.in_string = True
+                elif ch == "{":
+                    self.depth += 1
+                elif ch == "}" and self.depth > 0:
+                    self.depth -= 1
+                    self.closed = self.depth == 0
+
+            if self.done:
+                return i + 1
+        return -1
+
+def _stream_delta(event: Dict[str, Any]) -> str:
+    """Lấy phần text của một SSE event (llama.cpp native hoặc OpenAI-like)."""
+    if isinstance(event.get("content"), str):
+        return event["content"]
+    try:
+        choice = event["choices"][0]
+    except (KeyError, IndexError, TypeError):
+        return ""
+    if isinstance(choice.get("text"), str):
+        return choice["text"]
+    delta = choice.get("delta") or {}
+    return delta.get("content") or ""
+
+def _usage(data: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Chuẩn hóa số token của một lần gọi (llama.cpp native hoặc OpenAI-like).
+    prefix_hit_tokens = số token prompt lấy lại từ KV cache (không phải xử lý lại).
+    """
+    timings = data.get("timings") or {}
+    usage = data.get("usage") or {}
+
+    prompt = data.get("tokens_evaluated") or usage.get("prompt_tokens")
+    processed = timings.get("prompt_n")
+    cached = timings.get("cache_n")
+    if cached is None and prompt is not None and processed is not None:
+        cached = max(0, int(prompt) - int(processed))
+    if cached is None:
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if prompt is None and processed is not None and cached is not None:
+        prompt = int(processed) + int(cached)
+    completion = data.get("tokens_predicted") or usage.get("completion_tokens") or timings.get("predicted_n")
+
+    out = {
+        "prompt_tokens": prompt,
+        "prefix_hit_tokens": cached,
+        "prompt_processed": processed,
+        "completion_tokens": completion,
+    }
+    return {k: int(v) for k, v in out.items() if v is not None}
+
+class SlotAffinity:
+    """
+    Gán khóa (vd. bài viết + vai trò) → id_slot cố định của llama.cpp, để các
+    vòng của cùng một bài rơi vào cùng slot và dùng lại KV cache của prompt trước.
+    Tối đa n_slots khóa; khóa mới lấy slot trống hoặc slot của khóa lâu nhất chưa dùng.
+    """
+
+    def __init__(self, n_slots: int = 1):
+        self.n_slots = max(1, int(n_slots))
+        self._map: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resize(self, n_slots: int):
+        with self._lock:
+            self.n_slots = max(1, int(n_slots))
+            self._map.clear()
+
+    def slot_for(self, key: str) -> int:
+        with self._lock:
+            if key in self._map:
+                self._map.move_to_end(key)
+                return self._map[key]
+
+            used = set(self._map.values())
+            free = [i for i in range(self.n_slots) if i not in used]
+            if free:
+                slot = free[0]
+            else:
+                _, slot = self._map.popitem(last=False)
+            self._map[key] = slot
+            return slot
+
 class LocalLlamaClient:
     def __init__(self, 
                  host: str = "http://localhost:8080", 
                  timeout: int = 270,
                  retry: int = 3, 
-                 wait_timeout: int = 300):
+                 wait_timeout: Optional[int] = 300,
+                 pool_size: int = 4,
+                 stream_json: bool = False,
+                 retry_policy: Optional[Client_Retry.RetryPolicy] = None,
+                 breaker: Optional[Client_Retry.CircuitBreaker] = None):
+        """
+        wait_timeout=None → không chờ server lúc khởi tạo (dùng cho LlamaClientPool).
+        retry        : số lần thử tối đa trên server này cho một request
+        retry_policy : ngân sách retry/deadline dùng chung với flow (Client_Retry)
+        breaker      : circuit breaker của server này
+        """
         
         self.host = host.rstrip("/")
         self.timeout = timeout 
         self.health_timeout = 5
         self.retry = retry
+        self.pool_size = max(1, int(pool_size))
+        self.retry_policy = retry_policy or Client_Retry.RetryPolicy(max_attempts=retry)
+        self.breaker = breaker or Client_Retry.CircuitBreaker(name=self.host)
+
+        # Streaming: dừng sinh ngay khi JSON object đầu tiên đóng
+        self.stream_json = stream_json
+        self.stream_stats = {"calls": 0, "aborted": 0, "tokens_generated": 0, "tokens_saved": 0}
+        self._stats_lock = threading.Lock()
+
+        # KV-cache prefix reuse: cache_prompt + id_slot theo slot_key
+        self.total_slots = 1
+        self.model_id = ""
+        self.n_ctx: Optional[int] = None        # context của một slot, từ /props (None → chưa biết)
+        self.slot_affinity = SlotAffinity(1)
+        self.usage_stats = {"calls": 0, "prompt_tokens": 0, "prefix_hit_tokens": 0}
 
-        # chọn endpoint mặc định, có thể cập nhật sau health-check
+        # Session giữ kết nối keep-alive, tái sử dụng TCP giữa các lần gọi.
+        # pool_maxsize = số kết nối song song tối đa tới server.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Connection": "keep-alive"})
+
+        # endpoint + dialect mặc định, được xác định lại một lần sau health-check
         self._completion_endpoint = "/completion"    # llama.cpp server
-        self._alt_endpoints = ["/v1/completions", "/v1/chat/completions"]
+        self._dialect = "llama"
+        self._negotiated = False
+
+        # grammar / json_schema: giả định có hỗ trợ cho đến khi server từ chối
+        self.supports_grammar = True
+
+        if wait_timeout is not None:
+            self.wait_for_server_ready(wait_timeout)
+
+    def close(self):
+        """Đóng session và giải phóng các kết nối trong pool."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
-        self.wait_for_server_ready(wait_timeout)
+    @staticmethod
+    def _is_ready(res: requests.Response) -> bool:
+        try:
+            data = res.json()
+            status = str(data.get("status", "")).lower()
+            ready = bool(data.get("ready", False))
+            return status == "ok" or ready
+        except (json.JSONDecodeError, AttributeError):
+            return res.status_code == 200 and "ok" in res.text.lower()
+
+    def check_health(self) -> bool:
+        """Hỏi /health đúng một lần (không chờ, không in). True nếu server sẵn sàng."""
+        try:
+            res = self.session.get(f"{self.host}/health", timeout=self.health_timeout)
+        except requests.exceptions.RequestException:
+            return False
+        return self._is_ready(res)
         
     def wait_for_server_ready(self, wait_timeout: int):
         """
@@ -43,20 +257,11 @@ class LocalLlamaClient:
                 raise TimeoutError(f"Server tại {self.host} không sẵn sàng sau {wait_timeout}s.")
 
             try:
-                res = requests.get(url, timeout=self.health_timeout)
-                ok = False
-                try:
-                    data = res.json()
-                    status = str(data.get("status", "")).lower()
-                    ready = bool(data.get("ready", False))
-                    if status == "ok" or ready:
-                        ok = True
-                except json.JSONDecodeError:
-                    if res.status_code == 200 and "ok" in res.text.lower():
-                        ok = True
+                res = self.session.get(url, timeout=self.health_timeout)
 
-                if ok:
+                if self._is_ready(res):
                     print(f"✅ Server đã sẵn sàng.")
+                    self.negotiate_endpoint()
                     break
                 else:
                     print(f"⏳ Server chưa sẵn sàng (HTTP {res.status_code}). Thử lại sau 5s...")
@@ -69,39 +274,230 @@ class LocalLlamaClient:
 
             time.sleep(5)
 
-    def _post(self, endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """Gửi yêu cầu POST và xử lý retry + fallback endpoint."""
-        tried = [endpoint] + [ep for ep in self._alt_endpoints if ep != endpoint]
+    def negotiate_endpoint(self) -> Tuple[str, str]:
+        """
+        Dò endpoint sinh văn bản MỘT lần (sau health-check) và ghi nhớ
+        dialect payload tương ứng. Các lần gọi sau chỉ gửi đúng 1 request.
+        """
+        for ep, dialect in ENDPOINT_DIALECTS:
+            probe = self._build_payload(dialect, {"prompt": "ping", "n_predict": 1,
+                                                  "temperature": 0.0, "stream": False})
+            try:
+                res = self.session.post(f"{self.host}{ep}", json=probe, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️ Không dò được {ep}: {e}")
+                continue
+            if res.status_code == 200:
+                self._completion_endpoint, self._dialect = ep, dialect
+                self._negotiated = True
+                self._load_props()
+                print(f"🔌 Endpoint: {ep} (dialect: {dialect}, slots: {self.total_slots})")
+                return ep, dialect
+            print(f"[LLAMA API WARNING] HTTP {res.status_code} at {ep} khi dò endpoint.")
+
+        print(f"⚠️ Không xác định được endpoint, dùng mặc định {self._completion_endpoint}.")
+        return self._completion_endpoint, self._dialect
+
+    def _load_props(self):
+        """Đọc /props (nếu có): số slot song song, context mỗi slot và model đang chạy."""
+        try:
+            res = self.session.get(f"{self.host}/props", timeout=self.health_timeout)
+            props = res.json() if res.status_code == 200 else {}
+        except (requests.exceptions.RequestException, ValueError):
+            props = {}
+        if not isinstance(props, dict):
+            return
+
+        slots = int(props.get("total_slots") or 1)
+        if slots != self.total_slots:
+            self.total_slots = slots
+            self.slot_affinity.resize(slots)
+        self.model_id = str(props.get("model_path") or self.model_id)
+        # llama.cpp: default_generation_settings.n_ctx = --ctx-size / --parallel
+        settings = props.get("default_generation_settings")
+        n_ctx = (settings.get("n_ctx") if isinstance(settings, dict) else None) or props.get("n_ctx")
+        if n_ctx:
+            self.n_ctx = int(n_ctx)
+
+    @staticmethod
+    def _build_payload(dialect: str, native: Dict[str, Any]) -> Dict[str, Any]:
+        """Chuyển payload llama.cpp native sang dialect của endpoint."""
+        if dialect == "llama":
+            return dict(native)
+
+        payload = {k: v for k, v in native.items() if k not in ("prompt", "n_predict")}
+        payload["max_tokens"] = native.get("n_predict", 512)
+        if dialect == "openai_chat":
+            payload["messages"] = [{"role": "user", "content": native.get("prompt", "")}]
+        else:
+            payload["prompt"] = native.get("prompt", "")
+        return payload
+
+    def _read_stream(self, res: requests.Response, n_predict: int) -> Dict[str, Any]:
+        """
+        Đọc SSE token stream, ghép text và cắt (đóng kết nối) ngay khi
+        object JSON top-level đầu tiên hoàn tất → server ngừng decode.
+        """
+        tracker = JsonObjectTracker()
+        parts: List[str] = []
+        generated = 0
+        aborted = False
+        final: Dict[str, Any] = {}
+        meta: Dict[str, Any] = {}
 
-        for ep in tried:
-            url = f"{self.host}{ep}"
-            for attempt in range(self.retry):
+        try:
+            for line in res.iter_lines():
+                if not line or not line.startswith(b"data:"):
+                    continue
+                body = line[5:].strip()
+                if body == b"[DONE]":
+                    break
                 try:
-                    res = requests.post(url, json=payload, timeout=self.timeout) 
+                    event = json.loads(body)
+                except json.JSONDecodeError:
+                    continue
 
-                    if res.status_code == 200:
-                        try:
-                            return res.json()
-                        except json.JSONDecodeError:
-                            return {"error": f"INVALID_JSON_RESPONSE at {ep}"}
+                for k in ("timings", "tokens_evaluated", "usage"):
+                    if event.get(k):
+                        meta[k] = event[k]
 
-                    print(f"[LLAMA API WARNING] HTTP {res.status_code} at {ep}: {res.text}")
-                    # Nếu 404, thử endpoint khác ngay
-                    if res.status_code == 404:
+                delta = _stream_delta(event)
+                if delta:
+                    generated += 1
+                    cut = tracker.feed(delta)
+                    if cut != -1:
+                        parts.append(delta[:cut])
+                        aborted = True
                         break
-                    time.sleep(1)
+                    parts.append(delta)
+
+                if event.get("stop"):
+                    final = event
+                    break
+        finally:
+            res.close()
+
+        if final.get("tokens_predicted"):
+            generated = int(final["tokens_predicted"])
+        saved = max(0, n_predict - generated) if aborted else 0
+
+        with self._stats_lock:
+            self.stream_stats["calls"] += 1
+            self.stream_stats["aborted"] += int(aborted)
+            self.stream_stats["tokens_generated"] += generated
+            self.stream_stats["tokens_saved"] += saved
+
+        return {
+            **meta,
+            **final,
+            "content": "".join(parts),
+            "stream": {"aborted": aborted, "tokens_generated": generated, "tokens_saved": saved},
+        }
+
+    def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Gửi payload (native) tới endpoint đã dò, retry theo retry_policy
+        (tối đa self.retry lần trên server này, trong ngân sách chung của lời gọi).
+        Circuit breaker mở → trả lỗi CIRCUIT_OPEN ngay, không gửi request.
+        Nếu endpoint trả 404 (server bị thay thế), dò lại đúng một lần.
+        payload["stream"]=True → đọc SSE và dừng sớm sau JSON object đầu tiên.
+        """
+        stream = bool(payload.get("stream"))
+        renegotiated = False
+        attempt = 0
+        probe_waits = 0
+
+        with self.retry_policy.scope() as budget:
+            while attempt < self.retry:
+                # kiểm tra ngân sách TRƯỚC khi nhận lượt thăm dò của breaker
+                if not budget.has_budget():
+                    return {"error": Client_Retry.BUDGET_EXHAUSTED}
+                if not self.breaker.allow():
+                    if self.breaker.state == "half_open" and probe_waits < self.retry:
+                        # đang có request thăm dò → chờ kết quả (số lần chờ có hạn) thay vì báo lỗi ngay
+                        probe_waits += 1
+                        time.sleep(min(_PROBE_WAIT, budget.remaining()))
+                        continue
+                    self.retry_policy.count("circuit_rejections")
+                    return {"error": Client_Retry.CIRCUIT_OPEN}
+                probe = self.breaker.state == "half_open"
+
+                try:
+                    if not budget.acquire():
+                        return {"error": Client_Retry.BUDGET_EXHAUSTED}
+
+                    ep = self._completion_endpoint
+                    url = f"{self.host}{ep}"
+                    try:
+                        res = self.session.post(url, json=self._build_payload(self._dialect, payload),
+                                                timeout=budget.timeout(self.timeout), stream=stream)
 
-                except requests.exceptions.RequestException as e:
-                    print(f"[LLAMA API ERROR] {str(e)} (endpoint {ep})")
-                    time.sleep(1)
+                        # server còn trả lời (kể cả 4xx) → không tính là sập
+                        if res.status_code >= 500:
+                            self.breaker.record_failure()
+                        else:
+                            self.breaker.record_success()
+
+                        if res.status_code == 200:
+                            if stream:
+                                return self._read_stream(res, int(payload.get("n_predict", 0)))
+                            try:
+                                return res.json()
+                            except json.JSONDecodeError:
+                                return {"error": f"INVALID_JSON_RESPONSE at {ep}"}
+
+                        print(f"[LLAMA API WARNING] HTTP {res.status_code} at {ep}: {res.text}")
+                        if res.status_code == 404 and not renegotiated:
+                            renegotiated = True
+                            self.negotiate_endpoint()
+                            continue
+                        if self._grammar_rejected(res, payload):
+                            self.supports_grammar = False
+                            print(f"⚠️ Server {self.host} không nhận grammar → gửi lại không ràng buộc.")
+                            payload = {k: v for k, v in payload.items() if k not in _GRAMMAR_KEYS}
+                            continue
+
+                    except requests.exceptions.RequestException as e:
+                        print(f"[LLAMA API ERROR] {str(e)} (endpoint {ep})")
+                        self.breaker.record_failure()
+                finally:
+                    # thăm dò chưa ghi được kết quả (hết ngân sách, lỗi khác, bị huỷ) → nhả lượt,
+                    # không để breaker kẹt ở half_open
+                    if probe:
+                        self.breaker.release_probe()
+
+                attempt += 1
+                if attempt < self.retry:
+                    budget.sleep()
 
         return {"error": "LLAMA_REQUEST_FAILED"}
 
+    @staticmethod
+    def _grammar_rejected(res: requests.Response, payload: Dict[str, Any]) -> bool:
+        """Request có grammar bị từ chối (400, hoặc lỗi nhắc tới grammar/schema)."""
+        if not any(k in payload for k in _GRAMMAR_KEYS) or res.status_code < 400:
+            return False
+        text = res.text.lower()
+        return res.status_code == 400 or "grammar" in text or "schema" in text
+
+    def tokenize(self, text: str) -> Optional[List[int]]:
+        """Token hóa bằng tokenizer của server (/tokenize). None nếu server không hỗ trợ."""
+        try:
+            res = self.session.post(f"{self.host}/tokenize", json={"content": text},
+                                    timeout=self.health_timeout)
+            if res.status_code == 200:
+                tokens = res.json().get("tokens")
+                if isinstance(tokens, list):
+                    return tokens
+        except (requests.exceptions.RequestException, ValueError, AttributeError):
+            pass
+        return None
+
     def reset(self):
         """Reset model session / KV cache trên llama.cpp (nếu hỗ trợ)."""
         url = f"{self.host}/reset"
         try:
-            res = requests.post(url, timeout=10)
+            res = self.session.post(url, timeout=10)
             if res.status_code == 200:
                 print("🧹 Phiên đã reset (KV cache cleared)")
             else:
@@ -116,28 +512,54 @@ class LocalLlamaClient:
                  top_p: float = 0.9,
                  stop: Optional[List[str]] = None,
                  grammar: Optional[str] = None,
-                 json_mode: bool = False) -> Dict[str, Any]:
+                 json_schema: Optional[Dict[str, Any]] = None,
+                 json_mode: bool = False,
+                 stream: Optional[bool] = None,
+                 cache_prompt: bool = True,
+                 slot_key: Optional[str] = None,
+                 seed: Optional[int] = None) -> Dict[str, Any]:
+        """
+        stream=None → dùng self.stream_json. Khi stream, kết quả có thêm
+        "stream": {"aborted", "tokens_generated", "tokens_saved"}.
+        cache_prompt/slot_key → gợi ý llama.cpp giữ KV cache của prompt và
+        gửi các lần gọi cùng slot_key vào cùng một slot.
+        Kết quả có "usage" (prompt_tokens, prefix_hit_tokens, ...) nếu server trả về.
+        grammar (GBNF) / json_schema → ràng buộc decode; bị bỏ qua nếu server không hỗ trợ.
+        """
         
         payload = {
             "prompt": prompt,
-            "stream": False,
+            "stream": self.stream_json if stream is None else bool(stream),
             "n_predict": max_tokens,
             "temperature": temperature,
             "top_p": top_p,
+            "cache_prompt": cache_prompt,
         }
 
+        if payload["stream"]:
+            # để lấy được timings (cache/prompt) cả khi ngắt stream sớm
+            payload["timings_per_token"] = True
+
+        if slot_key is not None:
+            payload["id_slot"] = self.slot_affinity.slot_for(slot_key)
+
         if stop:
             payload["stop"] = stop
+
+        if seed is not None:
+            payload["seed"] = seed
         
         if json_mode:
             payload["response_format"] = {"type": "json_object"}
-        elif grammar:
+        elif self.supports_grammar and grammar:
             payload["grammar"] = grammar
+        elif self.supports_grammar and json_schema:
+            payload["json_schema"] = json_schema
             
-        data = self._post(self._completion_endpoint, payload)
+        data = self._post(payload)
 
         if "error" in data:
-            return {"choices": [{"text": f"[LLAMA_ERROR] {data['error']}"}]}
+            return {"error": data["error"], "choices": [{"text": f"[LLAMA_ERROR] {data['error']}"}]}
         
         # Chuẩn hóa theo schema llama.cpp server
         content = data.get("content", "")
@@ -151,8 +573,87 @@ class LocalLlamaClient:
                 except Exception:
                     content = ""
 
-        return {
+        out = {
             "choices": [
                 {"text": content}
             ]
         }
+        if "stream" in data:
+            out["stream"] = data["stream"]
+
+        usage = _usage(data)
+        if usage:
+            out["usage"] = usage
+            with self._stats_lock:
+                self.usage_stats["calls"] += 1
+                self.usage_stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+                self.usage_stats["prefix_hit_tokens"] += usage.get("prefix_hit_tokens", 0)
+        return out
+
+
+class AsyncLocalLlamaClient:
+    """
+    Phiên bản asyncio của LocalLlamaClient, cùng call contract:
+        await client(prompt, max_tokens=..., temperature=..., ...) -> {"choices":[{"text":...}]}
+
+    Mỗi request chạy trên một luồng của executor riêng, dùng chung session
+    keep-alive (và endpoint đã dò) của client đồng bộ bên dưới. Số request
+    đồng thời tối đa = max_concurrency (mặc định = pool_size), nên đặt bằng
+    số slot song song của llama.cpp server (--parallel).
+    """
+
+    def __init__(self,
+                 host: str = "http://localhost:8080",
+                 timeout: int = 270,
+                 retry: int = 3,
+                 wait_timeout: int = 300,
+                 pool_size: int = 4,
+                 stream_json: bool = False,
+                 max_concurrency: Optional[int] = None,
+                 client: Optional[LocalLlamaClient] = None):
+
+        self.client = client or LocalLlamaClient(host, timeout=timeout, retry=retry,
+                                                 wait_timeout=wait_timeout, pool_size=pool_size,
+                                                 stream_json=stream_json)
+        self.max_concurrency = max_concurrency or getattr(self.client, "pool_size", pool_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix="llama-async")
+
+    @property
+    def host(self) -> str:
+        return getattr(self.client, "host", "")
+
+    @property
+    def model_id(self) -> str:
+        return getattr(self.client, "model_id", "")
+
+    @property
+    def retry_policy(self) -> Optional[Client_Retry.RetryPolicy]:
+        return getattr(self.client, "retry_policy", None)
+
+    @property
+    def n_ctx(self) -> Optional[int]:
+        return getattr(self.client, "n_ctx", None)
+
+    @property
+    def supports_grammar(self) -> bool:
+        return bool(getattr(self.client, "supports_grammar", False))
+
+    async def __call__(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        # copy context → luồng worker thấy cùng RetryBudget của lời gọi logic
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, partial(ctx.run, self.client, prompt, **kwargs))
+
+    def tokenize(self, text: str) -> Optional[List[int]]:
+        # đồng bộ: TokenBudget gọi từ luồng worker
+        return self.client.tokenize(text)
+
+    async def reset(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.client.reset)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        if hasattr(self.client, "close"):
+            self.client.close()
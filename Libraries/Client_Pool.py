@@ -0,0 +1,219 @@
+# Libraries/Client_Pool.py
+
+import time
+import threading
+
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Set
+
+from . import Client_Llama
+from . import Client_Retry
+
+# ==============================
+
+# Client_Pool.py
+# Gom nhiều llama.cpp server thành MỘT callable, cùng contract với LocalLlamaClient:
+#     pool(prompt, max_tokens=..., temperature=..., ...) -> {"choices":[{"text":...}]}
+# - Định tuyến: backend khỏe có ít request đang chạy nhất (least-outstanding-requests)
+# - Loại backend lỗi liên tiếp / rớt health-check, đưa lại khi hồi phục
+# - slot_key (vd. bài viết) được giữ trên cùng backend để tận dụng KV cache
+# - Một RetryPolicy dùng chung: failover giữa các backend tiêu cùng ngân sách của lời gọi;
+#   mỗi backend có circuit breaker riêng
+
+_STICKY_CAPACITY = 4096
+
+class _Backend:
+    __slots__ = ("host", "client", "healthy", "in_flight", "failures", "served")
+
+    def __init__(self, host: str, client: Client_Llama.LocalLlamaClient):
+        self.host = host
+        self.client = client
+        self.healthy = False
+        self.in_flight = 0
+        self.failures = 0
+        self.served = 0
+
+
+class LlamaClientPool:
+    def __init__(self,
+                 hosts: List[str],
+                 timeout: int = 270,
+                 retry: int = 1,
+                 wait_timeout: int = 300,
+                 pool_size: int = 4,
+                 stream_json: bool = False,
+                 max_failures: int = 3,
+                 health_interval: float = 10.0,
+                 retry_policy: Optional[Client_Retry.RetryPolicy] = None,
+                 breaker_threshold: int = 5,
+                 breaker_reset: float = 30.0):
+        """
+        retry mặc định 1: khi một backend lỗi, chuyển ngay sang backend khác
+        thay vì thử lại nhiều lần trên cùng server.
+        """
+        if not hosts:
+            raise ValueError("LlamaClientPool cần ít nhất một host.")
+
+        self.max_failures = max_failures
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._cursor = 0
+        self._closed = threading.Event()
+        self._sticky: "OrderedDict[str, str]" = OrderedDict()
+        self.retry_policy = retry_policy or Client_Retry.RetryPolicy(max_attempts=max(len(hosts), 3))
+
+        self.backends: List[_Backend] = [
+            _Backend(h.rstrip("/"), Client_Llama.LocalLlamaClient(
+                h, timeout=timeout, retry=retry, wait_timeout=None,
+                pool_size=pool_size, stream_json=stream_json,
+                retry_policy=self.retry_policy,
+                breaker=Client_Retry.CircuitBreaker(breaker_threshold, breaker_reset, name=h.rstrip("/"))))
+            for h in hosts
+        ]
+
+        self.wait_for_any_ready(wait_timeout)
+
+        self._health_thread = threading.Thread(target=self._health_loop, name="llama-pool-health", daemon=True)
+        self._health_thread.start()
+
+    # ---------------- HEALTH ----------------
+    def wait_for_any_ready(self, wait_timeout: int):
+        """Chờ đến khi ít nhất một backend sẵn sàng (các backend còn lại được health-loop đưa vào sau)."""
+        start_time = time.time()
+        print(f"⏳ Đang kiểm tra {len(self.backends)} Llama server...")
+
+        while True:
+            self.check_backends()
+            healthy = [b.host for b in self.backends if b.healthy]
+            if healthy:
+                print(f"✅ Sẵn sàng: {len(healthy)}/{len(self.backends)} server.")
+                return
+            if time.time() - start_time > wait_timeout:
+                raise TimeoutError(f"Không server nào sẵn sàng sau {wait_timeout}s.")
+            time.sleep(5)
+
+    def check_backends(self):
+        """Một lượt health-check: loại backend hỏng, đưa backend hồi phục trở lại."""
+        for b in self.backends:
+            ok = b.client.check_health()
+            if ok and not b.healthy:
+                b.client.negotiate_endpoint()
+                with self._lock:
+                    b.healthy, b.failures = True, 0
+                print(f"🟢 Backend {b.host} đã sẵn sàng.")
+            elif not ok and b.healthy:
+                with self._lock:
+                    b.healthy = False
+                print(f"🔴 Backend {b.host} rớt health-check → tạm loại.")
+
+    def _health_loop(self):
+        while not self._closed.wait(self.health_interval):
+            try:
+                self.check_backends()
+            except Exception as e:
+                print(f"⚠️ Lỗi health-loop: {e}")
+
+    # ---------------- ROUTING ----------------
+    def _acquire(self, exclude: Set[str], slot_key: Optional[str] = None) -> Optional[_Backend]:
+        with self._lock:
+            candidates = [b for b in self.backends if b.healthy and b.host not in exclude]
+            if not candidates:
+                return None
+
+            best = None
+            if slot_key is not None and slot_key in self._sticky:
+                best = next((b for b in candidates if b.host == self._sticky[slot_key]), None)
+
+            if best is None:
+                # ít request đang chạy nhất; hòa → xoay vòng để chia đều
+                n = len(self.backends)
+                best = min(candidates, key=lambda b: (b.in_flight, (self.backends.index(b) - self._cursor) % n))
+                self._cursor = (self.backends.index(best) + 1) % n
+
+            if slot_key is not None:
+                self._sticky[slot_key] = best.host
+                self._sticky.move_to_end(slot_key)
+                if len(self._sticky) > _STICKY_CAPACITY:
+                    self._sticky.popitem(last=False)
+
+            best.in_flight += 1
+            return best
+
+    def _release(self, b: _Backend, ok: bool):
+        with self._lock:
+            b.in_flight -= 1
+            if ok:
+                b.failures = 0
+                b.served += 1
+                return
+            b.failures += 1
+            if b.healthy and b.failures >= self.max_failures:
+                b.healthy = False
+                print(f"🔴 Backend {b.host} lỗi {b.failures} lần liên tiếp → tạm loại.")
+
+    def __call__(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        tried: Set[str] = set()
+        last_error = "NO_HEALTHY_BACKEND"
+
+        with self.retry_policy.scope() as budget:
+            while True:
+                b = self._acquire(tried, kwargs.get("slot_key")) if budget.has_budget() else None
+                if b is None:
+                    return {"error": last_error, "choices": [{"text": f"[LLAMA_ERROR] {last_error}"}]}
+
+                ok = False
+                try:
+                    resp = b.client(prompt, **kwargs)
+                    ok = "error" not in resp
+                    if ok:
+                        return resp
+                    last_error = resp["error"]
+                except Exception as e:
+                    last_error = str(e)
+                finally:
+                    self._release(b, ok)
+
+                tried.add(b.host)
+
+    # ---------------- MISC ----------------
+    @property
+    def pool_size(self) -> int:
+        return sum(b.client.pool_size for b in self.backends)
+
+    @property
+    def model_id(self) -> str:
+        return next((b.client.model_id for b in self.backends if b.client.model_id), "")
+
+    @property
+    def n_ctx(self) -> Optional[int]:
+        # backend nhỏ nhất quyết định (request có thể rơi vào bất kỳ backend nào)
+        known = [b.client.n_ctx for b in self.backends if b.client.n_ctx]
+        return min(known) if known else None
+
+    @property
+    def supports_grammar(self) -> bool:
+        # backend không hỗ trợ tự bỏ grammar khi gửi
+        return any(b.client.supports_grammar for b in self.backends)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"host": b.host, "healthy": b.healthy, "in_flight": b.in_flight,
+                     "failures": b.failures, "served": b.served,
+                     "circuit": b.client.breaker.state} for b in self.backends]
+
+    def tokenize(self, text: str) -> Optional[List[int]]:
+        # mọi backend chạy cùng model → dùng backend khỏe đầu tiên
+        for b in self.backends:
+            if b.healthy:
+                return b.client.tokenize(text)
+        return None
+
+    def reset(self):
+        for b in self.backends:
+            if b.healthy:
+                b.client.reset()
+
+    def close(self):
+        self._closed.set()
+        for b in self.backends:
+            b.client.close()
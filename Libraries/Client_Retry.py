@@ -0,0 +1,220 @@
+# Libraries/Client_Retry.py
+
+import time
+import random
+import threading
+import contextvars
+
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator
+
+# ==============================
+
+# Client_Retry.py
+# MỘT chính sách retry dùng chung cho client (HTTP) và flow (parse / gọi LLM):
+# - RetryBudget: ngân sách cho MỘT lời gọi logic (số lần thử + deadline tổng).
+#   Các tầng lồng nhau (flow → call_llm → pool → client._post) cùng tiêu một ngân sách
+#   (contextvar), nên số request không còn nhân lên theo từng tầng.
+# - Backoff lũy thừa + full jitter, không vượt quá thời gian còn lại của deadline
+# - CircuitBreaker (mỗi server một cái): server sập → từ chối ngay, thử lại sau reset_timeout
+# - Metrics: số lần thử / lời gọi logic (retry amplification), lý do hết ngân sách...
+
+CIRCUIT_OPEN = "CIRCUIT_OPEN"
+BUDGET_EXHAUSTED = "RETRY_BUDGET_EXHAUSTED"
+
+_CURRENT_BUDGET: "contextvars.ContextVar[Optional[RetryBudget]]" = contextvars.ContextVar(
+    "llama_retry_budget", default=None)
+
+def current_budget() -> Optional["RetryBudget"]:
+    return _CURRENT_BUDGET.get()
+
+
+class RetryBudget:
+    """Ngân sách của một lời gọi logic; an toàn khi nhiều luồng cùng tiêu (executor / to_thread)."""
+
+    def __init__(self, policy: "RetryPolicy"):
+        self.policy = policy
+        self.max_attempts = policy.max_attempts
+        self.started = time.monotonic()
+        self.deadline_at = self.started + policy.deadline if policy.deadline else None
+        self.attempts = 0
+        self.exhausted: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        if self.deadline_at is None:
+            return float("inf")
+        return max(0.0, self.deadline_at - time.monotonic())
+
+    def has_budget(self) -> bool:
+        with self._lock:
+            return self._check()
+
+    def _check(self) -> bool:
+        if self.attempts >= self.max_attempts:
+            self.exhausted = self.exhausted or "attempts"
+            return False
+        if self.remaining() <= 0:
+            self.exhausted = self.exhausted or "deadline"
+            return False
+        return True
+
+    def acquire(self) -> bool:
+        """Giữ chỗ cho một lần thử. False → hết lượt hoặc quá deadline."""
+        with self._lock:
+            if not self._check():
+                return False
+            self.attempts += 1
+            return True
+
+    def settle(self, mark: int) -> None:
+        """Tầng ngoài gọi sau một lần thử: nếu tầng trong không tiêu lượt nào thì tính một lượt."""
+        with self._lock:
+            if self.attempts == mark:
+                self.attempts += 1
+
+    def timeout(self, per_attempt: float) -> float:
+        """Timeout của một request: không vượt quá thời gian còn lại."""
+        return max(0.1, min(per_attempt, self.remaining()))
+
+    def backoff_delay(self) -> float:
+        """Full jitter: uniform(0, min(max_delay, base * 2^(n-1))), cắt theo deadline."""
+        p = self.policy
+        cap = min(p.max_delay, p.base_delay * (2 ** max(0, self.attempts - 1)))
+        delay = random.uniform(0, cap) if p.jitter else cap
+        return min(delay, self.remaining())
+
+    def sleep(self) -> None:
+        delay = self.backoff_delay()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class RetryPolicy:
+    """
+    max_attempts : tổng số lần thử (request HTTP hoặc lần gọi LLM) cho một lời gọi logic
+    deadline     : tổng thời gian (giây) cho một lời gọi logic; None → không giới hạn
+    base_delay / max_delay / jitter : exponential backoff (full jitter)
+
+    Ví dụ:
+        with policy.scope() as budget:       # tầng ngoài mở ngân sách
+            while budget.acquire(): ...      # tầng trong dùng lại chính ngân sách đó
+    """
+
+    def __init__(self,
+                 max_attempts: int = 6,
+                 deadline: Optional[float] = 600.0,
+                 base_delay: float = 0.5,
+                 max_delay: float = 8.0,
+                 jitter: bool = True):
+        self.max_attempts = max(1, int(max_attempts))
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Any] = {
+            "logical_calls": 0,
+            "attempts": 0,
+            "retried_calls": 0,
+            "exhausted_attempts": 0,
+            "exhausted_deadline": 0,
+            "circuit_rejections": 0,
+            "attempts_per_call": {},
+        }
+
+    @classmethod
+    def from_config(cls, params: Optional[Dict[str, Any]]) -> "RetryPolicy":
+        params = params or {}
+        keys = ("max_attempts", "deadline", "base_delay", "max_delay", "jitter")
+        return cls(**{k: params[k] for k in keys if k in params})
+
+    @contextmanager
+    def scope(self) -> Iterator[RetryBudget]:
+        """Mở ngân sách mới nếu chưa có; nếu đã nằm trong một lời gọi logic thì dùng lại."""
+        budget = _CURRENT_BUDGET.get()
+        if budget is not None:
+            yield budget
+            return
+
+        budget = RetryBudget(self)
+        token = _CURRENT_BUDGET.set(budget)
+        try:
+            yield budget
+        finally:
+            _CURRENT_BUDGET.reset(token)
+            self._record(budget)
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.metrics[key] = self.metrics.get(key, 0) + 1
+
+    def _record(self, budget: RetryBudget) -> None:
+        with self._lock:
+            m = self.metrics
+            m["logical_calls"] += 1
+            m["attempts"] += budget.attempts
+            m["retried_calls"] += int(budget.attempts > 1)
+            if budget.exhausted:
+                m[f"exhausted_{budget.exhausted}"] += 1
+            hist = m["attempts_per_call"]
+            hist[budget.attempts] = hist.get(budget.attempts, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            m = dict(self.metrics, attempts_per_call=dict(sorted(self.metrics["attempts_per_call"].items())))
+        m["amplification"] = round(m["attempts"] / m["logical_calls"], 3) if m["logical_calls"] else 0.0
+        return m
+
+
+class CircuitBreaker:
+    """
+    closed    : bình thường
+    open      : failure_threshold lỗi liên tiếp → từ chối ngay trong reset_timeout giây
+    half_open : hết reset_timeout → cho đúng một request thăm dò; thành công → closed, lỗi → open
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, name: str = ""):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                print(f"🟢 Circuit {self.name} đóng lại (server hồi phục).")
+            self.state, self.failures, self._probing = "closed", 0, False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                if self.state == "closed":
+                    print(f"🔴 Circuit {self.name} mở sau {self.failures} lỗi liên tiếp → từ chối trong {self.reset_timeout}s.")
+                self.state, self.opened_at, self._probing = "open", time.monotonic(), False
+
+    def release_probe(self) -> None:
+        """Request thăm dò kết thúc mà không ghi được kết quả (hết ngân sách, lỗi khác, bị huỷ) → nhả lượt thăm dò."""
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
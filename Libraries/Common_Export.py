@@ -0,0 +1,207 @@
+# Libraries/Common_Export.py
+
+import os
+import json
+
+import openpyxl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pathlib import Path
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from typing import Callable, Iterable, Iterator, Dict, Any, List, Optional, Tuple, Union
+
+from . import Common_Helpers as helpers
+from . import Store_History_Log
+from . import Store_History_Sqlite
+from . import Tools_Json_Repair
+
+# ==============================
+
+# Common_Export.py
+# Xuất lịch sử batch (một dòng / vòng) ra file cột cho công cụ phân tích:
+#   nguồn   : dict lịch sử, file .json / .hist.jsonl[.gz], file .sqlite (HistoryDB), HistoryLog (segment)
+#   dòng    : run, lang, key, index, round, 6 điểm, average_score, số từ, summary, feedback, error
+#   Parquet : pyarrow.ParquetWriter, ghi từng RecordBatch (batch_rows dòng) → bộ nhớ giới hạn
+#   XLSX    : openpyxl write-only (stream từng dòng ra đĩa, không dựng workbook trong RAM)
+# File được ghi ra <path>.tmp rồi os.replace.
+
+SCORE_KEYS = list(Tools_Json_Repair.SCORE_KEYS)
+
+SCHEMA = pa.schema(
+    [
+        ("run", pa.string()),
+        ("lang", pa.string()),
+        ("key", pa.string()),
+        ("index", pa.int32()),
+        ("round", pa.int16()),
+    ]
+    + [(k, pa.int8()) for k in SCORE_KEYS]
+    + [
+        ("average_score", pa.float64()),
+        ("article_words", pa.int32()),
+        ("summary_words", pa.int32()),
+        ("feedback_words", pa.int32()),
+        ("summary", pa.string()),
+        ("feedback", pa.string()),
+        ("error", pa.string()),
+    ]
+)
+COLUMNS = SCHEMA.names
+
+# Giới hạn ký tự một ô Excel
+_XLSX_CELL_MAX = 32767
+
+Source = Union[Dict[str, Any], str, Path, Store_History_Log.HistoryLog, Store_History_Sqlite.HistoryDB]
+
+
+# ---------------- ROWS ----------------
+def _words(text: Any) -> int:
+    return len(text.split()) if isinstance(text, str) else 0
+
+class _LastWords:
+    """Đếm từ, nhớ văn bản gần nhất: các vòng của cùng một bài lặp lại nguyên article."""
+    __slots__ = ("text", "n")
+
+    def __init__(self):
+        self.text, self.n = None, 0
+
+    def __call__(self, text: Any) -> int:
+        if text != self.text:
+            self.text, self.n = text, _words(text)
+        return self.n
+
+def flatten_round(key: str, record: Dict[str, Any], run: Optional[str] = None,
+                  lang: Optional[str] = None, article_words: Callable[[Any], int] = _words) -> Dict[str, Any]:
+    """Một record vòng trong lịch sử → một dòng theo SCHEMA."""
+    evaluation = helpers.parse_evaluation(record.get("evaluation"))
+    summary = helpers.reasoning_summary(record.get("reasoning"))
+    feedback = record.get("feedback") if isinstance(record.get("feedback"), str) else None
+    article = record.get("article:") or record.get("article")
+    error = record.get("error")
+    row = {
+        "run": run,
+        "lang": lang,
+        "key": key,
+        "index": helpers._get_sort_key(key),
+        "round": helpers.to_int(record.get("round"), None),
+        "average_score": helpers.to_float(record.get("average_score")),
+        "article_words": article_words(article),
+        "summary_words": _words(summary),
+        "feedback_words": _words(feedback),
+        "summary": summary if isinstance(summary, str) else None,
+        "feedback": feedback,
+        "error": json.dumps(error, ensure_ascii=False) if error is not None else None,
+    }
+    for k in SCORE_KEYS:
+        row[k] = Tools_Json_Repair.score_value(evaluation.get(k))
+    return row
+
+def iter_history_records(source: Source, run: Optional[str] = None,
+                         lang: Optional[str] = None) -> Iterator[Tuple[Optional[str], Optional[str], str, Dict[str, Any]]]:
+    """
+    (run, lang, key, record vòng) từ mọi nguồn lịch sử.
+    Mọi nguồn đều đọc tuần tự (file .json qua Common_Readers, từng mục một).
+    """
+    if isinstance(source, Store_History_Sqlite.HistoryDB):
+        yield from source.iter_rounds(run=run, lang=lang)
+        return
+    if isinstance(source, Store_History_Log.HistoryLog):
+        run = run if run is not None else source.path.stem
+        lang = lang or Store_History_Sqlite.lang_of(source.path)
+        for key, entry in source.iter_entries():
+            for record in helpers.rounds_of(entry):
+                yield run, lang, key, record
+        return
+    if isinstance(source, (str, Path)):
+        path = Path(source)
+        if path.suffix in (".sqlite", ".db"):
+            db = Store_History_Sqlite.HistoryDB(path)
+            try:
+                yield from iter_history_records(db, run=run, lang=lang)
+            finally:
+                db.close()
+            return
+        run = run if run is not None else Store_History_Sqlite.run_of(path)
+        lang = lang or Store_History_Sqlite.lang_of(path)
+        for key, rounds, _ in Store_History_Sqlite.iter_history_file(path):
+            for record in rounds:
+                yield run, lang, key, record
+        return
+    for key, rounds in Store_History_Sqlite.iter_history(source):
+        for record in rounds:
+            yield run, lang, key, record
+
+def iter_history_rows(source: Source, run: Optional[str] = None,
+                      lang: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Dòng (theo SCHEMA) từ mọi nguồn lịch sử (xem iter_history_records)."""
+    article_words = _LastWords()
+    for run_, lang_, key, record in iter_history_records(source, run, lang):
+        yield flatten_round(key, record, run_, lang_, article_words)
+
+def iter_record_batches(rows: Iterable[Dict[str, Any]], batch_rows: int = 8192) -> Iterator[pa.RecordBatch]:
+    """Gom dòng thành pyarrow.RecordBatch, mỗi batch ≤ batch_rows dòng."""
+    buf: List[Dict[str, Any]] = []
+    for row in rows:
+        buf.append(row)
+        if len(buf) >= batch_rows:
+            yield pa.RecordBatch.from_pylist(buf, schema=SCHEMA)
+            buf = []
+    if buf:
+        yield pa.RecordBatch.from_pylist(buf, schema=SCHEMA)
+
+
+# ---------------- WRITERS ----------------
+def _tmp_path(path: Path) -> Path:
+    if path.parent:
+        os.makedirs(path.parent, exist_ok=True)
+    return path.with_name(path.name + ".tmp")
+
+def write_parquet(source: Source, path: Union[str, Path], batch_rows: int = 8192,
+                  compression: str = "zstd", run: Optional[str] = None, lang: Optional[str] = None) -> int:
+    """Ghi Parquet theo từng batch (mỗi batch = một row group). Trả về số dòng."""
+    path = Path(path)
+    tmp = _tmp_path(path)
+    n = 0
+    with pq.ParquetWriter(str(tmp), SCHEMA, compression=compression) as writer:
+        for batch in iter_record_batches(iter_history_rows(source, run, lang), batch_rows):
+            writer.write_batch(batch)
+            n += batch.num_rows
+    os.replace(tmp, path)
+    return n
+
+def _cell(v: Any) -> Any:
+    if isinstance(v, str):
+        v = ILLEGAL_CHARACTERS_RE.sub("", v)
+        return v[:_XLSX_CELL_MAX]
+    return v
+
+def write_xlsx_stream(source: Source, path: Union[str, Path], sheet_name: str = "Rounds",
+                      run: Optional[str] = None, lang: Optional[str] = None) -> int:
+    """XLSX bằng worksheet write-only (stream). Trả về số dòng (không tính header)."""
+    path = Path(path)
+    tmp = _tmp_path(path)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name)
+    ws.append(COLUMNS)
+    n = 0
+    for row in iter_history_rows(source, run, lang):
+        ws.append([_cell(row[c]) for c in COLUMNS])
+        n += 1
+    wb.save(str(tmp))
+    os.replace(tmp, path)
+    return n
+
+def export_history(source: Source, out_path: Union[str, Path], formats: Iterable[str] = ("parquet", "xlsx"),
+                   **kwargs) -> Dict[str, Any]:
+    """out_path không cần đuôi: Output/Exports/Histories-VI → .parquet / .xlsx."""
+    out_path = Path(out_path)
+    writers = {"parquet": write_parquet, "xlsx": write_xlsx_stream}
+    result = {}
+    for fmt in formats:
+        if fmt not in writers:
+            raise ValueError(f"Unknown export format: {fmt!r} (expected one of {list(writers)})")
+        target = out_path.with_suffix(f".{fmt}")
+        result[fmt] = {"path": str(target), "rows": writers[fmt](source, target, **kwargs)}
+        print(f"📤 {fmt}: {result[fmt]['rows']} dòng → {target}")
+    return result
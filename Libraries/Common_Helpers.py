@@ -1,5 +1,6 @@
 # Libraries/Common_Helpers.py
 
+import ast
 import json
 import os
 
@@ -7,7 +8,7 @@ from pathlib import Path
 from statistics import mean
 from collections import OrderedDict
 from typing import OrderedDict as OrderedDictType
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 # ==============================
 
@@ -205,3 +206,50 @@ def update_json_dict(key: str, data: Any, path: Path, indent: int = 2):
             json.dump(sorted_dict, f, indent=indent, ensure_ascii=False)
     except Exception as e:
         print(f"❌ Lỗi khi ghi {path}: {e}")
+
+
+# ---------------- HISTORY RECORDS ----------------
+# Chuẩn hoá record vòng trong lịch sử — dùng chung cho Store_History_Sqlite, Common_Export,
+# Processor_Analytics (cùng một cách đọc → các kết quả không lệch nhau)
+
+def to_float(v: Any) -> Optional[float]:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def to_int(v: Any, default: Optional[int] = -1) -> Optional[int]:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return default
+
+def parse_evaluation(v: Any) -> Dict[str, Any]:
+    """evaluation: dict (bản mới) hoặc str(dict) với nháy đơn (file cũ); không đọc được → {}."""
+    if isinstance(v, dict):
+        return v
+    if isinstance(v, str) and v.strip():
+        try:
+            obj = ast.literal_eval(v)
+            return obj if isinstance(obj, dict) else {}
+        except (ValueError, SyntaxError):
+            return {}
+    return {}
+
+def reasoning_summary(reasoning: Any) -> Optional[str]:
+    """Trường summary của reasoning (dict hoặc chuỗi JSON)."""
+    if isinstance(reasoning, dict):
+        return reasoning.get("summary")
+    if isinstance(reasoning, str):
+        try:
+            obj = json.loads(reasoning)
+        except json.JSONDecodeError:
+            return None
+        return obj.get("summary") if isinstance(obj, dict) else None
+    return None
+
+def rounds_of(data: Any) -> List[Dict[str, Any]]:
+    """Các record vòng của một mục lịch sử (list rounds hoặc {rounds, stats})."""
+    if isinstance(data, dict):
+        data = data.get("rounds")
+    return [r for r in data if isinstance(r, dict)] if isinstance(data, list) else []
@@ -0,0 +1,222 @@
+# Libraries/Common_Readers.py
+
+import os
+import re
+import json
+import mmap
+
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterator, Tuple, Dict, Any, Optional, Union
+
+# ==============================
+
+# Common_Readers.py
+# Đọc JSON / JSONL lớn với bộ nhớ không đổi (thay cho json.load cả file):
+#   iter_jsonl       : từng dòng JSONL (bỏ dòng hỏng / dòng cuối bị cắt)
+#   iter_json_dict   : từng cặp (key, value) của dict cấp cao nhất ({index_N: ...})
+#   iter_json_array  : từng phần tử của list cấp cao nhất
+#   JsonDictIndex    : chỉ mục byte-offset (file .idx cạnh file JSON) → lấy một index_N
+#                      mà không parse phần còn lại
+# File được mmap: chỉ quét ranh giới giá trị ở mức byte (ký tự cấu trúc JSON đều là ASCII,
+# byte của ký tự UTF-8 nhiều byte không bao giờ trùng) rồi json.loads đúng đoạn cần.
+
+_STRUCT_RE = re.compile(rb'["{}\[\]]')
+_IN_STRING_RE = re.compile(rb'["\\]')
+_WS_RE = re.compile(rb'[ \t\r\n]*')
+_SCALAR_END_RE = re.compile(rb'[,}\]\s]')
+
+_QUOTE, _BACKSLASH = ord('"'), ord("\\")
+_OPEN = (ord("{"), ord("["))
+
+PathLike = Union[str, Path]
+
+
+@contextmanager
+def _mapped(path: PathLike):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield buf
+        finally:
+            buf.close()
+
+def _skip_ws(buf, pos: int) -> int:
+    return _WS_RE.match(buf, pos).end()
+
+def _expect(buf, pos: int, char: bytes, path: PathLike) -> int:
+    if buf[pos:pos + 1] != char:
+        got = buf[pos:pos + 20]
+        raise ValueError(f"❌ {path}: expected {char.decode()!r} at byte {pos}, got {got!r}")
+    return pos + 1
+
+def _string_end(buf, pos: int) -> int:
+    """pos = dấu " mở → vị trí ngay sau dấu " đóng."""
+    i = pos + 1
+    while True:
+        m = _IN_STRING_RE.search(buf, i)
+        if m is None:
+            raise ValueError(f"❌ Unterminated string at byte {pos}")
+        if buf[m.start()] == _BACKSLASH:
+            i = m.start() + 2
+            continue
+        return m.end()
+
+def _value_end(buf, pos: int) -> int:
+    """Vị trí ngay sau giá trị JSON bắt đầu tại pos (không parse nội dung)."""
+    c = buf[pos]
+    if c == _QUOTE:
+        return _string_end(buf, pos)
+    if c not in _OPEN:
+        m = _SCALAR_END_RE.search(buf, pos)
+        return m.start() if m else len(buf)
+    depth = 0
+    i = pos
+    while True:
+        m = _STRUCT_RE.search(buf, i)
+        if m is None:
+            raise ValueError(f"❌ Unterminated value at byte {pos}")
+        ch = buf[m.start()]
+        if ch == _QUOTE:
+            i = _string_end(buf, m.start())
+            continue
+        depth += 1 if ch in _OPEN else -1
+        i = m.end()
+        if depth == 0:
+            return i
+
+
+# ---------------- JSONL ----------------
+def iter_jsonl(path: PathLike, skip_invalid: bool = True) -> Iterator[Any]:
+    """Từng bản ghi JSONL; skip_invalid=False → raise ở dòng hỏng đầu tiên."""
+    with open(path, "rb") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                if not skip_invalid:
+                    raise ValueError(f"❌ {path}: invalid JSON on line {n}")
+
+
+# ---------------- TOP-LEVEL DICT / ARRAY ----------------
+def iter_json_spans(path: PathLike) -> Iterator[Tuple[str, int, int]]:
+    """(key, byte bắt đầu, byte kết thúc) của từng giá trị trong dict cấp cao nhất."""
+    with _mapped(path) as buf:
+        if not buf:
+            return
+        pos = _expect(buf, _skip_ws(buf, 0), b"{", path)
+        pos = _skip_ws(buf, pos)
+        if buf[pos:pos + 1] == b"}":
+            return
+        while True:
+            key_end = _string_end(buf, _expect(buf, pos, b'"', path) - 1)
+            key = json.loads(buf[pos:key_end])
+            pos = _skip_ws(buf, _expect(buf, _skip_ws(buf, key_end), b":", path))
+            end = _value_end(buf, pos)
+            yield key, pos, end
+            pos = _skip_ws(buf, end)
+            if buf[pos:pos + 1] == b"}":
+                return
+            pos = _skip_ws(buf, _expect(buf, pos, b",", path))
+
+def iter_json_dict(path: PathLike) -> Iterator[Tuple[str, Any]]:
+    """Từng (key, value) của {index_N: ...}; mỗi lúc chỉ một value nằm trong bộ nhớ."""
+    with _mapped(path) as buf:
+        for key, start, end in iter_json_spans(path):
+            yield key, json.loads(buf[start:end])
+
+def iter_json_array(path: PathLike) -> Iterator[Any]:
+    """Từng phần tử của list cấp cao nhất (vd. file dữ liệu [ {...}, {...} ])."""
+    with _mapped(path) as buf:
+        if not buf:
+            return
+        pos = _expect(buf, _skip_ws(buf, 0), b"[", path)
+        pos = _skip_ws(buf, pos)
+        if buf[pos:pos + 1] == b"]":
+            return
+        while True:
+            end = _value_end(buf, pos)
+            yield json.loads(buf[pos:end])
+            pos = _skip_ws(buf, end)
+            if buf[pos:pos + 1] == b"]":
+                return
+            pos = _skip_ws(buf, _expect(buf, pos, b",", path))
+
+
+# ---------------- BYTE-OFFSET INDEX ----------------
+def index_path(path: PathLike) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + ".idx")
+
+class JsonDictIndex:
+    """
+    Ví dụ:
+        idx = JsonDictIndex("Output/Histories-Batch-EN-merged.json")
+        idx.get("index_42")          # đọc đúng một mục (seek + json.loads)
+        list(idx.keys())[:5]
+
+    Chỉ mục lưu ở <file>.idx kèm size + mtime của file; file đổi → tự dựng lại.
+    """
+
+    def __init__(self, path: PathLike, persist: bool = True):
+        self.path = Path(path)
+        self.persist = persist
+        self.spans: Dict[str, Tuple[int, int]] = {}
+        self._load_or_build()
+
+    def _stamp(self) -> Dict[str, int]:
+        st = self.path.stat()
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    def _load_or_build(self):
+        stamp = self._stamp()
+        sidecar = index_path(self.path)
+        if sidecar.exists():
+            try:
+                with open(sidecar, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                if saved.get("size") == stamp["size"] and saved.get("mtime_ns") == stamp["mtime_ns"]:
+                    self.spans = {k: tuple(v) for k, v in saved["spans"].items()}
+                    return
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                pass
+        self.rebuild(stamp)
+
+    def rebuild(self, stamp: Optional[Dict[str, int]] = None):
+        stamp = stamp or self._stamp()
+        self.spans = {key: (start, end) for key, start, end in iter_json_spans(self.path)}
+        if not self.persist:
+            return
+        sidecar = index_path(self.path)
+        tmp = sidecar.with_name(sidecar.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**stamp, "spans": self.spans}, f, ensure_ascii=False)
+        os.replace(tmp, sidecar)
+
+    def keys(self):
+        return self.spans.keys()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.spans
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        span = self.spans.get(key)
+        if span is None:
+            return default
+        start, end = span
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return json.loads(f.read(end - start))
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.spans:
+            raise KeyError(key)
+        return self.get(key)
@@ -118,9 +118,9 @@ def read_xlsx(path: str, sheet_name: str = None) -> List[dict]:
 def write_xlsx(data: List[dict], path: str, sheet_name: str = "Sheet1") -> None:
     dir_path = os.path.dirname(path)
     if dir_path: os.makedirs(dir_path, exist_ok=True)
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = sheet_name
+    # write-only: dòng được stream ra đĩa, không giữ cả workbook trong RAM
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name)
     if not data:
         wb.save(path)
         return
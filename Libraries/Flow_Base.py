@@ -2,19 +2,34 @@
 
 import json
 import re
-import time
+import asyncio
+import inspect
+import contextvars
 
-from typing import Callable, Dict, Any, List
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from . import Client_Retry
+from . import Tools_Grammar
+from . import Tools_Prompt_Builder
+from . import Tools_Token_Budget
 
 # ==============================
 
 # Flow_Base.py
 # Shared utilities for Reasoning / Critic flows.
-# - Robust LLM call with retries
+# - Robust LLM call with retries (sync + asyncio), sharing the client's RetryPolicy budget
 # - Extract FIRST top-level JSON only
 # - Minimal JSON validation hooks
 # - Sanitization
 # - Word-count helper
+# - Prompt layout (KV-cache prefix reuse) + per-call usage log
+# - Optional token budget (fit n_predict / trim prompt to the server context)
+# - Optional content-addressed response cache (Client_Cache.ResponseCache)
+# - Grammar-constrained decoding for the output schemas (Tools_Grammar), when the client supports it
+# - Long-document sizing (source token limit per prompt) for map-reduce flows
+
+def _is_async_callable(fn: Any) -> bool:
+    return inspect.iscoroutinefunction(fn) or inspect.iscoroutinefunction(getattr(fn, "__call__", None))
 
 class FlowError(Exception):
     pass
@@ -22,6 +37,13 @@ class FlowError(Exception):
 class JSONParseError(FlowError):
     pass
 
+# budget info of the prompt rendered last in this thread / task (concurrent chunk calls)
+_LAST_BUDGET: "contextvars.ContextVar[Optional[Dict[str, Any]]]" = contextvars.ContextVar(
+    "flow_last_budget", default=None)
+
+_LLAMA_ERROR = "[LLAMA_ERROR]"
+_FAIL_FAST = (Client_Retry.CIRCUIT_OPEN, Client_Retry.BUDGET_EXHAUSTED)
+
 class FlowBase:
     """
     Base class. Subclasses should:
@@ -29,27 +51,110 @@ class FlowBase:
         * str response, or
         * dict with ["choices"][0]["text"] / ["choices"][0]["message"]["content"]
       - optionally override postprocess()
+
+    retry_policy: Client_Retry.RetryPolicy shared with the client (defaults to client.retry_policy);
+      one logical call (a flow step) spends one attempt/deadline budget across all nested retries.
+    retries: legacy backoff list; only used as max attempts when neither side has a policy.
+    prompt_layout: "prefix" (stable segments first, for KV-cache reuse) or "legacy".
+    slot_affinity: send a per-(role, article) slot_key so rounds stay on one server slot.
+    token_budget: optional Tools_Token_Budget.TokenBudget; sizes n_predict per call.
+    cache: optional Client_Cache.ResponseCache; key = model_id + prompt + request kwargs.
+    model_id: model file used in the cache key (defaults to client.model_id).
+    grammar_mode: "gbnf" (default), "json_schema" or None; only sent to clients
+      reporting supports_grammar (LocalLlamaClient / pool / async client).
+    long_doc: allow map-reduce over chunks when the source does not fit one prompt.
+    chunk_tokens: source tokens per chunk; default derived from token_budget (no budget → off).
+    max_parallel_chunks: concurrent chunk calls in long-document mode.
+    call_log: per-call metadata ("usage", "stream" from the client, "budget").
+    candidate: best-of-N candidate index; every candidate (0 included) gets its own slot_key.
+    lane: extra slot_key tag for flows running concurrently on the same article and role
+      (e.g. "baseline" for round 0 next to round 1), so they do not share one llama.cpp slot.
     """
 
-    def __init__(self, client: Callable, retries: List[float] = None, request_kwargs: Dict[str, Any] = None):
+    candidate: int = 0
+    lane: str = ""
+
+    def __init__(self,
+                 client: Callable,
+                 retries: List[float] = None,
+                 request_kwargs: Dict[str, Any] = None,
+                 prompt_layout: str = "prefix",
+                 slot_affinity: bool = True,
+                 token_budget: Optional[Any] = None,
+                 cache: Optional[Any] = None,
+                 model_id: Optional[str] = None,
+                 retry_policy: Optional[Client_Retry.RetryPolicy] = None,
+                 grammar_mode: Optional[str] = "gbnf",
+                 long_doc: bool = True,
+                 chunk_tokens: Optional[int] = None,
+                 max_parallel_chunks: int = 4):
         self.client = client
         self.retries = retries or [0, 0.5, 1.0, 2.0]
+        self.retry_policy = (retry_policy or getattr(client, "retry_policy", None)
+                             or Client_Retry.RetryPolicy(max_attempts=len(self.retries)))
         self.request_kwargs = request_kwargs or {}
+        self.prompt_layout = prompt_layout
+        self.slot_affinity = slot_affinity
+        self.token_budget = token_budget
+        self.cache = cache
+        self.model_id = model_id or getattr(client, "model_id", "") or ""
+        if grammar_mode is not None and grammar_mode not in Tools_Grammar.MODES:
+            raise ValueError(f"Unknown grammar mode: {grammar_mode!r} (expected one of {Tools_Grammar.MODES})")
+        self.grammar_mode = grammar_mode
+        self.long_doc = long_doc
+        self.chunk_tokens = chunk_tokens
+        self.max_parallel_chunks = max(1, int(max_parallel_chunks))
+        self.call_log: List[Dict[str, Any]] = []
 
     # ---------------- PUBLIC API ----------------
-    def call_llm(self, prompt: str, **overrides) -> str:
-        """Call underlying LLM client with retry + simple backoff."""
+    def call_llm(self, prompt: str, accept: Optional[Callable[[str], bool]] = None, **overrides) -> str:
+        """
+        Call underlying LLM client with retry + jittered backoff (retry_policy).
+        Error responses count as failures; an open circuit or spent budget fails fast.
+        accept(raw) → False: the response is returned but not cached (and a cached copy is
+        dropped), so a parse retry of the same prompt reaches the server again.
+        """
         kwargs = {**self.request_kwargs, **overrides}
-        last_err = None
-        for delay in self.retries:
-            if delay > 0:
-                time.sleep(delay)
-            try:
-                raw = self._invoke_client(prompt, **kwargs)
-                return raw or ""
-            except Exception as e:
-                last_err = e
-        raise FlowError(f"LLM call failed after retries: {last_err}")
+        key, hit = self._cache_lookup(prompt, kwargs, accept)
+        if hit is not None:
+            return hit
+        with self.retry_policy.scope() as budget:
+            while True:
+                mark = budget.attempts
+                try:
+                    raw = self._invoke_client(prompt, **kwargs)
+                    err = self._error_of(raw)
+                except Exception as e:
+                    err = e
+                budget.settle(mark)
+                if err is None:
+                    self._cache_store(key, raw, accept)
+                    return raw or ""
+                if not self._should_retry(err, budget):
+                    raise FlowError(f"LLM call failed after {budget.attempts} attempts: {err}")
+                budget.sleep()
+
+    async def acall_llm(self, prompt: str, accept: Optional[Callable[[str], bool]] = None, **overrides) -> str:
+        """Async variant of call_llm (same retry policy, non-blocking sleeps)."""
+        kwargs = {**self.request_kwargs, **overrides}
+        key, hit = self._cache_lookup(prompt, kwargs, accept)
+        if hit is not None:
+            return hit
+        with self.retry_policy.scope() as budget:
+            while True:
+                mark = budget.attempts
+                try:
+                    raw = await self._ainvoke_client(prompt, **kwargs)
+                    err = self._error_of(raw)
+                except Exception as e:
+                    err = e
+                budget.settle(mark)
+                if err is None:
+                    self._cache_store(key, raw, accept)
+                    return raw or ""
+                if not self._should_retry(err, budget):
+                    raise FlowError(f"LLM call failed after {budget.attempts} attempts: {err}")
+                await asyncio.sleep(budget.backoff_delay())
 
     def extract_first_json(self, text: str) -> str:
         """
@@ -111,18 +216,140 @@ class FlowBase:
     def count_words(self, text: str) -> int:
         return len(re.findall(r"\b\w+\b", text or ""))
 
+    def prompt_builder(self) -> Tools_Prompt_Builder.PromptBuilder:
+        return Tools_Prompt_Builder.PromptBuilder(self.prompt_layout)
+
+    def render_prompt(self, builder: Tools_Prompt_Builder.PromptBuilder) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build the final prompt. With a token_budget, trim low-priority segments
+        if needed and return {"max_tokens": n_predict} sized to the free context.
+        """
+        prompt, overrides, info = self._fit_prompt(builder)
+        _LAST_BUDGET.set(info)
+        return prompt, overrides
+
+    async def arender_prompt(self, builder: Tools_Prompt_Builder.PromptBuilder) -> Tuple[str, Dict[str, Any]]:
+        # token counting may hit /tokenize → keep it off the event loop
+        if self.token_budget is None:
+            return self.render_prompt(builder)
+        prompt, overrides, info = await asyncio.to_thread(self._fit_prompt, builder)
+        _LAST_BUDGET.set(info)
+        return prompt, overrides
+
+    def count_tokens(self, text: str) -> int:
+        if self.token_budget is not None:
+            return self.token_budget.count(text)
+        return Tools_Token_Budget.approx_token_count(text)
+
+    def source_token_limit(self, system_prompt: str) -> Optional[int]:
+        """
+        Max source tokens that fit one prompt next to `system_prompt` and the
+        generation budget; None → long-document mode disabled.
+        """
+        if not self.long_doc:
+            return None
+        if self.chunk_tokens:
+            return int(self.chunk_tokens)
+        if self.token_budget is None:
+            return None
+        b = self.token_budget
+        # + 32: segment headers ("Văn bản gốc:" ...)
+        overhead = (self.count_tokens(system_prompt)
+                    + self.count_tokens(Tools_Prompt_Builder.CHAT_OPEN + Tools_Prompt_Builder.CHAT_CLOSE) + 32)
+        max_new = int(self.request_kwargs.get("max_tokens", 512))
+        return max(128, b.n_ctx - b.safety_margin - max_new - overhead)
+
+    def grammar_kwargs(self, schema: str) -> Dict[str, Any]:
+        """Client kwargs constraining decode to `schema` ("reasoning" / "critic"), or {}."""
+        if not self.grammar_mode or not getattr(self.client, "supports_grammar", False):
+            return {}
+        return Tools_Grammar.request_kwargs(schema, self.grammar_mode)
+
+    def slot_kwargs(self, role: str, source_text: str) -> Dict[str, Any]:
+        """Extra client kwargs pinning (role, lane, candidate, article) to one llama.cpp slot."""
+        if not self.slot_affinity:
+            return {}
+        role = f"{role}@{self.lane}#{self.candidate}" if self.lane else f"{role}#{self.candidate}"
+        return {"slot_key": Tools_Prompt_Builder.slot_key(role, source_text)}
+
     # ---------------- HOOKS ----------------
     def postprocess(self, data: Dict[str, Any], meta: Dict[str, Any] = None) -> Dict[str, Any]:
         """Subclasses can override to enforce freeze/repairs."""
         return data
 
     # ---------------- INTERNAL ----------------
+    def _fit_prompt(self, builder: Tools_Prompt_Builder.PromptBuilder) -> Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]:
+        overrides: Dict[str, Any] = {}
+        info = None
+        if self.token_budget is not None:
+            info = self.token_budget.fit(builder, int(self.request_kwargs.get("max_tokens", 512)))
+            overrides["max_tokens"] = info["n_predict"]
+            if info["trimmed"]:
+                print(f"✂️ Cắt prompt cho vừa context: {info['trimmed']} (n_predict={info['n_predict']})")
+        return builder.build(), overrides, info
+
+    def _cache_lookup(self, prompt: str, kwargs: Dict[str, Any],
+                      accept: Optional[Callable[[str], bool]] = None) -> Tuple[Optional[str], Optional[str]]:
+        if self.cache is None or self.cache.bypass:
+            return None, None
+        key = self.cache.make_key(self.model_id, prompt, kwargs)
+        hit = self.cache.get(key)
+        if hit is not None and accept is not None and not accept(hit):
+            # bản cache cũ không dùng được (vd. ghi trước khi có accept) → bỏ, gọi lại server
+            self.cache.delete(key)
+            self.call_log.append({"cache": "rejected"})
+            return key, None
+        if hit is not None:
+            self.call_log.append({"cache": "hit"})
+        return key, hit
+
+    def _cache_store(self, key: Optional[str], raw: str, accept: Optional[Callable[[str], bool]] = None) -> None:
+        if key is not None and raw and (accept is None or accept(raw)):
+            self.cache.put(key, raw)
+
+    @staticmethod
+    def _error_of(raw: str) -> Optional[str]:
+        """Client error responses are coerced to "[LLAMA_ERROR] ..." text."""
+        if raw and raw.startswith(_LLAMA_ERROR):
+            return raw[len(_LLAMA_ERROR):].strip() or "LLAMA_ERROR"
+        return None
+
+    @staticmethod
+    def _should_retry(err: Any, budget: Client_Retry.RetryBudget) -> bool:
+        if any(tag in str(err) for tag in _FAIL_FAST):
+            return False
+        return budget.has_budget()
+
     def _invoke_client(self, prompt: str, **kwargs) -> str:
         """
         Call the client and return text. We do NOT impose stop tokens here,
         let caller decide in request_kwargs if needed.
         """
         resp = self.client(prompt, **kwargs)
+        self._record_call(resp)
+        text = self.coerce_model_to_text(resp)
+        return self.sanitize_outer_text(text)
+
+    def _record_call(self, resp: Any) -> None:
+        meta = {k: resp[k] for k in ("usage", "stream") if k in resp} if isinstance(resp, dict) else {}
+        budget = _LAST_BUDGET.get()
+        if budget is not None:
+            meta["budget"] = budget
+        if meta:
+            self.call_log.append(meta)
+
+    async def _ainvoke_client(self, prompt: str, **kwargs) -> str:
+        """
+        Async client (e.g. AsyncLocalLlamaClient) is awaited directly;
+        a blocking client is pushed to a worker thread so the loop stays free.
+        """
+        if _is_async_callable(self.client):
+            resp = await self.client(prompt, **kwargs)
+        else:
+            resp = await asyncio.to_thread(self.client, prompt, **kwargs)
+            if inspect.isawaitable(resp):
+                resp = await resp
+        self._record_call(resp)
         text = self.coerce_model_to_text(resp)
         return self.sanitize_outer_text(text)
 
@@ -0,0 +1,312 @@
+# Libraries/Flow_Batch.py
+
+import os
+import json
+import time
+import signal
+import asyncio
+import threading
+
+from pathlib import Path
+from collections import deque
+from typing import Iterable, Tuple, Dict, Any, Optional, Union
+
+from . import Flow_Main
+from . import Flow_Scheduler
+
+# ==============================
+
+# Flow_Batch.py
+# Chạy batch có thể tiếp tục sau khi chết giữa chừng:
+#   manifest (JSONL append-only, cạnh file lịch sử) ghi sự kiện từng index:
+#       started → done | failed
+#   Khởi động lại:
+#       done                        → bỏ qua
+#       failed / started dở dang    → chạy lại nếu số lần thử < max_attempts
+#       hết lượt thử                → bỏ qua (retry_exhausted=True để chạy lại)
+# - "done" chỉ được ghi SAU khi lịch sử của bài đã ghi xong → không mất mẫu, chạy lại là ghi đè
+# - Lỗi trong lúc chạy → đưa lại vào hàng đợi (tới max_attempts); quá max_consecutive_failures
+#   lỗi liên tiếp (server chết...) → dừng nhận bài mới, raise BatchAborted
+# - Ctrl+C (handle_sigint=True): lần 1 dừng nhận bài mới, chờ bài đang chạy; lần 2 huỷ luôn
+
+class BatchAborted(RuntimeError):
+    pass
+
+
+def manifest_path_for(history_path: Path) -> Path:
+    history_path = Path(history_path)
+    return history_path.with_name(history_path.name + ".manifest.jsonl")
+
+
+class BatchManifest:
+    """
+    Trạng thái từng index, dựng lại từ log sự kiện:
+        {"index": 12, "event": "started", "attempt": 1, "ts": ...}
+        {"index": 12, "event": "done", "score": 4.6, "ts": ...}
+        {"index": 13, "event": "failed", "error": "...", "ts": ...}
+    """
+
+    def __init__(self, path: Path, fsync: bool = True):
+        self.path = Path(path)
+        self.fsync = fsync
+        self.status: Dict[int, str] = {}
+        self.attempts: Dict[int, int] = {}
+        self.errors: Dict[int, str] = {}
+        # started() chạy trên thread đọc nguồn (Flow_Scheduler), done / failed trên event loop
+        self._lock = threading.Lock()
+        self._load()
+        if self.path.parent:
+            os.makedirs(self.path.parent, exist_ok=True)
+        self._file = open(self.path, "ab")
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    ev = json.loads(line)
+                    index = int(ev["index"])
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                    continue    # dòng cuối bị cắt khi tiến trình chết
+                self._apply(index, ev)
+
+    def _apply(self, index: int, ev: Dict[str, Any]):
+        event = ev.get("event")
+        if event == "started":
+            self.attempts[index] = int(ev.get("attempt") or self.attempts.get(index, 0) + 1)
+        elif event == "failed":
+            self.errors[index] = ev.get("error", "")
+        elif event == "done":
+            self.errors.pop(index, None)
+        self.status[index] = event
+
+    def _append(self, index: int, event: str, **fields):
+        ev = {"index": index, "event": event, **fields, "ts": round(time.time(), 3)}
+        with self._lock:
+            self._apply(index, ev)
+            self._file.write((json.dumps(ev, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    # ---------------- EVENTS ----------------
+    def started(self, index: int) -> int:
+        attempt = self.attempts.get(index, 0) + 1
+        self._append(index, "started", attempt=attempt)
+        return attempt
+
+    def done(self, index: int, **fields):
+        self._append(index, "done", **fields)
+
+    def failed(self, index: int, error: str):
+        self._append(index, "failed", error=error)
+
+    # ---------------- QUERIES ----------------
+    def is_done(self, index: int) -> bool:
+        return self.status.get(index) == "done"
+
+    def exhausted(self, index: int, max_attempts: int) -> bool:
+        """Chưa xong và đã dùng hết lượt thử (kể cả lần chạy làm chết tiến trình)."""
+        return not self.is_done(index) and self.attempts.get(index, 0) >= max_attempts
+
+    def _with(self, status: str) -> list:
+        return sorted(i for i, s in self.status.items() if s == status)
+
+    def completed(self) -> list:
+        return self._with("done")
+
+    def failures(self) -> Dict[int, str]:
+        return {i: self.errors.get(i, "") for i in self._with("failed")}
+
+    def in_progress(self) -> list:
+        # "started" mà không có done/failed → tiến trình trước chết giữa chừng
+        return self._with("started")
+
+    def summary(self) -> Dict[str, Any]:
+        return {"completed": len(self.completed()), "failed": len(self._with("failed")),
+                "in_progress": len(self.in_progress())}
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _ResumableQueue:
+    """
+    Iterator (index, article) cho Flow_Scheduler: bỏ qua bài đã xong, ghi "started",
+    trả bài lỗi cần thử lại trước bài mới. Không phải generator → vẫn trả được bài thử lại
+    sau khi nguồn đã cạn (worker vừa gặp lỗi sẽ gọi next() lần nữa).
+    """
+
+    def __init__(self, articles: Iterable[Tuple[int, str]], manifest: BatchManifest,
+                 max_attempts: int, retry_exhausted: bool):
+        self._source = iter(articles)
+        self._manifest = manifest
+        self._max_attempts = max_attempts
+        self._retry_exhausted = retry_exhausted
+        self._retry: deque = deque()
+        self._texts: Dict[int, str] = {}
+        self.stopping = False
+        self.skipped_done = 0
+        self.skipped_exhausted = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Tuple[int, str]:
+        if self.stopping:
+            raise StopIteration
+        if self._retry:
+            index, text = self._retry.popleft()
+        else:
+            index, text = self._next_new()
+        self._texts[index] = text
+        self._manifest.started(index)
+        return index, text
+
+    def _next_new(self) -> Tuple[int, str]:
+        for index, text in self._source:
+            if self._manifest.is_done(index):
+                self.skipped_done += 1
+                continue
+            if self._manifest.exhausted(index, self._max_attempts):
+                if not self._retry_exhausted:
+                    self.skipped_exhausted.append(index)
+                    continue
+                # cho thêm đủ max_attempts lượt mới
+                self._manifest.attempts[index] = 0
+            return index, text
+        raise StopIteration
+
+    def close(self):
+        """Đóng nguồn bài (Flow_Scheduler gọi khi batch kết thúc / bị huỷ)."""
+        close = getattr(self._source, "close", None)
+        if close is not None:
+            close()
+
+    def finished(self, index: int):
+        self._texts.pop(index, None)
+
+    def requeue(self, index: int) -> bool:
+        """Còn lượt thử → đưa lại vào hàng đợi."""
+        text = self._texts.pop(index, None)
+        if text is None or self._manifest.attempts.get(index, 0) >= self._max_attempts:
+            return False
+        self._retry.append((index, text))
+        return True
+
+
+async def run_resumable_async(main_flow: Flow_Main.MainFlow,
+                              articles: Iterable[Tuple[int, str]],
+                              history_path: Union[Path, Any],
+                              manifest_path: Optional[Path] = None,
+                              max_attempts: int = 3,
+                              retry_exhausted: bool = False,
+                              max_consecutive_failures: int = 5,
+                              max_in_flight: Optional[int] = None,
+                              max_iters: int = 3,
+                              min_improve: float = 0.1,
+                              handle_sigint: bool = False) -> Dict[str, Any]:
+    """
+    Như Flow_Scheduler.run_batch_async nhưng có manifest: chạy lại cùng lệnh sau khi chết
+    → chỉ làm các bài chưa xong.
+    manifest_path mặc định: <history_path>.manifest.jsonl
+    """
+    if manifest_path is None:
+        base = getattr(history_path, "path", history_path)
+        manifest_path = manifest_path_for(Path(base))
+
+    manifest = BatchManifest(manifest_path)
+    resumed = manifest.summary()
+    queue = _ResumableQueue(articles, manifest, max_attempts, retry_exhausted)
+    consecutive = {"failures": 0, "last": None, "aborted": False}
+    retried = []
+
+    def _stop(reason: str):
+        if not queue.stopping:
+            queue.stopping = True
+            print(f"🛑 {reason}: dừng nhận bài mới, chờ các bài đang chạy...")
+
+    def _on_result(index: int, result: dict):
+        manifest.done(index, score=result.get("best_score"))
+        queue.finished(index)
+        consecutive["failures"] = 0
+
+    def _on_error(index: int, error: BaseException):
+        manifest.failed(index, str(error))
+        consecutive["failures"] += 1
+        consecutive["last"] = error
+        if max_consecutive_failures and consecutive["failures"] >= max_consecutive_failures:
+            consecutive["aborted"] = True
+            _stop(f"{consecutive['failures']} lỗi liên tiếp")
+            queue.finished(index)
+        elif queue.requeue(index):
+            retried.append(index)
+            print(f"🔁 Thử lại index {index} (lần {manifest.attempts[index] + 1}/{max_attempts})")
+
+    loop = asyncio.get_running_loop()
+    sigint_installed = False
+    if handle_sigint:
+        main_task = asyncio.current_task()
+
+        def _sigint():
+            if queue.stopping:
+                main_task.cancel()
+            else:
+                _stop("Ctrl+C (nhấn lần nữa để huỷ ngay)")
+        try:
+            loop.add_signal_handler(signal.SIGINT, _sigint)
+            sigint_installed = True
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass
+
+    if any(resumed.values()):
+        print(f"♻️ Tiếp tục từ manifest {manifest_path}: {resumed}")
+
+    interrupted = False
+    try:
+        summary = await Flow_Scheduler.run_batch_async(
+            main_flow, queue, history_path,
+            max_in_flight=max_in_flight, max_iters=max_iters, min_improve=min_improve,
+            fail_fast=False, on_result=_on_result, on_error=_on_error,
+        )
+    except asyncio.CancelledError:
+        # bài đang chạy giữ trạng thái "started" → lần sau chạy lại
+        interrupted = True
+        raise
+    finally:
+        if sigint_installed:
+            loop.remove_signal_handler(signal.SIGINT)
+        manifest.close()
+        if interrupted:
+            print(f"⛔ Đã huỷ. Manifest: {manifest.summary()}")
+
+    summary.update({
+        "manifest": str(manifest_path),
+        "resumed_from": resumed,
+        "skipped_done": queue.skipped_done,
+        "skipped_exhausted": queue.skipped_exhausted,
+        "retried": retried,
+        "stopped_early": queue.stopping,
+        "remaining_failed": manifest.failures(),
+    })
+    # chỉ raise khi chính ngưỡng lỗi liên tiếp làm dừng batch (không phải Ctrl+C)
+    if consecutive["aborted"]:
+        raise BatchAborted(f"{consecutive['failures']} consecutive failures, last: {consecutive['last']}") \
+            from consecutive["last"]
+    return summary
+
+def run_resumable(*args, **kwargs) -> Dict[str, Any]:
+    """
+    Bản đồng bộ (script thường), bắt Ctrl+C để dừng êm.
+    Trong Jupyter hãy dùng: await run_resumable_async(...)
+    """
+    kwargs.setdefault("handle_sigint", True)
+    return asyncio.run(run_resumable_async(*args, **kwargs))
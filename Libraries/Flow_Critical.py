@@ -3,9 +3,11 @@
 import json
 import re
 
-from typing import Dict, Any
+from typing import Optional, Dict, Any, List
 
 from . import Tools_Json_Parser 
+from . import Tools_Json_Repair
+from . import Tools_Prompt_Builder
 from . import Flow_Base
 
 # ==============================
@@ -35,45 +37,51 @@ class CriticalFlow(Flow_Base.FlowBase):
 
         return out
     
-    def run_critic(
+    def _build_prompt(
         self,
         critic_prompt: str,
         refine_prompt: str,
         source_text: str,
-        reasoning_output: str,
-        prev_result: Dict[str,Any] = None
-    ) -> Dict[str, Any]:
+        clean_reason: str,
+        current_summary: str,
+        prev_result: Dict[str,Any] = None,
+        evidence: Optional[List[str]] = None
+    ) -> Tools_Prompt_Builder.PromptBuilder:
+        prev_scores = prev_result.get("scoring") if prev_result else {}
+        prev_feedback = prev_result.get("feedback_text","") if prev_result else ""
 
-        clean_reason = reasoning_output or ""
+        sys_prompt = refine_prompt if prev_result else critic_prompt
+
+        builder = self.prompt_builder()
+        builder.add("system", sys_prompt, stable=True)
+        if prev_result:
+            builder.add("prev_scores", f"\n\nĐiểm trước đó:\n{json.dumps(prev_scores)}")
+            builder.add("prev_feedback", f"\n\nPhản hồi trước đó:\n{prev_feedback}")
+        builder.add("reasoning", f"\n\nJson suy luận:\n{clean_reason}")
+        builder.add("summary", f"\n\nBản tóm tắt:\n{current_summary}")
+        if evidence:
+            # long-document mode: chấm trên bằng chứng theo đoạn thay cho văn bản gốc quá dài
+            builder.add("source", "\n\nBằng chứng theo đoạn:\n" + "\n".join(evidence), stable=True)
+        else:
+            builder.add("source", f"\n\nVăn bản gốc:\n{source_text}", stable=True)
+        return builder
 
+    def _current_summary(self, clean_reason: str) -> str:
         try:
             obj = self.parse_first_json(clean_reason)
-            current_summary = obj.get("summary","")
+            return obj.get("summary","")
         except:
-            current_summary = ""
+            return ""
 
-        prev_scores = prev_result.get("scoring") if prev_result else {}
-        prev_feedback = prev_result.get("feedback_text","") if prev_result else ""
+    def _missing_summary(self) -> Dict[str, Any]:
+        return {
+            "scoring": Tools_Json_Parser.score_dict(_REQUIRED_SCORES),
+            "feedback_text": "Summary missing."
+        }
 
-        sys_prompt = refine_prompt if prev_result else critic_prompt
-        feedback_part = (f"\n\Điểm trước đó:\n{json.dumps(prev_scores)}"
-                        f"\n\Phản hồi trước đó:\n{prev_feedback}") if prev_result else ""
-        prompt = (
-            f"{sys_prompt}"
-            f"{feedback_part}"
-            f"\n\nJson suy luận:\n{clean_reason}"
-            f"\n\nBản tóm tắt:\n{current_summary}"
-            f"\n\nVăn bản gốc:\n{source_text}"
-        ).strip()
-
-        if not current_summary.strip():
-            return {
-                "scoring": Tools_Json_Parser.score_dict(_REQUIRED_SCORES),
-                "feedback_text": "Summary missing."
-            }
-
-        raw = self.call_llm(f"<|user|>\n{prompt}\n<|end|>\n<|assistant|>")
-        parsed = Tools_Json_Parser.sanitize_and_parse_critic(raw)
+    def _finalize(self, raw: str) -> Dict[str, Any]:
+        # JSON hợp lệ → raw_decode; hỏng → sửa một lượt (Tools_Json_Repair)
+        parsed = Tools_Json_Repair.parse_critic(raw).value
 
         if parsed is None:
             return {
@@ -86,13 +94,83 @@ class CriticalFlow(Flow_Base.FlowBase):
         result = self._repair_schema(parsed)
         return result
 
-def run(client, critic_prompt, refine_prompt, generation_params, source_text, reasoning_output, prev_result=None):
+    def run_critic(
+        self,
+        critic_prompt: str,
+        refine_prompt: str,
+        source_text: str,
+        reasoning_output: str,
+        prev_result: Dict[str,Any] = None,
+        evidence: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+
+        clean_reason = reasoning_output or ""
+        current_summary = self._current_summary(clean_reason)
+        if not current_summary.strip():
+            return self._missing_summary()
 
-    cf = CriticalFlow(client, request_kwargs={
+        builder = self._build_prompt(critic_prompt, refine_prompt, source_text,
+                                     clean_reason, current_summary, prev_result, evidence)
+        prompt, overrides = self.render_prompt(builder)
+
+        raw = self.call_llm(prompt, **overrides, **self.grammar_kwargs("critic"),
+                            **self.slot_kwargs("critic", source_text))
+        return self._finalize(raw)
+
+    async def arun_critic(
+        self,
+        critic_prompt: str,
+        refine_prompt: str,
+        source_text: str,
+        reasoning_output: str,
+        prev_result: Dict[str,Any] = None,
+        evidence: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Async variant of run_critic."""
+
+        clean_reason = reasoning_output or ""
+        current_summary = self._current_summary(clean_reason)
+        if not current_summary.strip():
+            return self._missing_summary()
+
+        builder = self._build_prompt(critic_prompt, refine_prompt, source_text,
+                                     clean_reason, current_summary, prev_result, evidence)
+        prompt, overrides = await self.arender_prompt(builder)
+
+        raw = await self.acall_llm(prompt, **overrides, **self.grammar_kwargs("critic"),
+                                   **self.slot_kwargs("critic", source_text))
+        return self._finalize(raw)
+
+def _request_kwargs(generation_params) -> Dict[str, Any]:
+    kwargs = {
         "max_tokens":generation_params['max_new_tokens'],
         "temperature":generation_params['temperature'],
         "top_p":generation_params['top_p'],
-        # "seed":generation_params['seed']
-    })
-
-    return cf.run_critic(critic_prompt, refine_prompt, source_text, reasoning_output, prev_result)
\ No newline at end of file
+    }
+    if generation_params.get('seed') is not None:
+        kwargs["seed"] = generation_params['seed']
+    return kwargs
+
+def run(client, critic_prompt, refine_prompt, generation_params, source_text, reasoning_output, prev_result=None,
+        meta=None, evidence=None, candidate=0, lane="", **flow_options):
+
+    cf = CriticalFlow(client, request_kwargs=_request_kwargs(generation_params), **flow_options)
+    cf.candidate = candidate
+    cf.lane = lane
+
+    result = cf.run_critic(critic_prompt, refine_prompt, source_text, reasoning_output, prev_result, evidence)
+    if meta is not None:
+        meta["calls"] = cf.call_log
+    return result
+
+async def arun(client, critic_prompt, refine_prompt, generation_params, source_text, reasoning_output, prev_result=None,
+               meta=None, evidence=None, candidate=0, lane="", **flow_options):
+
+    cf = CriticalFlow(client, request_kwargs=_request_kwargs(generation_params), **flow_options)
+    cf.candidate = candidate
+    cf.lane = lane
+
+    result = await cf.arun_critic(critic_prompt, refine_prompt, source_text, reasoning_output, prev_result, evidence)
+    if meta is not None:
+        meta["calls"] = cf.call_log
+    return result
@@ -0,0 +1,124 @@
+# Libraries/Flow_Graph.py
+
+import asyncio
+import inspect
+import contextvars
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Any, List, Iterable, Optional
+
+# ==============================
+
+# Flow_Graph.py
+# Đồ thị phụ thuộc nhỏ (DAG) cho các bước của một bài viết:
+#   node = (tên, hàm, deps); hàm nhận dict {dep: kết quả} của các node phụ thuộc.
+# Node độc lập chạy song song:
+#   - run()  : thread pool (hàm đồng bộ)
+#   - arun() : asyncio (hàm async hoặc đồng bộ → chạy trong thread)
+# Lỗi đầu tiên → không khởi chạy node mới, raise lại sau khi node đang chạy kết thúc.
+
+class GraphError(ValueError):
+    pass
+
+
+class TaskGraph:
+    """
+    Ví dụ:
+        g = TaskGraph()
+        g.add("reason_0", lambda r: ...)
+        g.add("critic_0", lambda r: use(r["reason_0"]), deps=["reason_0"])
+        results = g.run()
+    """
+
+    def __init__(self):
+        self._nodes: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._deps: Dict[str, List[str]] = {}
+
+    def add(self, name: str, fn: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = ()) -> "TaskGraph":
+        if name in self._nodes:
+            raise GraphError(f"Duplicate node: {name!r}")
+        deps = list(deps)
+        missing = [d for d in deps if d not in self._nodes]
+        if missing:
+            # deps phải được add trước → đồ thị luôn không có chu trình
+            raise GraphError(f"Node {name!r} depends on unknown node(s): {missing}")
+        self._nodes[name] = fn
+        self._deps[name] = deps
+        return self
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def order(self) -> List[str]:
+        """Thứ tự thêm node (= một thứ tự topo hợp lệ)."""
+        return list(self._nodes)
+
+    def _ready(self, done: Dict[str, Any], started: set) -> List[str]:
+        return [n for n in self._nodes
+                if n not in started and all(d in done for d in self._deps[n])]
+
+    def _inputs(self, name: str, done: Dict[str, Any]) -> Dict[str, Any]:
+        return {d: done[d] for d in self._deps[name]}
+
+    # ---------------- SYNC ----------------
+    def run(self, max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """Chạy toàn bộ đồ thị; trả về {tên node: kết quả}."""
+        done: Dict[str, Any] = {}
+        started: set = set()
+        error: Optional[BaseException] = None
+
+        with ThreadPoolExecutor(max_workers=max_workers or max(1, len(self._nodes))) as pool:
+            running = {}
+            while True:
+                if error is None:
+                    for name in self._ready(done, started):
+                        started.add(name)
+                        # contextvars (retry budget, token budget...) đi theo từng node
+                        ctx = contextvars.copy_context()
+                        running[pool.submit(ctx.run, self._nodes[name], self._inputs(name, done))] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    name = running.pop(fut)
+                    try:
+                        done[name] = fut.result()
+                    except Exception as e:
+                        error = error or e
+
+        if error is not None:
+            raise error
+        return done
+
+    # ---------------- ASYNC ----------------
+    async def arun(self) -> Dict[str, Any]:
+        """Async variant of run(): coroutine nodes are awaited, sync nodes run in threads."""
+        done: Dict[str, Any] = {}
+        started: set = set()
+        error: Optional[BaseException] = None
+
+        async def _call(name: str, inputs: Dict[str, Any]) -> Any:
+            fn = self._nodes[name]
+            if inspect.iscoroutinefunction(fn):
+                return await fn(inputs)
+            return await asyncio.to_thread(fn, inputs)
+
+        running = {}
+        while True:
+            if error is None:
+                for name in self._ready(done, started):
+                    started.add(name)
+                    running[asyncio.ensure_future(_call(name, self._inputs(name, done)))] = name
+            if not running:
+                break
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                name = running.pop(task)
+                try:
+                    done[name] = task.result()
+                except Exception as e:
+                    error = error or e
+
+        if error is not None:
+            raise error
+        return done
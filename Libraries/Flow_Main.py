@@ -0,0 +1,453 @@
+# Libraries/Flow_Main.py
+
+import json
+import inspect
+
+from typing import Optional, Dict, Any, Tuple, List, Callable
+
+from . import Common_Helpers as helpers
+from . import Flow_Reasoning as flow_reason
+from . import Flow_Critical as flow_critic
+from . import Flow_Graph
+
+# ==============================
+
+# Flow_Main.py
+# Vòng lặp Reasoning ↔ Critical cho MỘT bài viết (trước đây là mainFlow trong notebook).
+# - run()  : bản đồng bộ, giữ nguyên hành vi của notebook
+# - arun() : bản asyncio, để scheduler chạy nhiều bài song song
+# Vòng 0 và vòng 1 độc lập → chạy song song qua Flow_Graph; các vòng refine sau vẫn tuần tự.
+
+PROMPT_KEYS = ["no_reason", "no_critic", "first_reason", "refine_reason", "first_critic", "refine_critic"]
+
+def summarize_calls(calls: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Cộng dồn usage/stream/budget của các lần gọi LLM trong một bước (reason hoặc critic)."""
+    out = {"calls": len(calls)}
+    for c in calls:
+        for k, v in (c.get("usage") or {}).items():
+            out[k] = out.get(k, 0) + v
+        saved = (c.get("stream") or {}).get("tokens_saved")
+        if saved is not None:
+            out["tokens_saved"] = out.get("tokens_saved", 0) + saved
+        budget = c.get("budget")
+        if budget:
+            out["n_predict"] = budget["n_predict"]
+            out["budget_prompt_tokens"] = out.get("budget_prompt_tokens", 0) + budget["prompt_tokens"]
+            trimmed = sum(budget["trimmed"].values())
+            if trimmed:
+                out["trimmed_tokens"] = out.get("trimmed_tokens", 0) + trimmed
+    return out
+
+def _has_text(reasoning_json: Optional[str]) -> bool:
+    return bool(reasoning_json) and bool(str(reasoning_json).strip())
+
+def _node(fn, args, when=None):
+    """Node của TaskGraph gọi fn(*args(done)); when(done) False → bỏ qua (None). Giữ nguyên sync/async của fn."""
+    if inspect.iscoroutinefunction(fn):
+        async def run(done):
+            return await fn(*args(done)) if when is None or when(done) else None
+    else:
+        def run(done):
+            return fn(*args(done)) if when is None or when(done) else None
+    return run
+
+class MainFlow:
+    """
+    Gom client + prompt + tham số sinh của một lần chạy.
+    prompts: dict với các key trong PROMPT_KEYS (thiếu key → chuỗi rỗng).
+    flow_options: truyền thẳng vào ReasoningFlow/CriticalFlow (vd. prompt_layout).
+    critic_options: ghi đè flow_options riêng cho critic (vd. token_budget của model critic
+                    khi critic_client là server/model khác).
+    best_of: số ứng viên reasoning mỗi vòng (seed khác nhau, slot song song); critic chấm
+             từng ứng viên, lịch sử chỉ giữ ứng viên tốt nhất + điểm các ứng viên bị loại.
+    """
+
+    def __init__(self,
+                 reason_client,
+                 critic_client,
+                 prompts: Dict[str, str],
+                 reason_params: Dict[str, Any],
+                 critic_params: Dict[str, Any],
+                 flow_options: Optional[Dict[str, Any]] = None,
+                 verbose: bool = True,
+                 critic_options: Optional[Dict[str, Any]] = None,
+                 best_of: int = 1):
+        self.reason_client = reason_client
+        self.critic_client = critic_client
+        self.prompts = {k: (prompts or {}).get(k) or "" for k in PROMPT_KEYS}
+        self.reason_params = reason_params
+        self.critic_params = critic_params
+        self.flow_options = flow_options or {}
+        self.critic_options = {**self.flow_options, **(critic_options or {})}
+        self.verbose = verbose
+        self.best_of = max(1, int(best_of))
+
+    @property
+    def separate_backends(self) -> bool:
+        """Reasoner và critic là hai client khác nhau (có thể khác server) → pipeline được."""
+        return self.critic_client is not self.reason_client
+
+    # ---------------- PUBLIC API ----------------
+    def run(self, source_text: str, max_iters: int = 3, min_improve: float = 0.1, tag: str = "") -> dict:
+        state = self._new_state(source_text, tag)
+        head = self._head_graph(state, max_iters, self._evidence_step, self._reason_step, self._critic_step).run()
+
+        for step in range(0, max_iters + 1):
+            self._begin_round(state, step)
+            if step <= 1:
+                results = head
+            else:
+                results = self._round_graph(state, step, self._reason_step, self._critic_step).run()
+            outcome = self._pick_candidate(state, results, step)
+            if outcome is None or not self._end_round(state, step, *outcome, min_improve=min_improve):
+                break
+
+        return self._result(state)
+
+    async def arun(self, source_text: str, max_iters: int = 3, min_improve: float = 0.1, tag: str = "") -> dict:
+        """Async variant of run(): identical rounds, non-blocking LLM calls."""
+        state = self._new_state(source_text, tag)
+        head = await self._head_graph(state, max_iters, self._aevidence_step, self._areason_step,
+                                      self._acritic_step).arun()
+
+        for step in range(0, max_iters + 1):
+            self._begin_round(state, step)
+            if step <= 1:
+                results = head
+            else:
+                results = await self._round_graph(state, step, self._areason_step, self._acritic_step).arun()
+            outcome = self._pick_candidate(state, results, step)
+            if outcome is None or not self._end_round(state, step, *outcome, min_improve=min_improve):
+                break
+
+        return self._result(state)
+
+    # ---------------- ROUND GRAPH ----------------
+    def _n_candidates(self, step: int) -> int:
+        # vòng 0 là baseline không reasoning → luôn một ứng viên
+        return self.best_of if step >= 1 else 1
+
+    def _add_round(self,
+                   graph: Flow_Graph.TaskGraph,
+                   state: Dict[str, Any],
+                   step: int,
+                   reason_fn,
+                   critic_fn,
+                   inputs: Callable[[Dict[str, Any]], Tuple[str, Optional[str], Dict[str, Any], Any]],
+                   deps: List[str]) -> None:
+        """
+        Thêm các node reason_{step}_{k} → critic_{step}_{k} (k < số ứng viên) vào graph.
+        inputs(done) → (current_reasoning, feedback, prev_result, evidence), giống nhau cho mọi ứng viên.
+        """
+        for k in range(self._n_candidates(step)):
+            reason, critic = f"reason_{step}_{k}", f"critic_{step}_{k}"
+            graph.add(reason,
+                      _node(reason_fn, lambda done, k=k: (state, step, *inputs(done)[:2], inputs(done)[3], k)),
+                      deps=deps)
+            # reasoning rỗng → không gọi critic (ứng viên bị loại / vòng lặp dừng ở _accept_reasoning)
+            graph.add(critic,
+                      _node(critic_fn, lambda done, k=k, reason=reason: (state, step, done[reason][0],
+                                                                         inputs(done)[2],
+                                                                         done[reason][1].get("evidence"), k),
+                            when=lambda done, reason=reason: _has_text(done[reason][0])),
+                      deps=[reason] + deps)
+
+    def _head_graph(self,
+                    state: Dict[str, Any],
+                    max_iters: int,
+                    evidence_fn,
+                    reason_fn,
+                    critic_fn) -> Flow_Graph.TaskGraph:
+        """
+        Vòng 0 (không reasoning) và vòng 1 (reasoning đầu tiên) không phụ thuộc nhau:
+        vòng 1 luôn bắt đầu từ feedback/critic rỗng → chạy song song, mỗi critic chỉ chờ reasoning của nó.
+
+            evidence ─┬─ reason_0 ── critic_0
+                      └─ reason_1 ── critic_1      (best_of > 1: một cặp cho mỗi ứng viên)
+
+        Kết quả vẫn được ghi theo thứ tự vòng (_pick_candidate); vòng 0 dừng sớm → bỏ kết quả vòng 1.
+        """
+        graph = Flow_Graph.TaskGraph()
+        graph.add("evidence", _node(evidence_fn, lambda done: (state,)))
+        for step in range(0, min(max_iters, 1) + 1):
+            self._add_round(graph, state, step, reason_fn, critic_fn,
+                            lambda done: ("", None, {}, done["evidence"][0]), deps=["evidence"])
+        return graph
+
+    def _round_graph(self, state: Dict[str, Any], step: int, reason_fn, critic_fn) -> Flow_Graph.TaskGraph:
+        """Vòng refine: các ứng viên cùng input (reasoning/feedback/critic của vòng trước) chạy song song."""
+        graph = Flow_Graph.TaskGraph()
+        inputs = (state["last_reasoning_json"], state["current_feedback"], state["critical_output"], state["evidence"])
+        self._add_round(graph, state, step, reason_fn, critic_fn, lambda done: inputs, deps=[])
+        return graph
+
+    def _pick_candidate(self, state: Dict[str, Any], results: Dict[str, Any], step: int):
+        """
+        Chọn ứng viên tốt nhất của vòng `step` (điểm TBC cao nhất, critic lỗi xếp cuối)
+        → (reasoning_json, critical_output, usage, extra) hoặc None nếu reasoning rỗng.
+        extra["candidates"]: điểm của các ứng viên bị loại (best_of > 1).
+        """
+        cands = [(k, results[f"reason_{step}_{k}"], results[f"critic_{step}_{k}"])
+                 for k in range(self._n_candidates(step))]
+        valid = [c for c in cands if _has_text(c[1][0])]
+        if not valid:
+            self._accept_reasoning(state, cands[0][1][0], cands[0][1][1])
+            return None
+
+        def score(c):
+            critical_output = c[2][0]
+            return -1.0 if "error" in critical_output else helpers.average_score(critical_output)
+
+        best = max(valid, key=score)
+        (reasoning_json, reason_meta), (critical_output, _) = best[1], best[2]
+        self._accept_reasoning(state, reasoning_json, reason_meta)
+
+        usage = self._usage({"calls": [call for c in cands for call in c[1][1].get("calls") or []]},
+                            {"calls": [call for c in valid for call in c[2][1].get("calls") or []]})
+        if step == 0 and results["evidence"][1].get("calls"):
+            usage["map"] = summarize_calls(results["evidence"][1]["calls"])
+
+        extra = {}
+        if len(cands) > 1:
+            extra["candidate"] = best[0]
+            extra["candidates"] = [{"candidate": k,
+                                    "seed": self._candidate_params(self.reason_params, k).get("seed"),
+                                    "average_score": round(score((k, r, c)), 4) if c else None,
+                                    "evaluation": (c[0].get("scoring", {}) if c else {})}
+                                   for k, r, c in cands if k != best[0]]
+            self._log(state, f"🎲 Best-of-{len(cands)}: chọn ứng viên {best[0]} "
+                             f"({score(best):.2f}; loại: {[x['average_score'] for x in extra['candidates']]})")
+        return reasoning_json, critical_output, usage, extra
+
+    # ---------------- STEPS ----------------
+    def _round_prompts(self, step: int) -> Tuple[str, str]:
+        if step == 0:
+            return self.prompts["no_reason"], self.prompts["no_critic"]
+        return self.prompts["first_reason"], self.prompts["first_critic"]
+
+    @staticmethod
+    def _lane(step: int) -> str:
+        # vòng 0 chạy song song với vòng 1 (_head_graph) → slot riêng; các vòng refine dùng lại slot vòng 1
+        return "baseline" if step == 0 else ""
+
+    @staticmethod
+    def _candidate_params(params: Dict[str, Any], candidate: int) -> Dict[str, Any]:
+        """Ứng viên k > 0: seed = seed gốc + k (seed None → để server tự chọn)."""
+        if not candidate or params.get("seed") is None:
+            return params
+        return {**params, "seed": params["seed"] + candidate}
+
+    def _evidence_step(self, state: Dict[str, Any]):
+        meta = {}
+        evidence = flow_reason.prepare_evidence(
+            client=self.reason_client,
+            reason_prompt=self.prompts["first_reason"],
+            refine_prompt=self.prompts["refine_reason"],
+            generation_params=self.reason_params,
+            source_text=state["history_log"]["source_text"],
+            meta=meta,
+            **self.flow_options,
+        )
+        return evidence, meta
+
+    async def _aevidence_step(self, state: Dict[str, Any]):
+        meta = {}
+        evidence = await flow_reason.aprepare_evidence(
+            client=self.reason_client,
+            reason_prompt=self.prompts["first_reason"],
+            refine_prompt=self.prompts["refine_reason"],
+            generation_params=self.reason_params,
+            source_text=state["history_log"]["source_text"],
+            meta=meta,
+            **self.flow_options,
+        )
+        return evidence, meta
+
+    def _reason_step(self, state, step, current_reasoning, feedback, evidence, candidate=0):
+        meta = {}
+        reasoning_json = flow_reason.run(
+            client=self.reason_client,
+            reason_prompt=self._round_prompts(step)[0],
+            refine_prompt=self.prompts["refine_reason"],
+            generation_params=self._candidate_params(self.reason_params, candidate),
+            source_text=state["history_log"]["source_text"],
+            current_reasoning=current_reasoning,
+            feedback=feedback,
+            meta=meta,
+            evidence=evidence,
+            candidate=candidate,
+            lane=self._lane(step),
+            **self.flow_options,
+        )
+        return reasoning_json, meta
+
+    async def _areason_step(self, state, step, current_reasoning, feedback, evidence, candidate=0):
+        meta = {}
+        reasoning_json = await flow_reason.arun(
+            client=self.reason_client,
+            reason_prompt=self._round_prompts(step)[0],
+            refine_prompt=self.prompts["refine_reason"],
+            generation_params=self._candidate_params(self.reason_params, candidate),
+            source_text=state["history_log"]["source_text"],
+            current_reasoning=current_reasoning,
+            feedback=feedback,
+            meta=meta,
+            evidence=evidence,
+            candidate=candidate,
+            lane=self._lane(step),
+            **self.flow_options,
+        )
+        return reasoning_json, meta
+
+    def _critic_step(self, state, step, reasoning_json, prev_result, evidence, candidate=0):
+        meta = {}
+        critical_output = flow_critic.run(
+            client=self.critic_client,
+            critic_prompt=self._round_prompts(step)[1],
+            refine_prompt=self.prompts["refine_critic"],
+            generation_params=self.critic_params,
+            source_text=state["history_log"]["source_text"],
+            reasoning_output=reasoning_json,
+            prev_result=prev_result,
+            meta=meta,
+            evidence=evidence,
+            candidate=candidate,
+            lane=self._lane(step),
+            **self.critic_options,
+        )
+        return critical_output, meta
+
+    async def _acritic_step(self, state, step, reasoning_json, prev_result, evidence, candidate=0):
+        meta = {}
+        critical_output = await flow_critic.arun(
+            client=self.critic_client,
+            critic_prompt=self._round_prompts(step)[1],
+            refine_prompt=self.prompts["refine_critic"],
+            generation_params=self.critic_params,
+            source_text=state["history_log"]["source_text"],
+            reasoning_output=reasoning_json,
+            prev_result=prev_result,
+            meta=meta,
+            evidence=evidence,
+            candidate=candidate,
+            lane=self._lane(step),
+            **self.critic_options,
+        )
+        return critical_output, meta
+
+    # ---------------- INTERNAL ----------------
+    def _log(self, state: Dict[str, Any], msg: str) -> None:
+        if self.verbose:
+            print(f"{state['tag']}{msg}" if state["tag"] else msg)
+
+    def _new_state(self, source_text: str, tag: str) -> Dict[str, Any]:
+        return {
+            "tag": f"[{tag}] " if tag else "",
+            "best_reasoning_json": None,
+            "best_score": 0.0,
+            "history_log": {"source_text": source_text, "iterations": []},
+            "current_feedback": None,
+            "last_reasoning_json": "",
+            "critical_output": {},
+            "evidence": None,   # long-document mode: bằng chứng theo chunk, tái dùng qua các vòng
+        }
+
+    def _begin_round(self, state: Dict[str, Any], step: int) -> None:
+        if step == 1:
+            state["current_feedback"] = None
+            state["critical_output"] = {}
+
+        self._log(state, f"\n🔄 Vòng {step} ...")
+
+    def _accept_reasoning(self,
+                          state: Dict[str, Any],
+                          reasoning_json: Optional[str],
+                          reason_meta: Dict[str, Any]) -> bool:
+        if not _has_text(reasoning_json):
+            self._log(state, "⛔ Lỗi: Reasoning trả về rỗng, dừng vòng lặp.")
+            return False
+
+        self._log(state, f"\n🔄 Reaoning Result:\n{reasoning_json}")
+        state["last_reasoning_json"] = reasoning_json
+        state["evidence"] = reason_meta.get("evidence")
+        return True
+
+    def _usage(self, reason_meta: Dict[str, Any], critic_meta: Dict[str, Any]) -> Dict[str, Any]:
+        usage = {}
+        if reason_meta.get("calls"):
+            usage["reason"] = summarize_calls(reason_meta["calls"])
+        if critic_meta.get("calls"):
+            usage["critic"] = summarize_calls(critic_meta["calls"])
+        return usage
+
+    def _end_round(self,
+                   state: Dict[str, Any],
+                   step: int,
+                   reasoning_json: str,
+                   critical_output: Dict[str, Any],
+                   usage: Optional[Dict[str, Any]] = None,
+                   extra: Optional[Dict[str, Any]] = None,
+                   min_improve: float = 0.1) -> bool:
+        """Ghi lịch sử vòng `step`, cập nhật best. Trả về False nếu cần dừng vòng lặp."""
+        state["critical_output"] = critical_output
+        iterations = state["history_log"]["iterations"]
+
+        if "error" in critical_output:
+            self._log(state, f"⛔ Lỗi từ Critical: {critical_output['error']}")
+            if "raw_response" in critical_output:
+                self._log(state, f"--- RAW OUTPUT ---\n{critical_output['raw_response']}\n------------------")
+            iterations.append({"round": step, "error": critical_output})
+            return False
+
+        average_score = helpers.average_score(critical_output)
+        current_feedback = critical_output.get("feedback_text", "")
+        state["current_feedback"] = current_feedback
+
+        self._log(state, f"📊 Điểm TBC: {average_score:.2f}")
+        self._log(state, f"📝 Nhận xét (Toàn bộ JSON): {json.dumps(critical_output, ensure_ascii=False, indent=2)}\n")
+
+        record = {
+            "round": step,
+            "article:": state["history_log"]["source_text"],
+            "reasoning": reasoning_json,
+            "evaluation": critical_output.get("scoring", {}),
+            "average_score": average_score,
+            "feedback": current_feedback
+        }
+        if usage:
+            record["usage"] = usage
+        if extra:
+            record.update(extra)
+        iterations.append(record)
+
+        if average_score >= 5:
+            state["best_reasoning_json"], state["best_score"] = reasoning_json, average_score
+            self._log(state, "✅ Kết quả tốt, dừng sớm")
+            return False
+
+        if step == 0:
+            self._log(state, f"📈 Không reasoning, điểm: {state['best_score']:.2f}")
+
+        elif step == 1:
+            state["best_reasoning_json"], state["best_score"] = reasoning_json, average_score
+            self._log(state, f"📈 Reasoning lần 1, điểm: {average_score:.2f}")
+
+        else:
+            gain = average_score - state["best_score"]
+            if gain < 0:
+                self._log(state, f"⛔ Cải thiện thất bại, điểm mới: {state['best_score']:.2f}")
+            else:
+                state["best_reasoning_json"], state["best_score"] = reasoning_json, average_score
+                if gain >= min_improve:
+                    self._log(state, f"✅ Cải thiện tốt, điểm mới: {average_score:.2f}")
+                else:
+                    self._log(state, f"📈 Cải thiện kém, điểm mới: {average_score:.2f}")
+
+        return True
+
+    def _result(self, state: Dict[str, Any]) -> dict:
+        return {
+            "best_reasoning": state["best_reasoning_json"],
+            "best_score": state["best_score"],
+            "history": state["history_log"]
+        }
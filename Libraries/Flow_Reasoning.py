@@ -2,59 +2,40 @@
 
 import json
 import re
+import asyncio
 
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Dict, Any, List
 
-from . import Tools_Json_Parser
+from . import Tools_Json_Repair
+from . import Tools_Prompt_Builder
+from . import Tools_Text_Chunker
 from . import Flow_Base
 
 # ==============================
 
 _WORD_RE = re.compile(r"\b\w+\b")
 
+# Header nguồn của bước reduce (long-document mode): bằng chứng theo chunk thay cho văn bản gốc
+EVIDENCE_HEADER = "Tóm tắt từng đoạn của văn bản gốc:"
+
 def _word_count(s: str) -> int:
     return len(_WORD_RE.findall(s or ""))
 
 
 class ReasoningFlow(Flow_Base.FlowBase):
     """
-    Phiên bản robust — parse thủ công hoàn toàn (không dùng parse_first_json).
+    Phiên bản robust — parse bằng Tools_Json_Repair (sửa lỗi một lượt, không dùng parse_first_json).
+    Văn bản dài hơn context → map-reduce: tóm tắt song song từng chunk, rồi reduce từ bằng chứng.
     """
 
+    evidence: Optional[List[str]] = None
+
     def _parse_best_json(self, raw: str) -> Dict[str, Any]:
         """
-        Dò JSON thủ công, khôi phục và load an toàn, cho phép JSON chỉ có 'summary'.
+        Đọc JSON một lượt (Tools_Json_Repair), cho phép JSON chỉ có 'summary'.
         """
-        if not raw or not isinstance(raw, str):
-            return {"reasoning": {"topic": "", "key_ideas": "", "filtered_ideas": ""}, "summary": ""}
-
-        text = raw.strip()
-        text = re.sub(r"[\u0000-\u001F]+", " ", text)
-        text = text.replace("’", "'").replace("“", '"').replace("”", '"')
-        text = text.replace("\\'", "'").replace('\\"', '"')
-
-        match = re.search(r"\{.*\}", text, re.DOTALL)
-        if match:
-            text = match.group(0)
-
-        text = re.sub(r'([{,]\s*)([A-Za-z_][A-Za-z0-9_\-]*)\s*:',
-                      lambda m: m.group(1) + f'"{m.group(2)}":', text)
-
-        text = re.sub(r":\s*'([^']*)'", lambda m: ':"{}"'.format(m.group(1).replace('"', '\\"')), text)
-        text = re.sub(r"'\s*,", lambda m: '",', text)
-        text = re.sub(r",\s*([}\]])", r"\1", text)
-
-        try:
-            obj = json.loads(text)
-        except Exception:
-            summary_match = re.search(r'"summary"\s*:\s*"([^"]+)"', text)
-            summary = summary_match.group(1).strip() if summary_match else ""
-            obj = {"reasoning": {"topic": "", "key_ideas": "", "filtered_ideas": ""}, "summary": summary}
-
-        if isinstance(obj, dict) and "summary" in obj and "reasoning" not in obj:
-            obj["reasoning"] = {"topic": "", "key_ideas": "", "filtered_ideas": ""}
-
-        return self._ensure_fields(obj)
+        return Tools_Json_Repair.parse_reasoning(raw).value
 
     def _sanitize_feedback_text(self, fb: Optional[str]) -> str:
         if not fb:
@@ -85,35 +66,37 @@ class ReasoningFlow(Flow_Base.FlowBase):
         except:
             return {"reasoning": {"topic": "", "key_ideas": "", "filtered_ideas": ""}, "summary": ""}
 
-    def run_reason_or_refine(
+    def _build_prompt(
         self,
         reason_prompt: str,
         refine_prompt: str,
         current_reasoning: Optional[str],
         source_text: str,
-        feedback: Optional[str] = None
-    ) -> Dict[str, Any]:
-
-        fb_clean = self._sanitize_feedback_text(feedback)
+        fb_clean: str,
+        source_header: str = "Văn bản gốc:"
+    ) -> Tools_Prompt_Builder.PromptBuilder:
         system_prompt = refine_prompt if fb_clean else reason_prompt
-        sub_prompt = (
-            f"\n\nTóm tắt trước đó:\n\n{current_reasoning}"
-            f"\n\nPhản hồi:\n\n{fb_clean}"
-        ).strip() if fb_clean else ""
-        
-        prompt = f"{system_prompt}{sub_prompt}\n\nVăn bản gốc:\n\n{source_text}".strip()
 
-        attempt = 0
-        obj = None
-        while attempt < 3:
-            attempt += 1
-            raw = self.call_llm(f"<|user|>\n{prompt}\n<|end|>\n<|assistant|>")
-            obj = self._parse_best_json(raw)
-            if isinstance(obj, dict) and obj.get("summary", "").strip():
-                break
-            print(f"⚠️ Lần {attempt}: parse thất bại, thử lại...")
-
-        if not obj or not obj.get("summary", "").strip():
+        builder = self.prompt_builder()
+        builder.add("system", system_prompt, stable=True)
+        if fb_clean:
+            builder.add("previous", f"\n\nTóm tắt trước đó:\n\n{current_reasoning}")
+            builder.add("feedback", f"\n\nPhản hồi:\n\n{fb_clean}")
+        builder.add("source", f"\n\n{source_header}\n\n{source_text}", stable=True)
+        return builder
+
+    def _is_usable(self, obj: Optional[Dict[str, Any]]) -> bool:
+        return isinstance(obj, dict) and bool(obj.get("summary", "").strip())
+
+    def _usable_raw(self, seen: Dict[str, Any]) -> Callable[[str], bool]:
+        """accept= cho call_llm: chỉ cache phản hồi dùng được; kết quả parse giữ trong seen (không parse lại)."""
+        def accept(raw: str) -> bool:
+            seen[raw] = self._parse_best_json(raw)
+            return self._is_usable(seen[raw])
+        return accept
+
+    def _finalize(self, obj: Optional[Dict[str, Any]], fb_clean: str, current_reasoning: Optional[str]) -> Dict[str, Any]:
+        if not self._is_usable(obj):
             print("❌ Quá 3 lần vẫn lỗi → dùng mặc định.")
             obj = {"reasoning": {"topic": "", "key_ideas": "", "filtered_ideas": ""}, "summary": ""}
 
@@ -130,13 +113,225 @@ class ReasoningFlow(Flow_Base.FlowBase):
 
         return obj
 
+    # ---------------- LONG DOCUMENT (MAP-REDUCE) ----------------
+    def _note(self, index: int, obj: Optional[Dict[str, Any]]) -> str:
+        """Một dòng bằng chứng cho chunk `index` (summary + ý chính)."""
+        if not self._is_usable(obj):
+            return ""
+        note = f"[{index}] {obj['summary'].strip()}"
+        key_ideas = str(obj.get("reasoning", {}).get("key_ideas", "")).strip()
+        return f"{note} (Ý chính: {key_ideas})" if key_ideas else note
+
+    def _needs_chunks(self, system_prompt: str, source_text: str) -> bool:
+        limit = self.source_token_limit(system_prompt)
+        return limit is not None and self.count_tokens(source_text) > limit
+
+    def _collapsed(self, reason_prompt: str, notes: List[str], n_chunks: int, prev_chunks: Optional[int]) -> bool:
+        """Dừng gom: một chunk, bằng chứng đã vừa prompt, hoặc số chunk không giảm nữa (không hội tụ)."""
+        if n_chunks <= 1 or (prev_chunks is not None and n_chunks >= prev_chunks):
+            return True
+        return not self._needs_chunks(reason_prompt, "\n".join(notes))
+
+    def _chunk(self, reason_prompt: str, text: str) -> List[str]:
+        limit = self.source_token_limit(reason_prompt)
+        return Tools_Text_Chunker.chunk_text(text, limit, self.count_tokens)
+
+    def _map_builders(self, reason_prompt: str, refine_prompt: str, chunks: List[str]) -> List[Tools_Prompt_Builder.PromptBuilder]:
+        return [self._build_prompt(reason_prompt, refine_prompt, None, c, "") for c in chunks]
+
+    def _map_chunks(self, reason_prompt: str, refine_prompt: str, source_text: str) -> List[str]:
+        """
+        Map: tóm tắt song song từng chunk → danh sách bằng chứng.
+        Bằng chứng vẫn quá dài cho một prompt → gom và tóm tắt tiếp (nhiều tầng).
+        """
+        text = source_text
+        prev_chunks = None
+        while True:
+            chunks = self._chunk(reason_prompt, text)
+            print(f"📚 Văn bản dài → {len(chunks)} đoạn, tóm tắt song song...")
+            builders = self._map_builders(reason_prompt, refine_prompt, chunks)
+            with ThreadPoolExecutor(max_workers=min(len(chunks), self.max_parallel_chunks)) as pool:
+                objs = list(pool.map(self._generate, builders, chunks))
+            notes = [n for n in (self._note(i + 1, o) for i, o in enumerate(objs)) if n]
+            if self._collapsed(reason_prompt, notes, len(chunks), prev_chunks):
+                return notes
+            text, prev_chunks = "\n\n".join(notes), len(chunks)
+
+    async def _amap_chunks(self, reason_prompt: str, refine_prompt: str, source_text: str) -> List[str]:
+        """Async variant of _map_chunks (chunk calls gathered, bounded by max_parallel_chunks)."""
+        sem = asyncio.Semaphore(self.max_parallel_chunks)
+
+        async def one(builder, chunk):
+            async with sem:
+                return await self._agenerate(builder, chunk)
+
+        text = source_text
+        prev_chunks = None
+        while True:
+            chunks = await asyncio.to_thread(self._chunk, reason_prompt, text)
+            print(f"📚 Văn bản dài → {len(chunks)} đoạn, tóm tắt song song...")
+            builders = self._map_builders(reason_prompt, refine_prompt, chunks)
+            objs = await asyncio.gather(*(one(b, c) for b, c in zip(builders, chunks)))
+            notes = [n for n in (self._note(i + 1, o) for i, o in enumerate(objs)) if n]
+            if await asyncio.to_thread(self._collapsed, reason_prompt, notes, len(chunks), prev_chunks):
+                return notes
+            text, prev_chunks = "\n\n".join(notes), len(chunks)
+
+    def prepare_evidence(self, reason_prompt: str, refine_prompt: str, source_text: str) -> Optional[List[str]]:
+        """Bước map riêng (chạy một lần cho cả bài): bằng chứng theo chunk, None nếu văn bản vừa một prompt."""
+        if not self._needs_chunks(reason_prompt, source_text):
+            return None
+        return self._map_chunks(reason_prompt, refine_prompt, source_text)
+
+    async def aprepare_evidence(self, reason_prompt: str, refine_prompt: str, source_text: str) -> Optional[List[str]]:
+        """Async variant of prepare_evidence."""
+        if not await asyncio.to_thread(self._needs_chunks, reason_prompt, source_text):
+            return None
+        return await self._amap_chunks(reason_prompt, refine_prompt, source_text)
+
+    # ---------------- GENERATION ----------------
+    def _generate(self, builder: Tools_Prompt_Builder.PromptBuilder, slot_source: str) -> Optional[Dict[str, Any]]:
+        prompt, overrides = self.render_prompt(builder)
+
+        attempt = 0
+        obj = None
+        # parse retries + transport retries share one budget (retry_policy)
+        with self.retry_policy.scope() as budget:
+            while attempt < 3:
+                attempt += 1
+                seen = {}
+                raw = self.call_llm(prompt, accept=self._usable_raw(seen), **overrides,
+                                    **self.grammar_kwargs("reasoning"), **self.slot_kwargs("reason", slot_source))
+                obj = seen[raw] if raw in seen else self._parse_best_json(raw)
+                if self._is_usable(obj):
+                    break
+                if not budget.has_budget():
+                    break
+                print(f"⚠️ Lần {attempt}: parse thất bại, thử lại...")
+        return obj
+
+    async def _agenerate(self, builder: Tools_Prompt_Builder.PromptBuilder, slot_source: str) -> Optional[Dict[str, Any]]:
+        prompt, overrides = await self.arender_prompt(builder)
+
+        attempt = 0
+        obj = None
+        with self.retry_policy.scope() as budget:
+            while attempt < 3:
+                attempt += 1
+                seen = {}
+                raw = await self.acall_llm(prompt, accept=self._usable_raw(seen), **overrides,
+                                           **self.grammar_kwargs("reasoning"), **self.slot_kwargs("reason", slot_source))
+                obj = seen[raw] if raw in seen else self._parse_best_json(raw)
+                if self._is_usable(obj):
+                    break
+                if not budget.has_budget():
+                    break
+                print(f"⚠️ Lần {attempt}: parse thất bại, thử lại...")
+        return obj
+
+    def _main_builder(self, reason_prompt, refine_prompt, current_reasoning, source_text, fb_clean):
+        if self.evidence:
+            return self._build_prompt(reason_prompt, refine_prompt, current_reasoning,
+                                      "\n".join(self.evidence), fb_clean, source_header=EVIDENCE_HEADER)
+        return self._build_prompt(reason_prompt, refine_prompt, current_reasoning, source_text, fb_clean)
+
+    def run_reason_or_refine(
+        self,
+        reason_prompt: str,
+        refine_prompt: str,
+        current_reasoning: Optional[str],
+        source_text: str,
+        feedback: Optional[str] = None,
+        evidence: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        evidence: bằng chứng theo chunk của vòng trước (long-document mode) → bỏ qua bước map.
+        Sau khi chạy, self.evidence = bằng chứng đã dùng (None nếu văn bản vừa một prompt).
+        """
+
+        fb_clean = self._sanitize_feedback_text(feedback)
+        self.evidence = evidence
+        if evidence is None and self._needs_chunks(refine_prompt if fb_clean else reason_prompt, source_text):
+            self.evidence = self._map_chunks(reason_prompt, refine_prompt, source_text)
+
+        builder = self._main_builder(reason_prompt, refine_prompt, current_reasoning, source_text, fb_clean)
+        obj = self._generate(builder, source_text)
+        return self._finalize(obj, fb_clean, current_reasoning)
+
+    async def arun_reason_or_refine(
+        self,
+        reason_prompt: str,
+        refine_prompt: str,
+        current_reasoning: Optional[str],
+        source_text: str,
+        feedback: Optional[str] = None,
+        evidence: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Async variant of run_reason_or_refine (same prompt, retries and repairs)."""
+
+        fb_clean = self._sanitize_feedback_text(feedback)
+        self.evidence = evidence
+        system_prompt = refine_prompt if fb_clean else reason_prompt
+        if evidence is None and await asyncio.to_thread(self._needs_chunks, system_prompt, source_text):
+            self.evidence = await self._amap_chunks(reason_prompt, refine_prompt, source_text)
+
+        builder = self._main_builder(reason_prompt, refine_prompt, current_reasoning, source_text, fb_clean)
+        obj = await self._agenerate(builder, source_text)
+        return self._finalize(obj, fb_clean, current_reasoning)
+
 
 # ---------------- BACKWARD COMPAT API ----------------
-def run(client, reason_prompt, refine_prompt, generation_params, source_text, current_reasoning, feedback=None):
-    rf = ReasoningFlow(client, request_kwargs={
+def _request_kwargs(generation_params) -> Dict[str, Any]:
+    kwargs = {
         "max_tokens": generation_params['max_new_tokens'],
         "temperature": generation_params['temperature'],
         "top_p": generation_params['top_p'],
-    })
-    result = rf.run_reason_or_refine(reason_prompt, refine_prompt, current_reasoning, source_text, feedback)
+    }
+    if generation_params.get('seed') is not None:
+        kwargs["seed"] = generation_params['seed']
+    return kwargs
+
+def run(client, reason_prompt, refine_prompt, generation_params, source_text, current_reasoning, feedback=None,
+        meta=None, evidence=None, candidate=0, lane="", **flow_options):
+    """
+    meta (dict, tùy chọn) nhận thêm "calls": usage/stream của từng lần gọi LLM,
+    và "evidence": bằng chứng theo chunk khi văn bản quá dài (truyền lại cho vòng sau / critic).
+    candidate: chỉ số ứng viên best-of-N (slot riêng trên server).
+    lane: nhãn slot thêm cho các flow chạy song song trên cùng bài (vd. "baseline" cho vòng 0).
+    """
+    rf = ReasoningFlow(client, request_kwargs=_request_kwargs(generation_params), **flow_options)
+    rf.candidate = candidate
+    rf.lane = lane
+    result = rf.run_reason_or_refine(reason_prompt, refine_prompt, current_reasoning, source_text, feedback, evidence)
+    if meta is not None:
+        meta["calls"] = rf.call_log
+        meta["evidence"] = rf.evidence
     return json.dumps(result, ensure_ascii=False)
+
+async def arun(client, reason_prompt, refine_prompt, generation_params, source_text, current_reasoning, feedback=None,
+               meta=None, evidence=None, candidate=0, lane="", **flow_options):
+    rf = ReasoningFlow(client, request_kwargs=_request_kwargs(generation_params), **flow_options)
+    rf.candidate = candidate
+    rf.lane = lane
+    result = await rf.arun_reason_or_refine(reason_prompt, refine_prompt, current_reasoning, source_text, feedback,
+                                            evidence)
+    if meta is not None:
+        meta["calls"] = rf.call_log
+        meta["evidence"] = rf.evidence
+    return json.dumps(result, ensure_ascii=False)
+
+def prepare_evidence(client, reason_prompt, refine_prompt, generation_params, source_text, meta=None, **flow_options):
+    """Long-document mode: bằng chứng theo chunk (hoặc None) để các vòng sau dùng chung."""
+    rf = ReasoningFlow(client, request_kwargs=_request_kwargs(generation_params), **flow_options)
+    evidence = rf.prepare_evidence(reason_prompt, refine_prompt, source_text)
+    if meta is not None:
+        meta["calls"] = rf.call_log
+    return evidence
+
+async def aprepare_evidence(client, reason_prompt, refine_prompt, generation_params, source_text, meta=None,
+                            **flow_options):
+    rf = ReasoningFlow(client, request_kwargs=_request_kwargs(generation_params), **flow_options)
+    evidence = await rf.aprepare_evidence(reason_prompt, refine_prompt, source_text)
+    if meta is not None:
+        meta["calls"] = rf.call_log
+    return evidence
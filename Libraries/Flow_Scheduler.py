@@ -0,0 +1,137 @@
+# Libraries/Flow_Scheduler.py
+
+import time
+import asyncio
+
+from pathlib import Path
+from typing import Iterable, Tuple, Dict, Any, Optional, Callable, Union
+
+from . import Flow_Main
+from . import Store_History_Log
+
+# ==============================
+
+# Flow_Scheduler.py
+# Giữ N bài viết "đang bay" cùng lúc: mỗi bài tự chạy các vòng Reasoning ↔ Critical
+# của riêng nó (MainFlow.arun), nên server llama.cpp luôn có việc cho các slot song song.
+# Lịch sử: mỗi bài xong → một dòng append vào HistoryLog (Store_History_Log);
+# hết batch → compact ra file Histories-Batch (index_N → rounds/stats) như trước.
+# Reasoner và critic ở hai server khác nhau → pipeline: mặc định giữ đủ bài để lấp slot của
+# CẢ HAI server (critic chấm bài i trong khi reasoner đã làm bài i+1).
+# Nguồn bài (vd. Processor_Datasets.iter_articles + PrefetchIterator) có thể chặn khi chờ đọc:
+# next() chạy trên thread (từng lần một), không chặn event loop; hết batch / lỗi / huỷ → đóng nguồn.
+
+_END = object()
+
+def client_capacity(client) -> int:
+    """Số request song song client xử lý được (max_concurrency / pool_size)."""
+    return int(getattr(client, "max_concurrency", None) or getattr(client, "pool_size", None) or 1)
+
+def _close_source(source) -> None:
+    # generator (iter_articles) → chạy finally của nó (dừng thread prefetch); iterator khác tự có close()
+    close = getattr(source, "close", None)
+    if close is not None:
+        close()
+
+def pipeline_depth(main_flow: Flow_Main.MainFlow) -> int:
+    """Số bài nên "đang bay": slot reasoner (+ slot critic nếu critic là backend riêng)."""
+    depth = client_capacity(main_flow.reason_client)
+    if main_flow.separate_backends:
+        depth += client_capacity(main_flow.critic_client)
+    return max(1, depth)
+
+async def run_batch_async(main_flow: Flow_Main.MainFlow,
+                          articles: Iterable[Tuple[int, str]],
+                          history_path: Union[Path, Any],
+                          max_in_flight: Optional[int] = None,
+                          max_iters: int = 3,
+                          min_improve: float = 0.1,
+                          fail_fast: bool = True,
+                          on_result: Optional[Callable[[int, dict], None]] = None,
+                          on_error: Optional[Callable[[int, BaseException], None]] = None) -> Dict[str, Any]:
+    """
+    Chạy mainFlow cho mọi (index, article) với tối đa max_in_flight bài song song
+    (None → pipeline_depth(main_flow)).
+
+    - history_path: đường dẫn file JSON (→ HistoryLog, compact khi kết thúc)
+      hoặc writer có .write(key, data) (vd. HistoryLog dùng chung, do người gọi đóng).
+    - Mỗi bài xong → ghi ngay một bản ghi (tuần tự qua một lock).
+    - fail_fast=True: lỗi đầu tiên sẽ dừng nhận bài mới và được raise lại
+      sau khi các bài đang chạy kết thúc (giống vòng lặp cũ trong notebook).
+    - articles được đóng (close(), nếu có) khi hàm kết thúc, kể cả khi lỗi / bị huỷ.
+    """
+    own_writer = not hasattr(history_path, "write")
+    writer = Store_History_Log.HistoryLog(history_path) if own_writer else history_path
+    max_in_flight = max_in_flight or pipeline_depth(main_flow)
+    source = iter(articles)
+    write_lock = asyncio.Lock()
+    source_lock = asyncio.Lock()
+    pulling: Dict[str, asyncio.Future] = {}
+    summary: Dict[str, Any] = {"successful": 0, "failed": {}, "elapsed": 0.0, "max_in_flight": max_in_flight,
+                               "pipelined": main_flow.separate_backends}
+    first_error: Dict[str, BaseException] = {}
+    started = time.perf_counter()
+
+    async def _save(index: int, result: dict) -> None:
+        history_key = f"index_{index}"
+        history_data = result["history"].get("iterations", [])
+        async with write_lock:
+            await asyncio.to_thread(writer.write, history_key, history_data)
+        print(f"✅ Lưu xong {history_key} (🎯 {result['best_score']})")
+
+    async def _next() -> Any:
+        # một lần next() tại một thời điểm (generator không cho gọi đồng thời);
+        # shield → worker bị huỷ thì lần đọc vẫn chạy hết, finally chờ nó rồi mới đóng nguồn
+        async with source_lock:
+            pulling["next"] = asyncio.ensure_future(asyncio.to_thread(next, source, _END))
+            return await asyncio.shield(pulling["next"])
+
+    async def _worker() -> None:
+        while not first_error:
+            item = await _next()
+            if item is _END:
+                return
+            index, text = item
+
+            try:
+                result = await main_flow.arun(text, max_iters=max_iters, min_improve=min_improve, tag=f"#{index}")
+                await _save(index, result)
+                summary["successful"] += 1
+                summary["failed"].pop(index, None)     # lần trước lỗi, được thử lại (Flow_Batch) và đã xong
+                if on_result:
+                    on_result(index, result)
+            except Exception as e:
+                print(f"❌ Fatal lỗi tại index {index}: {e}")
+                summary["failed"][index] = str(e)
+                if on_error:
+                    on_error(index, e)
+                if fail_fast:
+                    first_error.setdefault("error", e)
+
+    workers = [asyncio.create_task(_worker()) for _ in range(max(1, max_in_flight))]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for w in workers:
+            w.cancel()
+        pending = pulling.get("next")
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+        _close_source(source)
+        if own_writer:
+            await asyncio.to_thread(writer.close)
+
+    summary["elapsed"] = time.perf_counter() - started
+    done = summary["successful"]
+    summary["samples_per_hour"] = round(done * 3600 / summary["elapsed"], 2) if summary["elapsed"] > 0 else 0.0
+
+    if first_error:
+        raise first_error["error"]
+    return summary
+
+def run_batch(*args, **kwargs) -> Dict[str, Any]:
+    """
+    Bản đồng bộ của run_batch_async (script thường).
+    Trong Jupyter (đã có event loop) hãy dùng: await run_batch_async(...)
+    """
+    return asyncio.run(run_batch_async(*args, **kwargs))
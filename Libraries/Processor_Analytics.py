@@ -0,0 +1,244 @@
+# Libraries/Processor_Analytics.py
+
+import numpy as np
+import pandas as pd
+
+from typing import Optional, Dict, Any, List, Iterable, Union
+
+from . import Common_Helpers as helpers
+from . import Common_Export
+from . import Tools_Json_Repair
+
+# ==============================
+
+# Processor_Analytics.py
+# Thống kê cả một lần chạy bằng mảng cột (NumPy / pandas), nạp lịch sử đúng một lần:
+#   RunAnalytics(source)     : dict, .json, .sqlite, HistoryLog, HistoryDB (như Common_Export)
+#   .stats()                 : reason_* / critic_* từng mẫu (giống hệt stage2_sort_and_count)
+#   .global_summary()        : bảng như __GLOBAL_SUMMARY__ (nhóm theo vòng cuối, success / stable / fail)
+#   .criterion_means()       : điểm TB từng tiêu chí theo vòng
+#   .distribution()          : số lần chấm 1..5 từng tiêu chí theo vòng
+#   .sweep(...)              : chấm lại cả lần chạy với WEIGHTS / min_improve khác, không gọi LLM
+# - min_improve trong Flow_Main chỉ đổi nhãn log (không đổi luồng chạy) → chấm lại là chính xác
+# - Đổi WEIGHTS có thể đổi điểm dừng sớm (≥ 5): early_stop=True bỏ các vòng sau vòng đạt 5
+#   (các vòng chưa từng chạy thì không dựng lại được)
+
+SCORE_KEYS = list(Tools_Json_Repair.SCORE_KEYS)
+OUTCOMES = ("success", "stable", "fail")
+_PERFECT = 5.0
+
+Weights = Dict[str, float]
+
+
+def _classify(diff: np.ndarray, min_improve: float) -> np.ndarray:
+    """0 = success (diff ≥ min_improve), 1 = stable (0 ≤ diff < min_improve), 2 = fail (diff < 0)."""
+    return np.where(diff >= min_improve, 0, np.where(diff >= 0, 1, 2))
+
+def _first_per_group(codes: np.ndarray, mask: np.ndarray, n: int, values: np.ndarray) -> np.ndarray:
+    """Giá trị của dòng đầu tiên thoả mask trong mỗi nhóm (NaN nếu không có)."""
+    out = np.full(n, np.nan)
+    rows = np.flatnonzero(mask)
+    groups, first = np.unique(codes[rows], return_index=True)
+    out[groups] = values[rows[first]]
+    return out
+
+def _counts(codes: np.ndarray, classes: np.ndarray, n: int) -> np.ndarray:
+    """(n, 3) số success / stable / fail mỗi mẫu."""
+    return np.bincount(codes * 3 + classes, minlength=n * 3).reshape(n, 3)
+
+def _round4(v: Any) -> Optional[float]:
+    return None if v is None or pd.isna(v) else round(float(v), 4)
+
+
+class RunAnalytics:
+    """
+    Ví dụ:
+        ra = RunAnalytics("Output/Histories-Batch-EN-merged.json")
+        ra.global_summary()                                  # như __GLOBAL_SUMMARY__
+        ra.sweep({"base": helpers.WEIGHTS, "flat": {k: 1 / 6 for k in SCORE_KEYS}},
+                 min_improve=(0.05, 0.1, 0.2))
+    """
+
+    def __init__(self, source: Common_Export.Source, run: Optional[str] = None, lang: Optional[str] = None):
+        keys, rounds, recorded, errors, scores = [], [], [], [], []
+        for _, _, key, record in Common_Export.iter_history_records(source, run, lang):
+            n = helpers.to_int(record.get("round"), None)
+            if n is None:
+                continue    # stage2 cũng bỏ qua vòng không có số vòng
+            evaluation = helpers.parse_evaluation(record.get("evaluation"))
+            keys.append(key)
+            rounds.append(n)
+            recorded.append(helpers.to_float(record.get("average_score")))
+            errors.append("error" in record)
+            scores.append([helpers.to_float(evaluation.get(k)) for k in SCORE_KEYS])
+
+        self.keys: List[str] = sorted(set(keys), key=lambda k: (helpers._get_sort_key(k), k))
+        position = {k: i for i, k in enumerate(self.keys)}
+        codes = np.fromiter((position[k] for k in keys), dtype=np.int64, count=len(keys))
+        rounds = np.asarray(rounds, dtype=np.int64)
+        # thiếu average_score → 0.0 như stage2 (vòng lỗi)
+        recorded = np.nan_to_num(np.asarray(recorded, dtype=np.float64), nan=0.0)
+        scores = np.asarray(scores, dtype=np.float64).reshape(len(keys), len(SCORE_KEYS))
+
+        order = np.lexsort((recorded, rounds, codes))
+        self.codes = codes[order]
+        self.rounds = rounds[order]
+        self.recorded = recorded[order]
+        self.errors = np.asarray(errors, dtype=bool)[order]
+        self.scores = scores[order]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    # ---------------- FRAMES ----------------
+    @property
+    def frame(self) -> pd.DataFrame:
+        """Một dòng / vòng: key, round, 6 tiêu chí, average_score, error."""
+        df = pd.DataFrame(self.scores, columns=SCORE_KEYS)
+        df.insert(0, "key", np.asarray(self.keys, dtype=object)[self.codes])
+        df.insert(1, "round", self.rounds)
+        df["average_score"] = self.recorded
+        df["error"] = self.errors
+        return df
+
+    def criterion_means(self) -> pd.DataFrame:
+        """Điểm TB từng tiêu chí (+ average_score) theo vòng."""
+        return self.frame.drop(columns=["key", "error"]).groupby("round").mean().round(4)
+
+    def distribution(self) -> pd.DataFrame:
+        """Số lần chấm 1..5 (cột) theo (round, criterion) (dòng)."""
+        df = self.frame.melt(id_vars=["round"], value_vars=SCORE_KEYS, var_name="criterion", value_name="score")
+        df = df.dropna(subset=["score"])
+        df["score"] = df["score"].round().astype(int)
+        return df.groupby(["round", "criterion"])["score"].value_counts().unstack(fill_value=0)
+
+    # ---------------- SCORING ----------------
+    def weighted_scores(self, weights: Optional[Weights] = None) -> np.ndarray:
+        """average_score từng vòng theo weights (cùng quy tắc helpers.average_score, dạng vector)."""
+        if weights is None:
+            return self.recorded
+        out = np.zeros(len(self.codes))
+        present = ~np.isnan(self.scores)
+        if all(k in SCORE_KEYS for k in weights):
+            cols = [SCORE_KEYS.index(k) for k in weights]
+            w = np.asarray(list(weights.values()), dtype=np.float64)
+            full = present[:, cols].all(axis=1)
+            out[full] = np.round(self.scores[full][:, cols] @ w, 4)
+        else:
+            full = np.zeros(len(self.codes), dtype=bool)
+        # thiếu tiêu chí → fallback mean() các điểm có được; không có điểm nào → 0.0
+        partial = ~full & present.any(axis=1)
+        out[partial] = np.round(np.nanmean(self.scores[partial], axis=1), 4)
+        return out
+
+    def _evaluate(self, weights: Optional[Weights], min_improve: float, early_stop: bool) -> Dict[str, Any]:
+        n = len(self.keys)
+        scores = self.weighted_scores(weights)
+        codes, rounds, errors = self.codes, self.rounds, self.errors
+        if weights is not None:
+            # stage2 xếp vòng trùng số theo average_score → xếp lại theo điểm mới
+            order = np.lexsort((scores, rounds, codes))
+            codes, rounds, errors, scores = codes[order], rounds[order], errors[order], scores[order]
+
+        if early_stop and len(codes):
+            hit = (scores >= _PERFECT).astype(np.int64)
+            before = np.cumsum(hit) - hit
+            starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+            keep = (before - before[starts][np.searchsorted(codes[starts], codes)]) == 0
+            codes, rounds, errors, scores = codes[keep], rounds[keep], errors[keep], scores[keep]
+
+        # reason_*: vòng 1 so với vòng 0
+        r0 = _first_per_group(codes, rounds == 0, n, scores)
+        r1 = _first_per_group(codes, rounds == 1, n, scores)
+        both = np.flatnonzero(~np.isnan(r0) & ~np.isnan(r1))
+        reason = _counts(both, _classify(r1[both] - r0[both], min_improve), n)
+
+        # critic_*: các vòng ≥ 1 liên tiếp trong cùng mẫu
+        rows = np.flatnonzero(rounds >= 1)
+        pair = codes[rows[1:]] == codes[rows[:-1]]
+        prev, curr = rows[:-1][pair], rows[1:][pair]
+        critic = _counts(codes[curr], _classify(scores[curr] - scores[prev], min_improve), n)
+
+        # best_score như Flow_Main: vòng ≥ 1 (hoặc vòng đạt 5), không tính vòng lỗi
+        best = np.zeros(n)
+        counted = ~errors & ((rounds >= 1) | (scores >= _PERFECT))
+        np.maximum.at(best, codes[counted], scores[counted])
+        last = np.full(n, -1, dtype=np.int64)
+        np.maximum.at(last, codes, rounds)
+
+        return {"codes": codes, "rounds": rounds, "scores": scores, "r0": r0, "r1": r1,
+                "reason": reason, "critic": critic, "critic_after": scores[curr],
+                "best": best, "last": last}
+
+    # ---------------- REPORTS ----------------
+    def stats(self, min_improve: float = 0.1, weights: Optional[Weights] = None,
+              early_stop: bool = False) -> pd.DataFrame:
+        """Một dòng / mẫu: các cột stats của stage2_sort_and_count + best_score + last_round."""
+        ev = self._evaluate(weights, min_improve, early_stop)
+        df = pd.DataFrame(index=pd.Index(self.keys, name="key"))
+        for prefix in ("reason", "critic"):
+            for i, outcome in enumerate(OUTCOMES):
+                df[f"{prefix}_{outcome}_count"] = ev[prefix][:, i]
+        df["best_score"] = ev["best"]
+        df["last_round"] = ev["last"]
+        return df
+
+    def global_summary(self, min_improve: float = 0.1, weights: Optional[Weights] = None,
+                       early_stop: bool = False) -> Dict[str, Any]:
+        """Cùng cấu trúc __GLOBAL_SUMMARY__: nhóm = vòng cuối của mẫu."""
+        ev = self._evaluate(weights, min_improve, early_stop)
+        df = pd.DataFrame({"group": ev["last"][ev["codes"]], "round": ev["rounds"], "score": ev["scores"]})
+        agg = df.groupby(["group", "round"])["score"].agg(["mean", "max", "min"])
+
+        summary: Dict[str, Any] = {}
+        for name, col in (("Average_per_Group", "mean"), ("Max_per_Group", "max"), ("Min_per_Group", "min")):
+            table: Dict[str, Dict[str, float]] = {}
+            for (group, rnd), v in agg[col].items():
+                table.setdefault(str(group), {})[f"Round_{rnd}"] = _round4(v)
+            summary[name] = table
+
+        r0 = ev["r0"][~np.isnan(ev["r0"])]
+        summary["PreReason_Summary"] = {"Average_Score": _round4(r0.mean()) if len(r0) else None,
+                                        "Count": int(len(r0))}
+        compared = ~np.isnan(ev["r0"]) & ~np.isnan(ev["r1"])
+        for name, counts, after in (("Reason_Summary", ev["reason"], ev["r1"][compared]),
+                                    ("Critic_Summary", ev["critic"], ev["critic_after"])):
+            totals = counts.sum(axis=0)
+            n = int(totals.sum())
+            summary[name] = {
+                "Total_Success": int(totals[0]),
+                "Total_Stable": int(totals[1]),
+                "Total_Fail": int(totals[2]),
+                "Total_Comparisons": n,
+                "Average_Score": _round4(after.mean()) if len(after) else None,
+                "Success_Ratio": round(totals[0] / n, 3) if n else None,
+            }
+        return summary
+
+    def sweep(self, weights: Union[None, Weights, Dict[str, Weights]] = None,
+              min_improve: Iterable[float] = (0.1,), early_stop: bool = False) -> pd.DataFrame:
+        """
+        Mọi tổ hợp (bộ trọng số × min_improve) → một dòng tổng hợp.
+        weights: None (điểm đã ghi), một dict trọng số, hoặc {tên: dict trọng số}.
+        changed_best: số mẫu có best_score khác điểm đã ghi (so với cấu hình gốc).
+        """
+        if weights is None or all(isinstance(v, (int, float)) for v in weights.values()):
+            grid = {"recorded" if weights is None else "weights": weights}
+        else:
+            grid = weights
+        baseline = self._evaluate(None, 0.1, False)["best"]
+        rows = []
+        for name, w in grid.items():
+            for t in min_improve:
+                ev = self._evaluate(w, float(t), early_stop)
+                row = {"weights": name, "min_improve": float(t),
+                       "mean_best": _round4(ev["best"].mean()) if len(self) else None,
+                       "changed_best": int(np.count_nonzero(~np.isclose(ev["best"], baseline)))}
+                for prefix in ("reason", "critic"):
+                    totals = ev[prefix].sum(axis=0)
+                    for i, outcome in enumerate(OUTCOMES):
+                        row[f"{prefix}_{outcome}"] = int(totals[i])
+                    n = totals.sum()
+                    row[f"{prefix}_success_ratio"] = round(totals[0] / n, 3) if n else None
+                rows.append(row)
+        return pd.DataFrame(rows)
@@ -1,11 +1,19 @@
 # Libraries/Processor_Datasets.py
 
+import queue
+import threading
+
+import pyarrow as pa
+
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, Iterable, List, Tuple
 from datasets import load_dataset, load_from_disk, Dataset
 
 # ==============================
 
+# Đọc bài theo lô: chỉ cột 'article', cắt bảng Arrow (slice không copy) thay cho dataset[index] từng dòng;
+# PrefetchIterator đọc trước trên thread nền; shard_range chia [start, end] cho nhiều worker / máy.
+
 def load_from_disk_internal(local_path: Path) -> Optional[Dataset]:
     """
     Tải dataset từ đường dẫn cục bộ. Trả về None nếu lỗi.
@@ -70,4 +78,170 @@ def get_content_by_index_internal(dataset: Dataset, index: int) -> Optional[str]
 
         return content
     except Exception:
-        return None
\ No newline at end of file
+        return None
+
+def normalize_article(raw_text: str) -> str:
+    """
+    Tiền xử lý chuẩn của batch loop: bỏ xuống dòng, gộp khoảng trắng.
+    """
+    text = raw_text.replace("\n", " ")
+    return " ".join(text.split())
+
+def is_preprocessed(dataset: Dataset) -> bool:
+    return dataset is not None and "n_chars" in dataset.column_names
+
+def shard_range(index_start: int, index_end: int, shard: int = 0, num_shards: int = 1,
+                strided: bool = False) -> range:
+    """
+    Phần thứ shard / num_shards của [index_start, index_end] (tất định, các phần không giao nhau).
+    strided=False: các khối liền nhau (khối đầu dài hơn tối đa 1); strided=True: i ≡ shard (mod num_shards).
+    """
+    if num_shards < 1 or not 0 <= shard < num_shards:
+        raise ValueError(f"shard must be in [0, {num_shards}), got {shard}")
+    total = max(0, index_end - index_start + 1)
+    if strided:
+        return range(index_start + shard, index_end + 1, num_shards)
+    size, extra = divmod(total, num_shards)
+    lo = index_start + shard * size + min(shard, extra)
+    return range(lo, lo + size + (1 if shard < extra else 0))
+
+def read_column(dataset: Dataset, positions: List[int], column: str = "article") -> List[Any]:
+    """Giá trị một cột tại các vị trí (tăng dần) — slice bảng Arrow, chỉ đọc cột cần."""
+    if not positions:
+        return []
+    lo, hi = positions[0], positions[-1] + 1
+    if getattr(dataset, "_indices", None) is not None:
+        # dataset đã select / shuffle → để datasets tra bảng chỉ mục
+        return dataset.select_columns([column])[positions][column]
+    values = dataset.data.slice(lo, hi - lo).column(column)
+    if hi - lo != len(positions):
+        values = values.take(pa.array([p - lo for p in positions]))
+    return values.to_pylist()
+
+def iter_article_batches(dataset: Dataset, indices: Iterable[int], batch_size: int = 256,
+                         column: str = "article") -> Iterator[List[Tuple[int, Optional[str]]]]:
+    """Lô [(index, article đã chuẩn hóa | None)]; index ngoài dataset / mẫu rỗng → None."""
+    n = len(dataset) if dataset is not None else 0
+    preprocessed = is_preprocessed(dataset)
+    batch: List[int] = []
+
+    def _flush():
+        texts = read_column(dataset, batch, column)
+        return [(i, (t if preprocessed else normalize_article(t)) if isinstance(t, str) and t else None)
+                for i, t in zip(batch, texts)]
+
+    for i in indices:
+        if not 0 <= i < n:
+            if batch:
+                yield _flush()
+                batch = []
+            yield [(i, None)]
+            continue
+        batch.append(i)
+        if len(batch) >= batch_size:
+            yield _flush()
+            batch = []
+    if batch:
+        yield _flush()
+
+
+class PrefetchIterator:
+    """
+    Iterator (index, article) đọc trước tối đa `prefetch` lô trên thread nền,
+    để scheduler gọi next() không phải chờ đọc đĩa / giải mã Arrow.
+
+    Ví dụ:
+        with PrefetchIterator(iter_article_batches(ds, range(0, 1000))) as it:
+            for index, article in it: ...
+    """
+
+    _DONE = object()
+
+    def __init__(self, batches: Iterable[List[Tuple[int, Optional[str]]]], prefetch: int = 2):
+        self._batches = iter(batches)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, prefetch))
+        self._stop = threading.Event()
+        self._current: Iterator[Tuple[int, Optional[str]]] = iter(())
+        self._finished = False
+        self._thread = threading.Thread(target=self._fill, name="dataset-prefetch", daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fill(self):
+        try:
+            for batch in self._batches:
+                if not self._put(batch):
+                    return
+        except BaseException as e:      # chuyển lỗi sang thread đọc
+            self._put(e)
+            return
+        self._put(self._DONE)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Tuple[int, Optional[str]]:
+        while True:
+            item = next(self._current, None)
+            if item is not None:
+                return item
+            if self._finished:
+                raise StopIteration
+            try:
+                batch = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():     # close() từ thread khác → không chờ mãi
+                    self._finished = True
+                continue
+            if batch is self._DONE:
+                self._finished = True
+                raise StopIteration
+            if isinstance(batch, BaseException):
+                self._finished = True
+                raise batch
+            self._current = iter(batch)
+
+    def close(self):
+        self._stop.set()
+        self._finished = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+def iter_articles(dataset: Dataset, index_start: int, index_end: int,
+                  shard: int = 0, num_shards: int = 1, strided: bool = False,
+                  batch_size: int = 256, prefetch: int = 2) -> Iterator[Tuple[int, str]]:
+    """
+    Duyệt [index_start, index_end] và trả về (index, article đã chuẩn hóa).
+    Bỏ qua (có in cảnh báo) các mẫu không lấy được 'article'.
+    Dataset đã qua Processor_Preprocess (có cột n_chars) → dùng nguyên, không chuẩn hóa lại.
+    shard / num_shards: chỉ duyệt phần của worker này (xem shard_range).
+    prefetch > 0: đọc trước theo lô trên thread nền (PrefetchIterator); 0 → đọc đồng bộ.
+    """
+    indices = shard_range(index_start, index_end, shard, num_shards, strided)
+    batches = iter_article_batches(dataset, indices, batch_size)
+    items = PrefetchIterator(batches, prefetch) if prefetch > 0 else (x for b in batches for x in b)
+    try:
+        for i, text in items:
+            if not text:
+                print(f"⛔ Không lấy được article cho index {i}")
+                continue
+            yield i, text
+    finally:
+        if isinstance(items, PrefetchIterator):
+            items.close()
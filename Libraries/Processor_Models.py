@@ -3,16 +3,93 @@
 from pathlib import Path
 
 from . import Client_Llama
+from . import Client_Pool
+from . import Client_Retry
 
 # ==============================
 
+MODEL_ROLES = ("reasoning_model", "critical_model")
+
+def model_client_params(config: dict, role: str) -> dict:
+    """client_params chung, ghi đè bởi models.<role>.client_params (vd. hosts riêng cho critic)."""
+    params = dict(config.get("client_params", {}))
+    params.update(config.get("models", {}).get(role, {}).get("client_params", {}))
+    return params
+
+def model_server_params(config: dict, role: str) -> dict:
+    """server_params chung (llama_run.py), ghi đè bởi models.<role>.server_params."""
+    params = dict(config.get("server_params", {}))
+    params.update(config.get("models", {}).get(role, {}).get("server_params", {}))
+    return params
+
+def slot_context(config: dict, role: str = "reasoning_model") -> int:
+    """Context của một slot: llama.cpp chia --ctx-size đều cho --parallel slot."""
+    params = model_server_params(config, role)
+    return int(params.get("ctx_size", 4096)) // max(1, int(params.get("parallel", 1)))
+
+def context_size(client, config: dict, role: str = "reasoning_model") -> int:
+    """
+    n_ctx cho TokenBudget, một nguồn duy nhất: context mỗi slot mà server báo qua /props
+    (client.n_ctx); server không báo → tính từ server_params (slot_context).
+    """
+    n_ctx = getattr(client, "n_ctx", None)
+    if n_ctx:
+        return int(n_ctx)
+    n_ctx = slot_context(config, role)
+    print(f"⚠️ Server không báo n_ctx qua /props → dùng server_params: {n_ctx} token / slot")
+    return n_ctx
+
+def _hosts(client_params: dict) -> list:
+    return list(client_params.get("hosts") or [client_params.get("host", "http://localhost:8080")])
+
+def build_client(client_params: dict, retry_policy: Client_Retry.RetryPolicy):
+    """Một server → LocalLlamaClient; nhiều server → LlamaClientPool (cùng interface)."""
+    hosts = _hosts(client_params)
+    retry_params = client_params.get("retry_policy", {})
+    breaker_threshold = retry_params.get("breaker_threshold", 5)
+    breaker_reset = retry_params.get("breaker_reset", 30)
+
+    if len(hosts) > 1:
+        return Client_Pool.LlamaClientPool(
+            hosts,
+            timeout=client_params.get("timeout", 270),
+            pool_size=client_params.get("pool_size", 4),
+            stream_json=client_params.get("stream_json", False),
+            max_failures=client_params.get("max_failures", 3),
+            health_interval=client_params.get("health_interval", 10),
+            retry_policy=retry_policy,
+            breaker_threshold=breaker_threshold,
+            breaker_reset=breaker_reset,
+        )
+    return Client_Llama.LocalLlamaClient(
+        host=hosts[0],
+        timeout=client_params.get("timeout", 270),
+        retry=client_params.get("retry", 3),
+        pool_size=client_params.get("pool_size", 4),
+        stream_json=client_params.get("stream_json", False),
+        retry_policy=retry_policy,
+        breaker=Client_Retry.CircuitBreaker(breaker_threshold, breaker_reset, name=hosts[0]),
+    )
+
 def llm_initialize(config: dict, llama_cpp_params: dict, base_models_dir: Path):
     """
-    Initialize Local Llama HTTP Client instead of loading GGUF locally.
+    Initialize Local Llama HTTP Clients instead of loading GGUF locally.
+    Trả về (reasoner, critic): mặc định critic dùng chung client với reasoner.
+    models.critical_model.client_params (vd. hosts riêng, tuỳ chọn) → critic nằm trên server khác,
+    hai tiến trình model chạy song song. Cùng hosts + tham số → vẫn dùng chung một client.
+    client_params.retry_policy → một RetryPolicy dùng chung cho cả hai client và flow.
     """
     print("🔗 Using Local Llama HTTP server...")
-    
-    llm_client = Client_Llama.LocalLlamaClient("http://localhost:8080")
-    
-    # Return (reasoner, critic) for compatibility with pipeline
-    return llm_client, llm_client
+
+    reason_params = model_client_params(config, "reasoning_model")
+    critic_params = model_client_params(config, "critical_model")
+    retry_policy = Client_Retry.RetryPolicy.from_config(reason_params.get("retry_policy", {}))
+
+    reasoner = build_client(reason_params, retry_policy)
+    if critic_params == reason_params:
+        print("🔗 Critic dùng chung server với reasoner.")
+        return reasoner, reasoner
+
+    print(f"🔗 Critic server riêng: {', '.join(_hosts(critic_params))}")
+    critic = build_client(critic_params, retry_policy)
+    return reasoner, critic
@@ -0,0 +1,138 @@
+# Libraries/Processor_Preprocess.py
+
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable
+from datasets import load_from_disk, Dataset
+
+from . import Common_Utils
+from . import Processor_Datasets
+from . import Tools_Token_Budget
+
+# ==============================
+
+# Processor_Preprocess.py
+# Tiền xử lý cả split một lần, lưu cache trên đĩa (thay cho chuẩn hoá từng bài trong batch loop):
+#   làm sạch (tuỳ chọn, như Common_Utils.preprocess_text) → gộp khoảng trắng (normalize_article)
+#   → cắt max_chars_per_text (tuỳ chọn) → đếm ký tự / token
+# - Dataset.map(batched=True, num_proc=N): mỗi worker xử lý cả batch
+# - Cache: <cache_dir>/<fingerprint>/ (save_to_disk); fingerprint = dataset._fingerprint + tham số
+#   → lần chạy sau (cùng dataset, cùng tham số) chỉ load_from_disk
+# - Dataset đã tiền xử lý có cột n_chars / n_tokens; Processor_Datasets.iter_articles
+#   nhận ra và không chuẩn hoá lại
+
+PREPROCESS_VERSION = 1
+META_FILE = "preprocess.json"
+
+TokenCounter = Callable[[str], int]
+
+
+def _preprocess_batch(batch: Dict[str, List[Any]],
+                      column: str,
+                      non_keep_pattern: Optional[re.Pattern],
+                      max_chars_per_text: Optional[int],
+                      count_tokens: Optional[TokenCounter]) -> Dict[str, List[Any]]:
+    texts = []
+    for raw in batch[column]:
+        if not isinstance(raw, str) or not raw:
+            texts.append(raw if isinstance(raw, str) else "")
+            continue
+        s = non_keep_pattern.sub("", raw) if non_keep_pattern is not None else raw
+        s = Processor_Datasets.normalize_article(s)
+        if max_chars_per_text is not None and len(s) > max_chars_per_text:
+            s = s[:max_chars_per_text]
+        texts.append(s)
+    out = {column: texts, "n_chars": [len(s) for s in texts]}
+    if count_tokens is not None:
+        out["n_tokens"] = [count_tokens(s) for s in texts]
+    return out
+
+def fingerprint(dataset: Dataset, params: Dict[str, Any]) -> str:
+    """Hash của dataset gốc (dataset._fingerprint, ổn định qua load_from_disk) + tham số tiền xử lý."""
+    base = getattr(dataset, "_fingerprint", None) or f"{len(dataset)}:{dataset.features}"
+    payload = json.dumps({"version": PREPROCESS_VERSION, "dataset": base, **params},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+def _num_proc(num_proc: Optional[int], n_rows: int, batch_size: int) -> Optional[int]:
+    # None → số CPU, nhưng không quá số batch (split nhỏ → một tiến trình, tránh chi phí fork)
+    if num_proc is None:
+        num_proc = os.cpu_count() or 1
+    num_proc = max(1, min(int(num_proc), -(-n_rows // batch_size)))
+    return num_proc if num_proc > 1 else None
+
+def preprocess_dataset(dataset: Dataset,
+                       cache_dir: Path,
+                       column: str = "article",
+                       clean: bool = False,
+                       non_keep_pattern: re.Pattern = Common_Utils.DEFAULT_NON_KEEP_PATTERN,
+                       max_chars_per_text: Optional[int] = None,
+                       count_tokens: Optional[TokenCounter] = Tools_Token_Budget.approx_token_count,
+                       num_proc: Optional[int] = None,
+                       batch_size: int = 1000,
+                       force: bool = False) -> Dataset:
+    """
+    Ví dụ:
+        ds = preprocess_dataset(HF_DATASET, Path("Data/Preprocessed"), num_proc=4)
+        ds[0]["article"], ds[0]["n_tokens"]
+
+    clean=True          : bỏ ký tự ngoài non_keep_pattern (như Common_Utils.preprocess_text)
+    count_tokens        : hàm đếm token (picklable khi num_proc > 1); None → không thêm cột n_tokens
+    force=True          : bỏ qua cache, tính lại
+    """
+    params = {
+        "column": column,
+        "clean": non_keep_pattern.pattern if clean else None,
+        "max_chars_per_text": max_chars_per_text,
+        "count_tokens": f"{count_tokens.__module__}.{count_tokens.__qualname__}" if count_tokens else None,
+    }
+    fp = fingerprint(dataset, params)
+    target = Path(cache_dir) / fp
+
+    if target.exists() and not force:
+        try:
+            cached = load_from_disk(str(target))
+            print(f"♻️ Dùng lại dữ liệu đã tiền xử lý: {target} ({len(cached)} mẫu)")
+            return cached
+        except Exception as e:
+            print(f"⚠️ Cache hỏng ({e}), tiền xử lý lại: {target}")
+
+    procs = _num_proc(num_proc, len(dataset), batch_size)
+    started = time.perf_counter()
+    processed = dataset.map(
+        _preprocess_batch,
+        batched=True,
+        batch_size=batch_size,
+        num_proc=procs,
+        fn_kwargs={
+            "column": column,
+            "non_keep_pattern": non_keep_pattern if clean else None,
+            "max_chars_per_text": max_chars_per_text,
+            "count_tokens": count_tokens,
+        },
+        new_fingerprint=fp,
+        desc="Tiền xử lý",
+    )
+    elapsed = time.perf_counter() - started
+
+    # ghi ra thư mục tạm rồi đổi tên → không để lại cache dở dang
+    tmp = target.with_name(target.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    processed.save_to_disk(str(tmp))
+    meta = {"fingerprint": fp, "version": PREPROCESS_VERSION, "params": params, "rows": len(processed),
+            "num_proc": procs or 1, "seconds": round(elapsed, 3)}
+    if "n_tokens" in processed.column_names:
+        meta["total_tokens"] = int(sum(processed["n_tokens"]))
+    with open(tmp / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+    print(f"✅ Tiền xử lý {len(processed)} mẫu trong {elapsed:.2f}s ({procs or 1} tiến trình) → {target}")
+    return load_from_disk(str(target))
@@ -0,0 +1,278 @@
+# Libraries/Store_History_Compact.py
+
+import io
+import os
+import json
+import gzip
+import hashlib
+
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Tuple, Union
+
+from . import Common_Helpers as helpers
+from . import Common_Readers
+
+# ==============================
+
+# Store_History_Compact.py
+# Định dạng lịch sử rút gọn (JSONL, tuỳ chọn gzip / zstd) — mỗi bài báo chỉ lưu một lần:
+#   {"format": "history-compact", "version": 1}                   (dòng đầu, chỉ có ở file rút gọn)
+#   {"article": "<hash>", "text": "..."}                         bảng bài báo, theo hash nội dung
+#   {"key": "index_3", "data": {"rounds": [...], "stats": {...}}}
+# Trong rounds:
+#   "article:"  : "..."                 → {"$article": "<hash>"}
+#   "reasoning" : "{\"reasoning\": ...}" → {"$json": {...}}   (chỉ khi json.dumps trả lại đúng chuỗi cũ)
+# Đọc lại (unpack_entry / iter_compact) → đúng layout cũ, từng ký tự.
+# Cùng định dạng dòng được HistoryLog(dedup=True) dùng cho segment.
+
+FORMAT = "history-compact"
+VERSION = 1
+
+ARTICLE_FIELDS = ("article:", "article")
+_REF = "$article"
+_JSON = "$json"
+
+KEY_PREFIX = b'{"key": '
+ARTICLE_PREFIX = b'{"article": '
+_PREFIX_SCAN_BYTES = 512
+_DECODER = json.JSONDecoder()
+
+COMPRESSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+# ---------------- COMPRESSION ----------------
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("❌ compression='zstd' cần gói zstandard (pip install zstandard)")
+    return zstandard
+
+def compression_of(path: Union[str, Path]) -> Optional[str]:
+    suffix = Path(path).suffix
+    for name, ext in COMPRESSIONS.items():
+        if ext and suffix == ext:
+            return name
+    return None
+
+def check_compression(compression: Optional[str]) -> Optional[str]:
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression!r} (expected one of {list(COMPRESSIONS)})")
+    return compression
+
+def _tmp_path(path: Path) -> Path:
+    # .tmp đặt trước đuôi nén → open_binary vẫn nén đúng kiểu
+    path = Path(path)
+    if compression_of(path):
+        return path.with_name(path.stem + ".tmp" + path.suffix)
+    return path.with_name(path.name + ".tmp")
+
+def open_binary(path: Union[str, Path], mode: str = "rb"):
+    """File nhị phân, nén / giải nén theo đuôi (.gz / .zst) — đọc / ghi tuần tự."""
+    compression = compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, mode, compresslevel=6) if "w" in mode else gzip.open(path, mode)
+    if compression == "zstd":
+        return _zstd().open(path, mode)
+    return open(path, mode)
+
+def open_random(path: Union[str, Path]):
+    """Để seek tuỳ ý: file thường mở trực tiếp; file nén giải nén vào bộ nhớ (≈ một segment)."""
+    if compression_of(path) is None:
+        return open(path, "rb")
+    with open_binary(path) as f:
+        return io.BytesIO(f.read())
+
+def compress_file(src: Union[str, Path], dst: Union[str, Path]) -> None:
+    """src (file thường) → dst nén theo đuôi của dst, ghi ra <dst>.tmp rồi os.replace."""
+    tmp = _tmp_path(dst)
+    with open(src, "rb") as fin, open_binary(tmp, "wb") as fout:
+        while True:
+            chunk = fin.read(1 << 20)
+            if not chunk:
+                break
+            fout.write(chunk)
+    os.replace(tmp, dst)
+
+
+# ---------------- PACK / UNPACK ----------------
+def article_id(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+def _pack_reasoning(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    try:
+        obj = json.loads(value)
+    except json.JSONDecodeError:
+        return value
+    if isinstance(obj, (dict, list)) and json.dumps(obj, ensure_ascii=False) == value:
+        return {_JSON: obj}
+    return value
+
+def _is_marker(value: Any, marker: str) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and marker in value
+
+def pack_round(record: Any, articles: Dict[str, str]) -> Any:
+    """Một record vòng → bản rút gọn; bài báo mới được thêm vào articles {hash: text}."""
+    if not isinstance(record, dict):
+        return record
+    packed = {}
+    for field, value in record.items():
+        if field in ARTICLE_FIELDS and isinstance(value, str):
+            aid = article_id(value)
+            articles.setdefault(aid, value)
+            value = {_REF: aid}
+        elif field == "reasoning":
+            value = _pack_reasoning(value)
+        packed[field] = value
+    return packed
+
+def unpack_round(record: Any, articles: Dict[str, str]) -> Any:
+    if not isinstance(record, dict):
+        return record
+    out = {}
+    for field, value in record.items():
+        if _is_marker(value, _REF):
+            value = articles[value[_REF]]
+        elif _is_marker(value, _JSON):
+            value = json.dumps(value[_JSON], ensure_ascii=False)
+        out[field] = value
+    return out
+
+def _map_rounds(data: Any, fn, articles: Dict[str, str]) -> Any:
+    # rounds (list) hoặc {rounds, stats}; mục khác (__GLOBAL_SUMMARY__, ...) giữ nguyên
+    if isinstance(data, list):
+        return [fn(r, articles) for r in data]
+    if isinstance(data, dict) and isinstance(data.get("rounds"), list):
+        return {k: ([fn(r, articles) for r in v] if k == "rounds" else v) for k, v in data.items()}
+    return data
+
+def pack_entry(data: Any, articles: Optional[Dict[str, str]] = None) -> Tuple[Any, Dict[str, str]]:
+    """→ (data rút gọn, {hash: text} của các bài báo được tham chiếu)."""
+    articles = {} if articles is None else articles
+    return _map_rounds(data, pack_round, articles), articles
+
+def unpack_entry(data: Any, articles: Dict[str, str]) -> Any:
+    return _map_rounds(data, unpack_round, articles)
+
+def refs_of(data: Any) -> List[str]:
+    """Các hash bài báo mà một mục rút gọn tham chiếu."""
+    rounds = data if isinstance(data, list) else data.get("rounds") if isinstance(data, dict) else None
+    refs = []
+    for r in rounds if isinstance(rounds, list) else []:
+        if isinstance(r, dict):
+            refs.extend(v[_REF] for v in r.values() if _is_marker(v, _REF))
+    return refs
+
+
+# ---------------- LINES ----------------
+def article_line(aid: str, text: str) -> bytes:
+    return (json.dumps({"article": aid, "text": text}, ensure_ascii=False) + "\n").encode("utf-8")
+
+def scan_line(line: bytes) -> Optional[Tuple[str, str]]:
+    """("key" | "article", giá trị) của một dòng hoàn chỉnh — chỉ decode chuỗi đầu dòng."""
+    if not line.endswith(b"\n"):
+        return None     # dòng cuối bị cắt khi tiến trình chết
+    for kind, prefix in (("key", KEY_PREFIX), ("article", ARTICLE_PREFIX)):
+        if line.startswith(prefix):
+            try:
+                value, _ = _DECODER.raw_decode(line[:_PREFIX_SCAN_BYTES].decode("utf-8", "ignore"), len(prefix))
+            except json.JSONDecodeError:
+                return None
+            return kind, value
+    return None
+
+def iter_lines(f) -> Iterator[Tuple[str, Any]]:
+    """
+    Đọc tuần tự một file / segment: (key, data đã unpack) theo thứ tự ghi.
+    Dòng hỏng / bị cắt bị bỏ qua; dòng không rút gọn (segment cũ) trả nguyên.
+    """
+    articles: Dict[str, str] = {}
+    for line in f:
+        try:
+            rec = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+        if not isinstance(rec, dict):
+            continue
+        if "article" in rec and "text" in rec:
+            articles[rec["article"]] = rec["text"]
+        elif "key" in rec:
+            try:
+                yield rec["key"], unpack_entry(rec.get("data"), articles)
+            except KeyError:
+                print(f"⚠️ Bỏ qua {rec['key']}: thiếu bài báo được tham chiếu")
+
+def read_at(f, offset: int, article_offsets: Dict[str, int]) -> Tuple[str, Any]:
+    """(key, data đã unpack) của dòng tại offset; bài báo lấy theo vị trí trong cùng file."""
+    f.seek(offset)
+    rec = json.loads(f.readline())
+    data = rec.get("data")
+    articles = {}
+    for aid in refs_of(data):
+        if aid not in articles:
+            f.seek(article_offsets[aid])
+            articles[aid] = json.loads(f.readline())["text"]
+    return rec["key"], unpack_entry(data, articles)
+
+
+# ---------------- COMPACT FILE ----------------
+def is_compact(path: Union[str, Path]) -> bool:
+    path = Path(path)
+    name = path.name[: -len(path.suffix)] if compression_of(path) else path.name
+    return name.endswith(".jsonl")
+
+def write_compact(source: Union[Dict[str, Any], Iterable[Tuple[str, Any]]], path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    {index_N: {rounds, stats}} (dict hoặc iterator (key, entry), vd. Common_Readers.iter_json_dict)
+    → file rút gọn; nén theo đuôi: .hist.jsonl / .hist.jsonl.gz / .hist.jsonl.zst
+    """
+    path = Path(path)
+    if path.parent:
+        os.makedirs(path.parent, exist_ok=True)
+    tmp = _tmp_path(path)
+    items = source.items() if isinstance(source, dict) else source
+    seen = set()
+    stats = {"entries": 0, "articles": 0, "article_refs": 0}
+    with open_binary(tmp, "wb") as f:
+        f.write((json.dumps({"format": FORMAT, "version": VERSION}) + "\n").encode("utf-8"))
+        for key, entry in items:
+            packed, articles = pack_entry(entry)
+            for aid, text in articles.items():
+                if aid not in seen:
+                    seen.add(aid)
+                    f.write(article_line(aid, text))
+                    stats["articles"] += 1
+            stats["article_refs"] += len(refs_of(packed))
+            f.write((json.dumps({"key": key, "data": packed}, ensure_ascii=False) + "\n").encode("utf-8"))
+            stats["entries"] += 1
+    os.replace(tmp, path)
+    return stats
+
+def iter_compact(path: Union[str, Path]) -> Iterator[Tuple[str, Any]]:
+    """(key, entry) theo layout cũ, đọc tuần tự (giải nén dạng stream)."""
+    with open_binary(path) as f:
+        header = json.loads(f.readline() or b"{}")
+        if header.get("format") != FORMAT:
+            raise ValueError(f"❌ {path} không phải file lịch sử rút gọn ({FORMAT})")
+        if header.get("version", 0) > VERSION:
+            raise ValueError(f"❌ {path}: version {header.get('version')} mới hơn bản đọc được ({VERSION})")
+        yield from iter_lines(f)
+
+def load_compact(path: Union[str, Path]) -> Dict[str, Any]:
+    """Toàn bộ file rút gọn → {index_N: {rounds, stats}} đã sắp xếp (như file JSON cũ)."""
+    history = dict(iter_compact(path))
+    return {k: history[k] for k in sorted(history, key=helpers._get_sort_key)}
+
+def convert(json_path: Union[str, Path], out_path: Optional[Union[str, Path]] = None,
+            compression: Optional[str] = "gzip") -> Path:
+    """Histories-Batch-EN.json → Histories-Batch-EN.hist.jsonl.gz (đọc stream, không json.load cả file)."""
+    json_path = Path(json_path)
+    out_path = Path(out_path) if out_path else json_path.with_name(
+        json_path.stem + ".hist.jsonl" + COMPRESSIONS[check_compression(compression)])
+    stats = write_compact(Common_Readers.iter_json_dict(json_path), out_path)
+    before, after = json_path.stat().st_size, out_path.stat().st_size
+    print(f"🗜️ {json_path.name} ({before / 1e6:.2f} MB) → {out_path.name} ({after / 1e6:.2f} MB, "
+          f"{before / max(after, 1):.1f}x; {stats['articles']} bài / {stats['article_refs']} tham chiếu)")
+    return out_path
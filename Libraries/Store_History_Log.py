@@ -0,0 +1,369 @@
+# Libraries/Store_History_Log.py
+
+import os
+import json
+import time
+import contextlib
+import threading
+
+from pathlib import Path
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+from . import Common_Helpers as helpers
+from . import Common_Readers
+from . import Store_History_Compact
+
+# ==============================
+
+# Store_History_Log.py
+# Lịch sử batch dạng append-only, chia segment (thay cho update_json_dict đọc/ghi lại cả file mỗi mẫu):
+#   <history>.json.segments/
+#       000001.jsonl        segment đã đóng (chỉ đọc)
+#       000002.jsonl.open   segment đang ghi: mỗi mẫu = một dòng {"key", "data", "ts"}
+# - write(): một lần write + flush → chi phí mỗi mẫu không phụ thuộc kích thước batch
+# - Segment đạt segment_bytes → đóng bằng os.replace (nguyên tử), mở segment mới
+# - compact(): file JSON gốc + các segment đã đóng → {index_N: {rounds, stats}} đã sắp xếp,
+#   ghi từng mục ra file tạm (Common_Readers: chỉ giữ vị trí byte, không nạp cả file)
+#   rồi os.replace → không bao giờ để lại file JSON dở dang
+# - Tiến trình chết giữa chừng: dòng cuối bị cắt bị bỏ qua khi đọc; segment .open cũ được đóng lại
+# - dedup=True: bài báo ghi một lần / segment (bảng theo hash), reasoning lưu dạng object
+#   (định dạng dòng của Store_History_Compact); compression="gzip" | "zstd": nén segment khi đóng.
+#   Đọc / compact luôn trả lại layout cũ, bất kể segment được ghi với tuỳ chọn nào
+
+_OPEN_SUFFIX = ".open"
+_SEGMENT_SUFFIXES = tuple(".jsonl" + ext for ext in Store_History_Compact.COMPRESSIONS.values())
+# số segment mở cùng lúc khi compact (segment nén được giải nén vào bộ nhớ)
+_MAX_OPEN_SEGMENTS = 4
+
+def segments_dir(path: Path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + ".segments")
+
+def write_json_atomic(data: Any, path: Path, indent: int = 2) -> None:
+    """Ghi ra <path>.tmp rồi os.replace → người đọc chỉ thấy file cũ hoặc file mới hoàn chỉnh."""
+    path = Path(path)
+    if path.parent:
+        os.makedirs(path.parent, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _normalize(key: str, data: Any) -> Any:
+    # rounds (list) → {rounds, stats} như update_json_dict
+    if isinstance(data, list):
+        try:
+            return helpers.stage2_sort_and_count(OrderedDict({key: data}))[key]
+        except Exception as e:
+            print(f"⚠️ Không thể chuẩn hóa dữ liệu {key}: {e}")
+    return data
+
+def _sorted(history: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return {k: history[k] for k in sorted(history, key=helpers._get_sort_key)}
+    except Exception as e:
+        print(f"⚠️ Cảnh báo: Không thể sắp xếp JSON keys: {e}. Sẽ ghi không sắp xếp.")
+        return history
+
+
+class HistoryLog:
+    """
+    Ví dụ:
+        log = HistoryLog("Output/Histories-Batch-VI.json")
+        log.write("index_3", result["history"]["iterations"])
+        log.close()              # đóng segment + compact → Histories-Batch-VI.json
+    """
+
+    def __init__(self,
+                 path: Path,
+                 segment_bytes: int = 4 * 1024 * 1024,
+                 compact_every: int = 0,
+                 fsync: bool = False,
+                 indent: int = 2,
+                 dedup: bool = False,
+                 compression: Optional[str] = None):
+        """
+        segment_bytes : kích thước tối đa một segment trước khi xoay vòng
+        compact_every : > 0 → tự compact nền khi có ≥ compact_every segment đã đóng
+        fsync         : True → fsync sau mỗi dòng (bền cả khi mất điện, chậm hơn)
+        dedup         : True → bảng bài báo theo hash + reasoning dạng object (dòng nhỏ hơn nhiều)
+        compression   : None | "gzip" | "zstd" — nén segment khi đóng
+        """
+        self.path = Path(path)
+        self.dir = segments_dir(self.path)
+        self.segment_bytes = max(1, int(segment_bytes))
+        self.compact_every = int(compact_every or 0)
+        self.fsync = fsync
+        self.indent = indent
+        self.dedup = dedup
+        self.compression = Store_History_Compact.check_compression(compression)
+        self.stats = {"writes": 0, "bytes": 0, "rotations": 0, "compactions": 0}
+
+        self._lock = threading.Lock()           # ghi / xoay segment
+        self._compact_lock = threading.Lock()   # một lượt compact tại một thời điểm
+        self._compactor: Optional[threading.Thread] = None
+        self._file = None
+        self._size = 0
+        self._seg_articles = set()              # hash bài báo đã ghi trong segment đang mở
+
+        os.makedirs(self.dir, exist_ok=True)
+        # segment .open còn sót (tiến trình trước chết) → đóng lại, không ghi nối vào dòng bị cắt
+        for seg in sorted(self.dir.glob(f"*.jsonl{_OPEN_SUFFIX}")):
+            os.replace(seg, seg.with_name(seg.name[: -len(_OPEN_SUFFIX)]))
+        for tmp in self.dir.glob("*.tmp*"):
+            os.remove(tmp)      # nén segment dở dang
+        self._seq = max((self._seq_of(p) for p in self.sealed_segments()), default=0)
+
+    # ---------------- SEGMENTS ----------------
+    @staticmethod
+    def _seq_of(path: Path) -> int:
+        try:
+            return int(path.name.split(".", 1)[0])
+        except ValueError:
+            return 0
+
+    def sealed_segments(self) -> List[Path]:
+        return sorted((p for p in self.dir.iterdir() if p.name.endswith(_SEGMENT_SUFFIXES)), key=self._seq_of)
+
+    def _open_segment(self):
+        self._seq += 1
+        self._active = self.dir / f"{self._seq:06d}.jsonl{_OPEN_SUFFIX}"
+        self._file = open(self._active, "ab")
+        self._size = 0
+        self._seg_articles = set()
+
+    def _seal(self) -> bool:
+        """Đóng segment đang ghi (nếu có dữ liệu). Gọi khi đang giữ self._lock."""
+        if self._file is None:
+            return False
+        self._file.close()
+        self._file = None
+        if self._size == 0:
+            os.remove(self._active)
+            return False
+        sealed = self._active.with_name(self._active.name[: -len(_OPEN_SUFFIX)])
+        if self.compression:
+            ext = Store_History_Compact.COMPRESSIONS[self.compression]
+            Store_History_Compact.compress_file(self._active, sealed.with_name(sealed.name + ext))
+            os.remove(self._active)
+        else:
+            os.replace(self._active, sealed)
+        self.stats["rotations"] += 1
+        return True
+
+    # ---------------- WRITE ----------------
+    def write(self, key: str, data: Any) -> None:
+        """Ghi một mẫu (rounds của index_N). Mẫu ghi sau cùng một key sẽ thay mẫu trước khi compact."""
+        articles = {}
+        if self.dedup:
+            data, articles = Store_History_Compact.pack_entry(data)
+        line = (json.dumps({"key": key, "data": data, "ts": round(time.time(), 3)}, ensure_ascii=False)
+                + "\n").encode("utf-8")
+        sealed = False
+        with self._lock:
+            if self._file is None:
+                self._open_segment()
+            # bài báo chưa có trong segment → ghi trước bản ghi, trong cùng một lần write
+            new = [aid for aid in articles if aid not in self._seg_articles]
+            if new:
+                self._seg_articles.update(new)
+                line = b"".join(Store_History_Compact.article_line(aid, articles[aid]) for aid in new) + line
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._size += len(line)
+            self.stats["writes"] += 1
+            self.stats["bytes"] += len(line)
+            if self._size >= self.segment_bytes:
+                sealed = self._seal()
+        if sealed and self.compact_every and len(self.sealed_segments()) >= self.compact_every:
+            self.compact_in_background()
+
+    # ---------------- READ ----------------
+    @staticmethod
+    def _iter_segment(path: Path) -> Iterator[Tuple[str, Any]]:
+        with Store_History_Compact.open_binary(path) as f:
+            yield from Store_History_Compact.iter_lines(f)
+
+    def _has_base(self) -> bool:
+        return self.path.exists() and self.path.stat().st_size > 0
+
+    def _base_spans(self) -> List[Tuple[str, int, int]]:
+        """(key, byte đầu, byte cuối) của các mục trong file gốc — chỉ giữ key, không giữ dữ liệu."""
+        if not self._has_base():
+            return []
+        try:
+            return list(Common_Readers.iter_json_spans(self.path))
+        except ValueError as e:
+            raise ValueError(f"❌ {self.path} không phải JSON dict hợp lệ, không compact đè lên được: {e}")
+
+    def _merge(self, segments: List[Path]) -> Dict[str, Any]:
+        history = dict(Common_Readers.iter_json_dict(self.path)) if self._has_base() else {}
+        for seg in segments:
+            for key, data in self._iter_segment(seg):
+                history[key] = _normalize(key, data)
+        return _sorted(history)
+
+    def load(self) -> Dict[str, Any]:
+        """Lịch sử đầy đủ (file gốc + mọi segment, kể cả segment đang ghi) mà không ghi gì ra đĩa."""
+        with self._lock:
+            segments = self.sealed_segments()
+            if self._file is not None:
+                segments.append(self._active)
+            return self._merge(segments)
+
+    @staticmethod
+    def _scan_keys(f, articles: Dict[str, int]) -> Iterator[Tuple[int, str]]:
+        """
+        (byte offset, key) của các dòng hoàn chỉnh; chỉ decode chuỗi đầu dòng, không parse cả bản ghi.
+        Vị trí dòng bài báo (segment dedup) được ghi vào articles {hash: offset}.
+        """
+        offset = 0
+        for line in f:
+            start, offset = offset, offset + len(line)
+            hit = Store_History_Compact.scan_line(line)
+            if hit is None:
+                continue    # dòng bị cắt / không đúng định dạng
+            kind, value = hit
+            if kind == "article":
+                articles.setdefault(value, start)
+            else:
+                yield start, value
+
+    def _latest(self, segments: List[Path]) -> Tuple[Dict[str, Tuple[int, int]], List[Dict[str, int]]]:
+        """key → (segment, byte offset) của bản ghi cuối cùng; vị trí bài báo của từng segment."""
+        latest: Dict[str, Tuple[int, int]] = {}
+        articles: List[Dict[str, int]] = []
+        for si, seg in enumerate(segments):
+            offsets: Dict[str, int] = {}
+            with Store_History_Compact.open_binary(seg) as f:
+                for offset, key in self._scan_keys(f, offsets):
+                    latest[key] = (si, offset)
+            articles.append(offsets)
+        return latest, articles
+
+    @staticmethod
+    def _read_at(f, offset: int, articles: Dict[str, int]) -> Any:
+        key, data = Store_History_Compact.read_at(f, offset, articles)
+        return _normalize(key, data)
+
+    def iter_entries(self) -> Iterator[Tuple[str, Any]]:
+        """
+        (key, {rounds, stats}) như load() nhưng không giữ cả lịch sử trong bộ nhớ:
+        lượt 1 chỉ nhớ vị trí bản ghi cuối của mỗi key, lượt 2 chỉ parse đúng các dòng đó.
+        Thứ tự: mục của file gốc trước, rồi theo thứ tự ghi.
+        """
+        with self._lock:
+            segments = self.sealed_segments()
+            if self._file is not None:
+                segments.append(self._active)
+        latest, articles = self._latest(segments)
+        if self._has_base():
+            for key, data in Common_Readers.iter_json_dict(self.path):
+                if key not in latest:
+                    yield key, data
+        for si, seg in enumerate(segments):
+            offsets = sorted((off, key) for key, (s, off) in latest.items() if s == si)
+            with Store_History_Compact.open_random(seg) as f:
+                for offset, key in offsets:
+                    yield key, self._read_at(f, offset, articles[si])
+
+    # ---------------- COMPACT ----------------
+    def _write_merged(self, segments: List[Path], out_path: Path) -> int:
+        """
+        Ghi JSON gộp từng mục một (giống hệt json.dump cả dict, indent=self.indent):
+        bộ nhớ chỉ giữ danh sách key + vị trí, không giữ dữ liệu.
+        """
+        latest, articles = self._latest(segments)
+        spans = {key: (start, end) for key, start, end in self._base_spans()}
+        keys = list(spans) + [k for k in latest if k not in spans]
+        keys.sort(key=helpers._get_sort_key)
+
+        indent = self.indent
+        pad = "\n" + " " * indent if indent is not None else ""
+        sep = "," if indent is not None else ", "
+        tmp = out_path.with_name(out_path.name + ".tmp")
+        if out_path.parent:
+            os.makedirs(out_path.parent, exist_ok=True)
+        handles: OrderedDict = OrderedDict()
+        try:
+            base_ctx = Common_Readers._mapped(self.path) if spans else contextlib.nullcontext(b"")
+            with open(tmp, "w", encoding="utf-8") as out, base_ctx as base:
+                out.write("{")
+                for i, key in enumerate(keys):
+                    if key in latest:
+                        si, offset = latest[key]
+                        if si not in handles:
+                            if len(handles) >= _MAX_OPEN_SEGMENTS:
+                                handles.popitem(last=False)[1].close()
+                            handles[si] = Store_History_Compact.open_random(segments[si])
+                        handles.move_to_end(si)
+                        data = self._read_at(handles[si], offset, articles[si])
+                    else:
+                        start, end = spans[key]
+                        data = json.loads(base[start:end])
+                    value = json.dumps(data, indent=indent, ensure_ascii=False)
+                    if indent is not None:
+                        value = value.replace("\n", pad)
+                    out.write((sep if i else "") + pad + json.dumps(key, ensure_ascii=False) + ": " + value)
+                out.write(("\n}" if indent is not None else "}") if keys else "}")
+                out.flush()
+                os.fsync(out.fileno())
+        finally:
+            for h in handles.values():
+                h.close()
+        os.replace(tmp, out_path)
+        return len(keys)
+
+    def compact(self, out_path: Optional[Path] = None, seal: bool = True) -> Path:
+        """
+        Gộp file gốc + các segment đã đóng → JSON {index_N: {rounds, stats}} đã sắp xếp.
+        out_path mặc định = self.path; khi đó segment đã gộp bị xoá (gộp lại lần nữa cũng vô hại).
+        Việc ghi mẫu mới không bị chặn trong lúc compact (chỉ chờ lúc đóng segment).
+        """
+        out_path = Path(out_path or self.path)
+        with self._compact_lock:
+            if seal:
+                with self._lock:
+                    self._seal()
+            segments = self.sealed_segments()
+            self._write_merged(segments, out_path)
+            if out_path == self.path:
+                for seg in segments:
+                    os.remove(seg)
+            self.stats["compactions"] += 1
+        return out_path
+
+    def compact_in_background(self) -> threading.Thread:
+        """Chạy compact(seal=False) trong thread nền; đang có lượt compact → trả lại thread đó."""
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return self._compactor
+
+            def _run():
+                try:
+                    self.compact(seal=False)
+                except Exception as e:
+                    print(f"❌ Lỗi compact {self.path}: {e}")
+
+            self._compactor = threading.Thread(target=_run, name="history-compact", daemon=True)
+            self._compactor.start()
+            return self._compactor
+
+    def close(self, compact: bool = True) -> Optional[Path]:
+        """Đóng segment đang ghi; compact=True → gộp luôn ra file JSON."""
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            self._seal()
+        return self.compact(seal=False) if compact else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,360 @@
+# Libraries/Store_History_Sqlite.py
+
+import re
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from pathlib import Path
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+from . import Common_Helpers as helpers
+from . import Common_Readers
+from . import Store_History_Log
+from . import Store_History_Compact
+
+# ==============================
+
+# Store_History_Sqlite.py
+# Lịch sử / kết quả trong SQLite (tùy chọn, song song với file Histories-Batch-*.json):
+#   samples  : một dòng / bài (run, lang, idx, best_score, stats)
+#   rounds   : một dòng / vòng (average_score, summary, record JSON gốc)
+#   scores   : một dòng / tiêu chí / vòng
+#   feedback : nhận xét của critic / vòng
+# - Index theo idx, lang, round, average_score → truy vấn phân tích tính bằng ms, không cần parse JSON
+#   (lang được chép xuống rounds/scores để index phủ được truy vấn, không phải JOIN samples)
+# - WAL + commit theo lô (batch_size mẫu hoặc commit_interval giây)
+# - write(key, data) cùng giao diện với HistoryLog → dùng được làm writer cho Flow_Scheduler
+# - import_json / export_json: qua lại với định dạng {index_N: {rounds, stats}}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id         INTEGER PRIMARY KEY,
+    run        TEXT NOT NULL,
+    lang       TEXT,
+    idx        INTEGER NOT NULL,
+    key        TEXT NOT NULL,
+    article    TEXT,
+    n_rounds   INTEGER NOT NULL,
+    best_score REAL,
+    stats      TEXT,
+    updated    REAL NOT NULL,
+    UNIQUE (run, key)
+);
+CREATE TABLE IF NOT EXISTS rounds (
+    sample_id     INTEGER NOT NULL REFERENCES samples(id) ON DELETE CASCADE,
+    round         INTEGER NOT NULL,
+    lang          TEXT,
+    average_score REAL,
+    summary       TEXT,
+    error         TEXT,
+    record        TEXT NOT NULL,
+    PRIMARY KEY (sample_id, round)
+);
+CREATE TABLE IF NOT EXISTS scores (
+    sample_id INTEGER NOT NULL REFERENCES samples(id) ON DELETE CASCADE,
+    round     INTEGER NOT NULL,
+    lang      TEXT,
+    criterion TEXT NOT NULL,
+    score     REAL NOT NULL,
+    PRIMARY KEY (sample_id, round, criterion)
+);
+CREATE TABLE IF NOT EXISTS feedback (
+    sample_id INTEGER NOT NULL REFERENCES samples(id) ON DELETE CASCADE,
+    round     INTEGER NOT NULL,
+    text      TEXT NOT NULL,
+    PRIMARY KEY (sample_id, round)
+);
+CREATE INDEX IF NOT EXISTS idx_samples_idx ON samples(idx);
+CREATE INDEX IF NOT EXISTS idx_samples_lang ON samples(lang, idx);
+CREATE INDEX IF NOT EXISTS idx_samples_best ON samples(best_score);
+CREATE INDEX IF NOT EXISTS idx_rounds_round ON rounds(round, lang, average_score, sample_id);
+CREATE INDEX IF NOT EXISTS idx_rounds_score ON rounds(average_score);
+CREATE INDEX IF NOT EXISTS idx_scores_lang ON scores(lang, criterion, round, score);
+CREATE INDEX IF NOT EXISTS idx_scores_round ON scores(round, criterion, lang, score);
+"""
+
+_LANG_RE = re.compile(r"-(EN|VI)(?:-|\.|$)", re.IGNORECASE)
+
+def lang_of(path: Path) -> Optional[str]:
+    """Histories-Batch-EN-calced.json → "en"."""
+    m = _LANG_RE.search(Path(path).name)
+    return m.group(1).lower() if m else None
+
+def run_of(path: Path) -> str:
+    """Histories-Batch-EN.json / Histories-Batch-EN.hist.jsonl.gz → "Histories-Batch-EN"."""
+    name = Path(path).name
+    for suffix in (".gz", ".zst", ".jsonl", ".hist", ".json"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+    return name
+
+def _is_sample(entry: Any, rounds: List[Dict[str, Any]]) -> bool:
+    return bool(rounds) or isinstance(entry, list) or (isinstance(entry, dict) and "rounds" in entry)
+
+def iter_history(history: Dict[str, Any]) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """(key, rounds) của file lịch sử; bỏ qua mục không phải bài (__GLOBAL_SUMMARY__, ...)."""
+    for key, entry in history.items():
+        rounds = helpers.rounds_of(entry)
+        if _is_sample(entry, rounds):
+            yield key, rounds
+
+def iter_history_file(path: Path) -> Iterator[Tuple[str, List[Dict[str, Any]], Any]]:
+    """
+    (key, rounds, entry) đọc stream từ file JSON (Common_Readers) hoặc file rút gọn
+    .hist.jsonl[.gz|.zst] (Store_History_Compact) — không json.load cả file.
+    """
+    if Store_History_Compact.is_compact(path):
+        entries = Store_History_Compact.iter_compact(path)
+    else:
+        entries = Common_Readers.iter_json_dict(path)
+    for key, entry in entries:
+        rounds = helpers.rounds_of(entry)
+        if _is_sample(entry, rounds):
+            yield key, rounds, entry
+
+
+class HistoryDB:
+    """
+    Ví dụ:
+        db = HistoryDB("Output/Histories.sqlite", lang="vi", run="Histories-Batch-VI")
+        db.import_json("Output/Histories-Batch-EN-merged.json")
+        db.score_drops(1, 2)                  # bài có vòng 2 thấp hơn vòng 1
+        db.mean_scores(by="lang")             # điểm TB từng tiêu chí theo ngôn ngữ
+    """
+
+    def __init__(self,
+                 path: Path,
+                 lang: Optional[str] = None,
+                 run: str = "",
+                 batch_size: int = 50,
+                 commit_interval: float = 2.0):
+        """
+        lang / run      : gán cho các mẫu ghi qua write()
+        batch_size      : commit sau mỗi batch_size mẫu ...
+        commit_interval : ... hoặc khi bản ghi chưa commit cũ hơn commit_interval giây
+        """
+        self.path = Path(path)
+        self.lang = lang
+        self.run = run
+        self.batch_size = max(1, int(batch_size))
+        self.commit_interval = commit_interval
+        self.stats = {"writes": 0, "commits": 0}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._pending_since = 0.0
+
+        if self.path.parent:
+            os.makedirs(self.path.parent, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # ---------------- WRITE ----------------
+    def _insert(self, run: str, lang: Optional[str], key: str, rounds: List[Dict[str, Any]],
+                stats: Optional[Dict[str, Any]] = None) -> None:
+        """Ghi (hoặc thay) một bài. Gọi khi đang giữ self._lock; chưa commit."""
+        if stats is None:
+            normalized = Store_History_Log._normalize(key, rounds)
+            rounds = normalized.get("rounds", rounds) if isinstance(normalized, dict) else rounds
+            stats = normalized.get("stats") if isinstance(normalized, dict) else None
+        scored = [(helpers.to_int(r.get("round")), helpers.to_float(r.get("average_score"))) for r in rounds]
+        refined = [s for n, s in scored if n >= 1 and s is not None]
+        best = max(refined or [s for _, s in scored if s is not None], default=None)
+        article = next((r.get("article:") or r.get("article") for r in rounds
+                        if r.get("article:") or r.get("article")), None)
+
+        self._conn.execute("DELETE FROM samples WHERE run = ? AND key = ?", (run, key))
+        cur = self._conn.execute(
+            "INSERT INTO samples(run, lang, idx, key, article, n_rounds, best_score, stats, updated)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run, lang, helpers._get_sort_key(key), key, article, len(rounds), best,
+             json.dumps(stats, ensure_ascii=False) if stats is not None else None, time.time()))
+        sid = cur.lastrowid
+
+        round_rows, score_rows, feedback_rows = [], [], []
+        for pos, r in enumerate(rounds):
+            n = helpers.to_int(r.get("round"), pos)
+            err = r.get("error")
+            round_rows.append((sid, n, lang, helpers.to_float(r.get("average_score")),
+                               helpers.reasoning_summary(r.get("reasoning")),
+                               json.dumps(err, ensure_ascii=False) if err is not None else None,
+                               json.dumps(r, ensure_ascii=False)))
+            for crit, score in helpers.parse_evaluation(r.get("evaluation")).items():
+                s = helpers.to_float(score)
+                if s is not None:
+                    score_rows.append((sid, n, lang, str(crit), s))
+            fb = r.get("feedback")
+            if isinstance(fb, str) and fb:
+                feedback_rows.append((sid, n, fb))
+        # cùng round xuất hiện hai lần (file cũ) → giữ bản sau
+        self._conn.executemany("INSERT OR REPLACE INTO rounds VALUES (?, ?, ?, ?, ?, ?, ?)", round_rows)
+        self._conn.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)", score_rows)
+        self._conn.executemany("INSERT OR REPLACE INTO feedback VALUES (?, ?, ?)", feedback_rows)
+
+    def write(self, key: str, data: Any) -> None:
+        """Ghi một bài (rounds hoặc {rounds, stats}); commit theo lô."""
+        with self._lock:
+            stats = data.get("stats") if isinstance(data, dict) else None
+            self._insert(self.run, self.lang, key, helpers.rounds_of(data), stats)
+            self.stats["writes"] += 1
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending += 1
+            if (self._pending >= self.batch_size
+                    or time.monotonic() - self._pending_since >= self.commit_interval):
+                self._commit()
+
+    def _commit(self) -> None:
+        self._conn.commit()
+        self._pending = 0
+        self.stats["commits"] += 1
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._pending:
+                self._commit()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------- IMPORT / EXPORT ----------------
+    def import_json(self, path: Path, run: Optional[str] = None, lang: Optional[str] = None) -> int:
+        """
+        Nạp file Histories-Batch-*.json (một transaction, đọc stream từng mục).
+        run mặc định = tên file; lang đoán theo tên.
+        """
+        path = Path(path)
+        run = run if run is not None else run_of(path)
+        lang = lang or lang_of(path)
+        n = 0
+        with self._lock:
+            for key, rounds, entry in iter_history_file(path):
+                stats = entry.get("stats") if isinstance(entry, dict) else None
+                self._insert(run, lang, key, rounds, stats)
+                n += 1
+            self._commit()
+        return n
+
+    def export_json(self, path: Optional[Path] = None, run: Optional[str] = None,
+                    lang: Optional[str] = None) -> Dict[str, Any]:
+        """→ {index_N: {rounds, stats}} đã sắp xếp (như compact của HistoryLog); path → ghi file."""
+        self.flush()
+        where, params = self._where(run=run, lang=lang)
+        with self._lock:
+            samples = self._conn.execute(
+                f"SELECT id, key, stats FROM samples{where} ORDER BY idx, key", params).fetchall()
+            history: Dict[str, Any] = OrderedDict()
+            for s in samples:
+                rows = self._conn.execute("SELECT record FROM rounds WHERE sample_id = ? ORDER BY round",
+                                          (s["id"],)).fetchall()
+                rounds = [json.loads(r["record"]) for r in rows]
+                history[s["key"]] = (OrderedDict({"rounds": rounds, "stats": json.loads(s["stats"])})
+                                     if s["stats"] is not None else rounds)
+        if path is not None:
+            Store_History_Log.write_json_atomic(history, Path(path))
+        return history
+
+    def iter_rounds(self, run: Optional[str] = None,
+                    lang: Optional[str] = None) -> Iterator[Tuple[str, Optional[str], str, Dict[str, Any]]]:
+        """(run, lang, key, record vòng) theo thứ tự run/idx/round; đọc bằng kết nối riêng, không nạp hết."""
+        self.flush()
+        where, params = self._where("s", run=run, lang=lang)
+        conn = sqlite3.connect(str(self.path))
+        try:
+            cur = conn.execute(
+                "SELECT s.run, s.lang, s.key, r.record FROM rounds r JOIN samples s ON s.id = r.sample_id"
+                f"{where} ORDER BY s.run, s.idx, r.round", params)
+            for run_, lang_, key, record in cur:
+                yield run_, lang_, key, json.loads(record)
+        finally:
+            conn.close()
+
+    # ---------------- QUERY ----------------
+    @staticmethod
+    def _where(alias: str = "", **filters) -> Tuple[str, Tuple[Any, ...]]:
+        prefix = f"{alias}." if alias else ""
+        clauses = [(f"{prefix}{k} = ?", v) for k, v in filters.items() if v is not None]
+        if not clauses:
+            return "", ()
+        return " WHERE " + " AND ".join(c for c, _ in clauses), tuple(v for _, v in clauses)
+
+    def query(self, sql: str, params: Tuple[Any, ...] = ()) -> List[Dict[str, Any]]:
+        """SQL tùy ý → list dict (dữ liệu chưa commit của write() cũng thấy được)."""
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params).fetchall()]
+
+    def samples(self, lang: Optional[str] = None, run: Optional[str] = None,
+                min_score: Optional[float] = None, max_score: Optional[float] = None) -> List[Dict[str, Any]]:
+        where, params = self._where(lang=lang, run=run)
+        cond = [where[7:]] if where else []
+        if min_score is not None:
+            cond.append("best_score >= ?")
+            params += (min_score,)
+        if max_score is not None:
+            cond.append("best_score <= ?")
+            params += (max_score,)
+        sql = ("SELECT run, lang, idx, key, n_rounds, best_score FROM samples"
+               + (" WHERE " + " AND ".join(cond) if cond else "") + " ORDER BY run, idx")
+        return self.query(sql, params)
+
+    def score_drops(self, from_round: int = 1, to_round: int = 2, lang: Optional[str] = None,
+                    run: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Bài có điểm vòng to_round thấp hơn vòng from_round."""
+        where, params = self._where("s", lang=lang, run=run)
+        sql = ("SELECT s.run, s.lang, s.idx, s.key, a.average_score AS before, b.average_score AS after,"
+               " b.average_score - a.average_score AS delta"
+               " FROM rounds a JOIN rounds b ON b.sample_id = a.sample_id AND b.round = ?"
+               " JOIN samples s ON s.id = a.sample_id"
+               + (where + " AND" if where else " WHERE")
+               + " a.round = ? AND b.average_score < a.average_score ORDER BY delta, s.run, s.idx")
+        return self.query(sql, (to_round,) + params + (from_round,))
+
+    def mean_scores(self, by: str = "lang", round: Optional[int] = None,
+                    lang: Optional[str] = None, run: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Điểm TB từng tiêu chí, nhóm theo by ∈ {lang, run, round}."""
+        if by not in ("lang", "run", "round"):
+            raise ValueError(f"by must be one of lang/run/round, got {by!r}")
+        # chỉ JOIN samples khi cần run; còn lại index phủ idx_scores_lang / idx_scores_round là đủ
+        join = by == "run" or run is not None
+        group = "s.run" if by == "run" else f"c.{by}"
+        where, params = self._where("c", lang=lang, round=round)
+        if run is not None:
+            where = (where + " AND" if where else " WHERE") + " s.run = ?"
+            params += (run,)
+        sql = (f"SELECT {group} AS {by}, c.criterion, AVG(c.score) AS mean, COUNT(*) AS n FROM scores c"
+               + (" JOIN samples s ON s.id = c.sample_id" if join else "")
+               + f"{where} GROUP BY {group}, c.criterion ORDER BY {group}, c.criterion")
+        return self.query(sql, params)
+
+    def round_means(self, lang: Optional[str] = None, run: Optional[str] = None) -> List[Dict[str, Any]]:
+        """average_score TB / min / max theo vòng."""
+        where, params = self._where("r", lang=lang)
+        if run is not None:
+            where = (where + " AND" if where else " WHERE") + " s.run = ?"
+            params += (run,)
+        sql = ("SELECT r.round, AVG(r.average_score) AS mean, MIN(r.average_score) AS min,"
+               " MAX(r.average_score) AS max, COUNT(*) AS n FROM rounds r"
+               + (" JOIN samples s ON s.id = r.sample_id" if run is not None else "")
+               + f"{where} GROUP BY r.round ORDER BY r.round")
+        return self.query(sql, params)
+
+    def info(self) -> Dict[str, Any]:
+        counts = {t: self.query(f"SELECT COUNT(*) AS n FROM {t}")[0]["n"]
+                  for t in ("samples", "rounds", "scores", "feedback")}
+        return {**self.stats, **counts, "path": str(self.path)}
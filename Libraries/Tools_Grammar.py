@@ -0,0 +1,65 @@
+# Libraries/Tools_Grammar.py
+
+from typing import Dict, Any
+
+# ==============================
+
+# Tools_Grammar.py
+# Ràng buộc decode (llama.cpp grammar) cho hai schema đầu ra của pipeline:
+#   reasoning : {"reasoning": {"topic", "key_ideas", "filtered_ideas"}, "summary"}
+#   critic    : {"scoring": {6 tiêu chí, số nguyên 1–5}, "feedback_text"}
+# - GBNF   : gửi qua payload["grammar"]
+# - schema : JSON schema, gửi qua payload["json_schema"] (llama.cpp tự chuyển sang GBNF)
+# Thứ tự key cố định như trong prompt → streaming cắt được ngay khi object đóng.
+
+MODES = ("gbnf", "json_schema")
+
+SCORE_KEYS = ["factuality", "clarity", "logical_coherence", "coverage", "utility", "consistency"]
+REASONING_KEYS = ["topic", "key_ideas", "filtered_ideas"]
+
+# Chuỗi JSON một dòng (không ký tự điều khiển), khoảng trắng giới hạn để model không "trôi"
+_COMMON_GBNF = r'''
+string ::= "\"" char* "\""
+char ::= [^"\\\x00-\x1F] | "\\" (["\\/bfnrt] | "u" [0-9a-fA-F]{4})
+ws ::= | " " | "\n" [ \t]{0,20}
+'''
+
+def _object_rule(name: str, keys, value_rule: str) -> str:
+    parts = ' "," ws '.join(f'"\\"{k}\\"" ws ":" ws {value_rule}' for k in keys)
+    return f'{name} ::= "{{" ws {parts} ws "}}"'
+
+REASONING_GBNF = "\n".join([
+    'root ::= "{" ws "\\"reasoning\\"" ws ":" ws reasoning "," ws "\\"summary\\"" ws ":" ws string ws "}"',
+    _object_rule("reasoning", REASONING_KEYS, "string"),
+]) + _COMMON_GBNF
+
+CRITIC_GBNF = "\n".join([
+    'root ::= "{" ws "\\"scoring\\"" ws ":" ws scoring "," ws "\\"feedback_text\\"" ws ":" ws string ws "}"',
+    _object_rule("scoring", SCORE_KEYS, "score"),
+    'score ::= [1-5]',
+]) + _COMMON_GBNF
+
+def _object_schema(props: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "object", "properties": props, "required": list(props), "additionalProperties": False}
+
+REASONING_SCHEMA = _object_schema({
+    "reasoning": _object_schema({k: {"type": "string"} for k in REASONING_KEYS}),
+    "summary": {"type": "string"},
+})
+
+CRITIC_SCHEMA = _object_schema({
+    "scoring": _object_schema({k: {"type": "integer", "minimum": 1, "maximum": 5} for k in SCORE_KEYS}),
+    "feedback_text": {"type": "string"},
+})
+
+GRAMMARS = {
+    "reasoning": {"gbnf": REASONING_GBNF, "json_schema": REASONING_SCHEMA},
+    "critic": {"gbnf": CRITIC_GBNF, "json_schema": CRITIC_SCHEMA},
+}
+
+def request_kwargs(schema: str, mode: str = "gbnf") -> Dict[str, Any]:
+    """Kwargs cho client: {"grammar": gbnf} hoặc {"json_schema": schema}."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown grammar mode: {mode!r} (expected one of {MODES})")
+    key = "grammar" if mode == "gbnf" else "json_schema"
+    return {key: GRAMMARS[schema][mode]}
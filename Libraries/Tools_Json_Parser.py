@@ -3,6 +3,8 @@
 import re
 import random
 
+from . import Tools_Json_Repair
+
 # ==============================
 
 def score_dict(_REQUIRED_SCORES) -> dict:
@@ -121,78 +123,5 @@ def cut_feedback(text):
 # 7) Hàm chính: sanitize & parse
 # -------------------------------------------------
 def sanitize_and_parse_critic(raw):
-    
-    chunk = extract_json_like(raw)
-    chunk = collapse_symbols(chunk)
-
-    m_fb = re.search(r'"feedback[_\s]*text"\s*:\s*"([^"]+)"', chunk, re.IGNORECASE)
-    fast_feedback = m_fb.group(1) if m_fb else None
-    if fast_feedback:
-        fast_feedback = cut_feedback(fast_feedback)
-
-    tokens = re.split(r'([{,}])', chunk)
-    
-    scoring = {}
-    feedback = ""
-    current_key = None
-    in_feedback = False
-
-    for tk in tokens:
-        tk = tk.strip()
-        if not tk:
-            continue
-
-        if ":" in tk:
-            parts = tk.split(":",1)
-            k = parts[0].strip().replace('"','').replace("'", "")
-            v = parts[1].strip().rstrip(",")
-
-            nk = normalize_key(k)
-            if nk:
-                current_key = nk
-
-                if nk == "feedback_text":
-                    in_feedback = True
-
-                    if v.startswith('"'):
-                        m = re.search(r'"([^"]+)"', chunk)
-                        if m:
-                            feedback = m.group(1)
-                            in_feedback = False
-                            current_key = None
-                            continue
-                        else:
-                            feedback += " " + v.lstrip('"')
-                            continue
-
-                nv = normalize_value(v)
-                if nk != "feedback_text" and nv is not None:
-                    scoring[nk] = nv
-                elif nk == "feedback_text":
-                    feedback += " " + v
-
-                continue
-
-        if in_feedback:
-            if tk not in "{}[]":
-                if tk != ",":
-                    feedback += " " + tk
-            continue
-
-        if current_key and current_key != "feedback_text":
-            nv = normalize_value(tk)
-            if nv is not None:
-                scoring[current_key] = nv
-                current_key = None
-
-    feedback = cut_feedback(feedback.strip())
-    if not feedback and fast_feedback:
-        feedback = fast_feedback
-
-    out = {"scoring":{}, "feedback_text":feedback}
-    for k in KEY_SIG:
-        if k == "feedback_text": 
-            continue
-        out["scoring"][k] = scoring.get(k, 3)
-
-    return out
+    """Parse output của critic → {"scoring": {6 tiêu chí}, "feedback_text"} (Tools_Json_Repair, một lượt)."""
+    return Tools_Json_Repair.parse_critic(raw).value
@@ -0,0 +1,467 @@
+# Libraries/Tools_Json_Repair.py
+
+import re
+import json
+
+from typing import Any, Dict, List, Optional
+
+# ==============================
+
+# Tools_Json_Repair.py
+# Bộ đọc JSON "dễ tính" MỘT LƯỢT (tuyến tính theo độ dài văn bản), dùng chung cho
+# ReasoningFlow và CriticalFlow thay cho các chuỗi regex sửa lỗi.
+#   - JSON hợp lệ       → json raw_decode (C), không sửa gì
+#   - JSON hỏng         → máy trạng thái đọc từng token, sửa ngay khi gặp:
+#       nháy cong “ ” ‘ ’, nháy đơn, key không nháy, dấu phẩy thừa/thiếu, thiếu ':',
+#       nháy kép lọt trong chuỗi, ký tự điều khiển, văn xuôi/``` trước-sau object,
+#       output bị cắt cụt (đóng chuỗi/ngoặc còn mở), key trùng (giữ giá trị sau)
+#   - Key sai chính tả  → map về key chuẩn theo chữ ký (KeyMatcher), mỗi key một lần
+# Kết quả: RepairResult(value, repairs, ok) — repairs là danh sách tên các bước sửa đã áp dụng.
+
+_WS = " \t\r\n"
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "'": "'"}
+_BARE_STOP = ",}]\n"
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_IDENT_RE = re.compile(r"[^\s:,{}\[\]\"'“”‘’]+")
+_SCORE_RE = re.compile(r"^\s*([1-5])(?:\.0+)?\s*(?:/\s*5)?\s*$")
+# sau dấu đóng chuỗi là một key mới ("key": ...) → chuỗi đã đóng, chỉ thiếu dấu phẩy
+_KEY_AHEAD_RE = re.compile(r"[\"“”'‘’][\w\s\-]{1,40}[\"“”'‘’]\s*:")
+
+# mở chuỗi → các ký tự có thể đóng chuỗi
+_CLOSERS = {'"': '"”', "“": "”\"“", "”": "”\"", "'": "'’", "‘": "’'", "’": "’'"}
+# đoạn ký tự "thường" trong chuỗi: bỏ qua một lần bằng regex (C) thay vì từng ký tự
+_PLAIN = {q: re.compile("[^" + re.escape(c) + r"\\\x00-\x1f]*") for q, c in _CLOSERS.items()}
+# độ sâu { / [ tối đa khi đọc; sâu hơn → coi như output bị cắt (không để RecursionError lọt ra)
+_MAX_DEPTH = 64
+# số key lạ tối đa được nhớ trong KeyMatcher; đầy → xoá hết, dò lại từ đầu
+_KEY_CACHE_SIZE = 1024
+
+
+class RepairResult:
+    """
+    value   : object đã đọc (dict; {} nếu không tìm thấy JSON)
+    repairs : các bước sửa đã áp dụng, theo thứ tự gặp (rỗng → JSON hợp lệ)
+    ok      : có tìm thấy một object JSON hay không
+    """
+
+    __slots__ = ("value", "repairs", "ok")
+
+    def __init__(self, value: Dict[str, Any], repairs: Optional[List[str]] = None, ok: bool = True):
+        self.value = value
+        self.repairs = repairs or []
+        self.ok = ok
+
+    @property
+    def clean(self) -> bool:
+        """JSON hợp lệ, không cần sửa."""
+        return self.ok and not self.repairs
+
+    def __repr__(self) -> str:
+        return f"RepairResult(ok={self.ok}, repairs={self.repairs!r}, value={self.value!r})"
+
+
+class KeyMatcher:
+    """
+    Map key (có thể sai chính tả) → key chuẩn theo chữ ký, ưu tiên:
+      trùng khớp (không phân biệt hoa/thường, '-'/' ' ≡ '_') > chứa chữ ký > chữ ký là dãy con.
+    Kết quả được cache theo key gốc → mỗi key lạ chỉ tốn một lần dò.
+    """
+
+    def __init__(self, signatures: Dict[str, str]):
+        self.signatures = signatures
+        self._cache: Dict[str, Optional[str]] = {}
+
+    @staticmethod
+    def _norm(key: str) -> str:
+        return re.sub(r"[\s\-]+", "_", key.strip().strip("\"'“”‘’").lower())
+
+    def __call__(self, key: str) -> Optional[str]:
+        hit = self._cache.get(key, False)
+        if hit is not False:
+            return hit
+        if len(self._cache) >= _KEY_CACHE_SIZE:
+            self._cache.clear()
+        k = self._norm(key)
+        found = k if k in self.signatures else None
+        if found is None:
+            found = next((c for c, sig in self.signatures.items() if sig in k), None)
+        if found is None:
+            found = next((c for c, sig in self.signatures.items() if _is_subsequence(sig, k)), None)
+        self._cache[key] = found
+        return found
+
+
+def _is_subsequence(pattern: str, text: str) -> bool:
+    it = iter(text)
+    return all(c in it for c in pattern)
+
+
+class _Scanner:
+    """Đọc đệ quy một lượt trên `text`; mọi chỗ phải sửa đều ghi vào self.repairs."""
+
+    __slots__ = ("text", "n", "i", "repairs", "depth")
+
+    def __init__(self, text: str, start: int = 0):
+        self.text = text
+        self.n = len(text)
+        self.i = start
+        self.repairs: List[str] = []
+        self.depth = 1
+
+    def note(self, repair: str):
+        if repair not in self.repairs:
+            self.repairs.append(repair)
+
+    def skip_ws(self):
+        text, n, i = self.text, self.n, self.i
+        while i < n and text[i] in _WS:
+            i += 1
+        self.i = i
+
+    # ---------------- VALUES ----------------
+    def value(self) -> Any:
+        self.skip_ws()
+        if self.i >= self.n:
+            self.note("truncated")
+            return None
+        c = self.text[self.i]
+        if c in "{[":
+            if self.depth >= _MAX_DEPTH:
+                # lồng quá sâu → bỏ phần còn lại, các tầng ngoài tự đóng như output bị cắt
+                self.note("truncated")
+                self.i = self.n
+                return None
+            self.i += 1
+            self.depth += 1
+            try:
+                return self.obj() if c == "{" else self.arr()
+            finally:
+                self.depth -= 1
+        if c in _CLOSERS:
+            return self.string()
+        if c == "-" or c.isdigit():
+            m = _NUMBER_RE.match(self.text, self.i)
+            if m:
+                self.i = m.end()
+                s = m.group(0)
+                return float(s) if ("." in s or "e" in s or "E" in s) else int(s)
+        return self.bare()
+
+    def obj(self, opened: bool = True) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        text = self.text
+        need_comma = trailing = False
+        while True:
+            self.skip_ws()
+            if self.i >= self.n:
+                if opened:
+                    self.note("truncated")
+                return out
+            c = text[self.i]
+            if c == "}":
+                self.i += 1
+                if trailing:
+                    self.note("trailing_comma")
+                return out
+            if c == "]":
+                self.note("bracket_mismatch")
+                self.i += 1
+                return out
+            if c == ",":
+                self.i += 1
+                if not need_comma:
+                    self.note("extra_comma")
+                need_comma, trailing = False, True
+                continue
+
+            # ---- key ----
+            if c in _CLOSERS:
+                key = self.string(key=True)
+            else:
+                m = _IDENT_RE.match(text, self.i)
+                if not m:
+                    self.note("stray_char")
+                    self.i += 1
+                    continue
+                key = m.group(0)
+                self.i = m.end()
+                self.note("unquoted_key")
+            if need_comma:
+                self.note("missing_comma")
+            need_comma, trailing = True, False
+
+            self.skip_ws()
+            if self.i < self.n and text[self.i] == ":":
+                self.i += 1
+            elif self.i >= self.n:
+                self.note("truncated")
+                return out
+            else:
+                self.note("missing_colon")
+
+            self.skip_ws()
+            if self.i >= self.n:
+                self.note("truncated")
+                return out
+            if key in out:
+                self.note("duplicate_key")
+            out[key] = self.value()
+
+    def arr(self) -> List[Any]:
+        out: List[Any] = []
+        text = self.text
+        need_comma = trailing = False
+        while True:
+            self.skip_ws()
+            if self.i >= self.n:
+                self.note("truncated")
+                return out
+            c = text[self.i]
+            if c == "]":
+                self.i += 1
+                if trailing:
+                    self.note("trailing_comma")
+                return out
+            if c == "}":
+                self.note("bracket_mismatch")
+                self.i += 1
+                return out
+            if c == ",":
+                self.i += 1
+                if not need_comma:
+                    self.note("extra_comma")
+                need_comma, trailing = False, True
+                continue
+            if need_comma:
+                self.note("missing_comma")
+            need_comma, trailing = True, False
+            out.append(self.value())
+
+    def string(self, key: bool = False) -> str:
+        text, n = self.text, self.n
+        quote = text[self.i]
+        if quote != '"':
+            self.note("single_quotes" if quote in "'‘’" else "smart_quotes")
+        closers = _CLOSERS[quote]
+        plain = _PLAIN[quote]
+        # sau dấu đóng chuỗi hợp lệ phải là: , } ] : xuống dòng hoặc hết văn bản
+        stops = ":" if key else ",}]:"
+        i = self.i + 1
+        parts: List[str] = []
+        while True:
+            j = plain.match(text, i).end()
+            if j > i:
+                parts.append(text[i:j])
+                i = j
+            if i >= n:
+                self.note("truncated")
+                break
+            c = text[i]
+            if c in closers:
+                k = i + 1
+                while k < n and text[k] in " \t":
+                    k += 1
+                if (k >= n or text[k] in stops or text[k] in "\r\n"
+                        or (not key and _KEY_AHEAD_RE.match(text, k))):
+                    i += 1
+                    break
+                # nháy lọt giữa chuỗi (vd. "he said "hi"") → giữ làm nội dung
+                self.note("inner_quote")
+                parts.append(c)
+                i += 1
+            elif c == "\\":
+                e = text[i + 1] if i + 1 < n else ""
+                if e == "u" and i + 6 <= n:
+                    try:
+                        parts.append(chr(int(text[i + 2:i + 6], 16)))
+                        i += 6
+                        continue
+                    except ValueError:
+                        pass
+                if e in _ESCAPES:
+                    parts.append(_ESCAPES[e])
+                    if e == "'":
+                        self.note("bad_escape")
+                else:
+                    self.note("bad_escape")
+                    parts.append(e)
+                i += 2
+            else:
+                # ký tự điều khiển thô (xuống dòng trong chuỗi...) → một dấu cách
+                self.note("control_char")
+                if not parts or not parts[-1].endswith(" "):
+                    parts.append(" ")
+                i += 1
+                while i < n and text[i] < " ":
+                    i += 1
+        self.i = i
+        return "".join(parts)
+
+    def bare(self) -> Any:
+        """Giá trị không nháy: true/false/null (cả True/None), số, hoặc chuỗi tới , } ] / xuống dòng."""
+        text, n, i = self.text, self.n, self.i
+        j = i
+        while j < n and text[j] not in _BARE_STOP:
+            j += 1
+        word = text[i:j].strip()
+        self.i = j
+        low = word.lower()
+        if low in ("true", "false"):
+            if word not in ("true", "false"):
+                self.note("python_literal")
+            return low == "true"
+        if low in ("null", "none"):
+            if word != "null":
+                self.note("python_literal")
+            return None
+        self.note("unquoted_value")
+        return word
+
+
+def repair_json(text: str) -> RepairResult:
+    """
+    Đọc object JSON đầu tiên trong `text` (có sửa lỗi).
+    Không có '{' nhưng có dạng "key": ... → đọc như thân object (missing_open_brace).
+    """
+    if not text or not isinstance(text, str):
+        return RepairResult({}, ["empty"], ok=False)
+
+    start = text.find("{")
+    if start >= 0:
+        try:
+            value, end = json.JSONDecoder().raw_decode(text, start)
+            if isinstance(value, dict):
+                repairs = _outer_repairs(text, start, end)
+                return RepairResult(value, repairs)
+        except (ValueError, RecursionError):
+            pass    # JSON hỏng / lồng quá sâu cho bộ đọc C → máy trạng thái (có giới hạn độ sâu)
+        scanner = _Scanner(text, start + 1)
+        value = scanner.obj()
+        repairs = _outer_repairs(text, start, scanner.i) + scanner.repairs
+        return RepairResult(value, repairs)
+
+    if ":" not in text:
+        return RepairResult({}, ["no_json"], ok=False)
+    scanner = _Scanner(text, 0)
+    value = scanner.obj(opened=False)
+    if not value:
+        return RepairResult({}, ["no_json"], ok=False)
+    return RepairResult(value, ["missing_open_brace"] + scanner.repairs)
+
+
+def _outer_repairs(text: str, start: int, end: int) -> List[str]:
+    out = []
+    head, tail = text[:start], text[end:]
+    if "```" in head or "```" in tail:
+        out.append("code_fence")
+    if head.replace("```json", "").replace("```", "").strip():
+        out.append("prose_prefix")
+    if tail.replace("```", "").strip():
+        out.append("trailing_text")
+    return out
+
+
+# ---------------- SCHEMAS ----------------
+REASONING_FIELDS = ["topic", "key_ideas", "filtered_ideas"]
+_REASONING_KEYS = KeyMatcher({
+    "reasoning": "reason",
+    "summary": "summ",
+    "topic": "topic",
+    "key_ideas": "key",
+    "filtered_ideas": "filter",
+})
+
+SCORE_KEYS = ["factuality", "clarity", "logical_coherence", "coverage", "utility", "consistency"]
+_CRITIC_KEYS = KeyMatcher({
+    "scoring": "scor",
+    "feedback_text": "feedback",
+    "factuality": "fact",
+    "clarity": "clar",
+    "logical_coherence": "coher",
+    "coverage": "cover",
+    "utility": "util",
+    "consistency": "consis",
+})
+
+_NUM_WORDS = {
+    "một": 1, "hai": 2, "ba": 3, "bốn": 4, "năm": 5,
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+}
+
+def _text(v: Any) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, str):
+        return v
+    if isinstance(v, (list, tuple)):
+        return ", ".join(_text(x) for x in v if _text(x))
+    if isinstance(v, dict):
+        return "; ".join(f"{k}: {_text(x)}" for k, x in v.items())
+    return str(v)
+
+def score_value(v: Any) -> Optional[int]:
+    """Điểm 1–5 từ số / "4/5" / "four"...; không hợp lệ → None."""
+    if isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float)):
+        return int(round(v)) if 1 <= v <= 5 else None
+    if isinstance(v, str):
+        m = _SCORE_RE.match(v)
+        if m:
+            return int(m.group(1))
+        return _NUM_WORDS.get(v.strip().lower())
+    return None
+
+def _flatten(obj: Dict[str, Any], matcher: KeyMatcher, nested: str, repairs: List[str]) -> Dict[str, Any]:
+    """Key chuẩn → giá trị; key con của `nested` (reasoning/scoring) được kéo lên cùng cấp."""
+    out: Dict[str, Any] = {}
+    fuzzy = False
+    for k, v in obj.items():
+        ck = matcher(str(k))
+        fuzzy = fuzzy or (ck is not None and ck != k)
+        if ck == nested and isinstance(v, dict):
+            for k2, v2 in v.items():
+                ck2 = matcher(str(k2))
+                fuzzy = fuzzy or (ck2 is not None and ck2 != k2)
+                if ck2 and ck2 != nested:
+                    out[ck2] = v2
+        elif ck and ck not in out:
+            out[ck] = v
+    if fuzzy:
+        repairs.append("fuzzy_key")
+    return out
+
+
+def parse_reasoning(raw: str) -> RepairResult:
+    """→ {"reasoning": {"topic", "key_ideas", "filtered_ideas"}, "summary"}, mọi trường là chuỗi."""
+    res = repair_json(raw)
+    repairs = list(res.repairs)
+    flat = _flatten(res.value, _REASONING_KEYS, "reasoning", repairs)
+    for k in REASONING_FIELDS + ["summary"]:
+        if k in flat and not isinstance(flat[k], str) and not (k != "summary" and isinstance(flat[k], list)):
+            repairs.append(f"coerced:{k}")
+    # danh sách ý (key_ideas: [...]) giữ nguyên như json.loads; kiểu khác → chuỗi
+    value = {
+        "reasoning": {k: flat[k] if isinstance(flat.get(k), list) else _text(flat.get(k)) for k in REASONING_FIELDS},
+        "summary": _text(flat.get("summary")),
+    }
+    return RepairResult(value, repairs, ok=res.ok)
+
+
+def parse_critic(raw: str, default_score: int = 3) -> RepairResult:
+    """→ {"scoring": {6 tiêu chí: số nguyên 1–5}, "feedback_text"}; thiếu điểm → default_score."""
+    res = repair_json(raw)
+    repairs = list(res.repairs)
+    flat = _flatten(res.value, _CRITIC_KEYS, "scoring", repairs)
+    scoring = {}
+    for k in SCORE_KEYS:
+        v = flat.get(k)
+        s = score_value(v)
+        if s is None:
+            repairs.append(f"default:{k}")
+            s = default_score
+        elif type(v) is not int:
+            repairs.append(f"coerced:{k}")
+        scoring[k] = s
+    value = {"scoring": scoring, "feedback_text": _text(flat.get("feedback_text"))}
+    return RepairResult(value, repairs, ok=res.ok)
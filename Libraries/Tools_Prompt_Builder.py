@@ -0,0 +1,92 @@
+# Libraries/Tools_Prompt_Builder.py
+
+import hashlib
+
+from typing import Optional, List, Dict, Any
+
+# ==============================
+
+# Tools_Prompt_Builder.py
+# Ghép prompt từ các segment để tối đa hóa KV-cache prefix reuse của llama.cpp:
+# - layout "prefix": segment ổn định (system prompt, văn bản gốc) đứng trước,
+#   segment thay đổi theo vòng (tóm tắt trước, phản hồi, điểm cũ...) đứng sau
+# - layout "legacy": giữ nguyên thứ tự thêm vào (thứ tự prompt cũ)
+
+LAYOUTS = ("prefix", "legacy")
+
+# Priority mặc định theo tên segment, dùng khi TokenBudget phải cắt prompt:
+# thấp bị cắt trước, >= PROTECTED không bao giờ bị cắt.
+PROTECTED = 100
+DEFAULT_PRIORITY = {
+    "system": PROTECTED,
+    "summary": 90,
+    "feedback": 80,
+    "prev_scores": 75,
+    "prev_feedback": 70,
+    "previous": 60,
+    "reasoning": 50,
+    "source": 40,
+}
+
+CHAT_OPEN = "<|user|>\n"
+CHAT_CLOSE = "\n<|end|>\n<|assistant|>"
+
+class PromptSegment:
+    __slots__ = ("name", "text", "stable", "priority")
+
+    def __init__(self, name: str, text: str, stable: bool = False, priority: int = 50):
+        self.name = name
+        self.text = text or ""
+        self.stable = stable
+        self.priority = priority
+
+    def __repr__(self) -> str:
+        return f"PromptSegment({self.name!r}, stable={self.stable}, chars={len(self.text)})"
+
+
+class PromptBuilder:
+    """
+    Ví dụ:
+        b = PromptBuilder("prefix")
+        b.add("system", sys_prompt, stable=True)
+        b.add("feedback", "\\n\\nPhản hồi:\\n\\n" + fb)
+        b.add("source", "\\n\\nVăn bản gốc:\\n\\n" + text, stable=True)
+        prompt = b.build()   # system → source → feedback
+    """
+
+    def __init__(self, layout: str = "prefix"):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown prompt layout: {layout!r} (expected one of {LAYOUTS})")
+        self.layout = layout
+        self.segments: List[PromptSegment] = []
+
+    def add(self, name: str, text: str, stable: bool = False, priority: Optional[int] = None) -> "PromptBuilder":
+        if text:
+            if priority is None:
+                priority = DEFAULT_PRIORITY.get(name, 50)
+            self.segments.append(PromptSegment(name, text, stable, priority))
+        return self
+
+    def ordered(self) -> List[PromptSegment]:
+        if self.layout == "legacy":
+            return list(self.segments)
+        # sort ổn định: giữ thứ tự tương đối trong từng nhóm
+        return [s for s in self.segments if s.stable] + [s for s in self.segments if not s.stable]
+
+    def build(self, chat: bool = True) -> str:
+        body = "".join(s.text for s in self.ordered()).strip()
+        return f"{CHAT_OPEN}{body}{CHAT_CLOSE}" if chat else body
+
+    def stable_prefix(self, chat: bool = True) -> str:
+        """Phần đầu prompt giống nhau giữa các vòng (chỉ có nghĩa với layout "prefix")."""
+        body = "".join(s.text for s in self.ordered() if s.stable).lstrip()
+        return f"{CHAT_OPEN}{body}" if chat else body
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [{"name": s.name, "stable": s.stable, "chars": len(s.text)} for s in self.ordered()]
+
+
+def slot_key(role: str, source_text: str) -> str:
+    """Khóa affinity ổn định cho (vai trò, bài viết) → cùng slot qua các vòng."""
+    digest = hashlib.sha1((source_text or "").encode("utf-8")).hexdigest()[:16]
+    return f"{role}:{digest}"
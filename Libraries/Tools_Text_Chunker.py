@@ -0,0 +1,72 @@
+# Libraries/Tools_Text_Chunker.py
+
+import re
+
+from typing import Callable, List, Optional
+
+from . import Tools_Token_Budget
+
+# ==============================
+
+# Tools_Text_Chunker.py
+# Cắt văn bản dài thành các đoạn (chunk) không vượt quá max_tokens,
+# ranh giới ở cuối câu; câu quá dài mới bị cắt theo từ.
+# count: hàm đếm token (vd. TokenBudget.count → /tokenize); mặc định ước lượng.
+
+# Cuối câu: . ! ? … (kèm ngoặc/nháy đóng) rồi khoảng trắng, hoặc dòng trống
+_SENTENCE_END = re.compile(r'(?<=[.!?…])["”’)\]]*\s+|\n\s*\n')
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text or "") if s and s.strip()]
+
+def _split_long(sentence: str, tokens: int, max_tokens: int, count: Callable[[str], int]) -> List[str]:
+    """Câu dài hơn max_tokens → cắt theo từ, mỗi phần ≤ max_tokens (đo lại từng phần)."""
+    words = sentence.split()
+    pieces: List[str] = []
+    per_piece = max(1, len(words) * max_tokens // max(tokens, 1))
+    i = 0
+    while i < len(words):
+        n = per_piece
+        piece = " ".join(words[i:i + n])
+        while n > 1 and count(piece) > max_tokens:
+            n = max(1, int(n * 0.9))
+            piece = " ".join(words[i:i + n])
+        pieces.append(piece)
+        i += n
+    return pieces
+
+def chunk_text(text: str,
+               max_tokens: int,
+               count: Optional[Callable[[str], int]] = None,
+               overlap_sentences: int = 0) -> List[str]:
+    """
+    Gom câu liên tiếp vào chunk cho đến khi chạm max_tokens.
+    overlap_sentences > 0 → lặp lại vài câu cuối của chunk trước ở đầu chunk sau.
+    """
+    count = count or Tools_Token_Budget.approx_token_count
+    max_tokens = max(1, int(max_tokens))
+
+    units: List[tuple] = []
+    for sentence in split_sentences(text):
+        n = count(sentence)
+        if n > max_tokens:
+            units.extend((p, count(p)) for p in _split_long(sentence, n, max_tokens, count))
+        else:
+            units.append((sentence, n))
+
+    chunks: List[str] = []
+    current: List[tuple] = []
+    size = 0
+    for unit in units:
+        if current and size + unit[1] > max_tokens:
+            chunks.append(" ".join(u[0] for u in current))
+            current = current[-overlap_sentences:] if overlap_sentences else []
+            size = sum(u[1] for u in current)
+            # overlap không được làm chunk sau vượt ngưỡng
+            while current and size + unit[1] > max_tokens:
+                size -= current.pop(0)[1]
+        current.append(unit)
+        size += unit[1]
+    if current:
+        chunks.append(" ".join(u[0] for u in current))
+    return chunks
@@ -0,0 +1,140 @@
+# Libraries/Tools_Token_Budget.py
+
+import hashlib
+import threading
+
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, List
+
+from . import Tools_Prompt_Builder
+
+# ==============================
+
+# Tools_Token_Budget.py
+# Đo token từng segment prompt bằng tokenizer của server (/tokenize, có cache cục bộ),
+# chỉnh n_predict vừa phần context còn lại, và khi vượt ngân sách thì cắt
+# (tất định) các segment có priority thấp nhất trước.
+
+PROTECTED = Tools_Prompt_Builder.PROTECTED
+
+def approx_token_count(text: str) -> int:
+    """Ước lượng khi không có /tokenize (~4 ký tự/token, tối thiểu theo số từ)."""
+    if not text:
+        return 0
+    return max(len(text.split()), (len(text) + 3) // 4)
+
+
+class TokenCounter:
+    """
+    Đếm token qua client.tokenize (LocalLlamaClient / LlamaClientPool), cache LRU theo hash nội dung.
+    Server không hỗ trợ /tokenize → dùng approx_token_count.
+    """
+
+    def __init__(self, client: Any = None, capacity: int = 4096):
+        self._tokenize: Optional[Callable[[str], Optional[List[int]]]] = getattr(client, "tokenize", None)
+        self.capacity = capacity
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._warned = False
+        self.stats = {"hits": 0, "misses": 0, "approx": 0}
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._cache[key]
+
+        tokens = self._tokenize(text) if self._tokenize else None
+        if tokens is None:
+            n = approx_token_count(text)
+            if not self._warned:
+                print("⚠️ Không dùng được /tokenize → ước lượng số token.")
+                self._warned = True
+            with self._lock:
+                self.stats["approx"] += 1
+        else:
+            n = len(tokens)
+
+        with self._lock:
+            self.stats["misses"] += 1
+            self._cache[key] = n
+            if len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+        return n
+
+
+class TokenBudget:
+    """
+    fit(builder, max_new_tokens) → n_predict vừa context, cắt segment nếu cần.
+
+    n_ctx          : context của một slot server (--ctx-size / --parallel, Processor_Models.slot_context)
+    min_new_tokens : tối thiểu phải chừa cho phần sinh; thiếu thì cắt prompt
+    safety_margin  : bù sai số tokenizer khi ghép segment + special tokens
+    """
+
+    def __init__(self,
+                 counter: TokenCounter,
+                 n_ctx: int = 4096,
+                 min_new_tokens: int = 256,
+                 safety_margin: int = 32):
+        self.counter = counter
+        self.n_ctx = n_ctx
+        self.min_new_tokens = min_new_tokens
+        self.safety_margin = safety_margin
+
+    def count(self, text: str) -> int:
+        return self.counter.count(text)
+
+    def _trim_text(self, text: str, tokens: int, keep_tokens: int) -> str:
+        """Cắt đuôi text còn ~keep_tokens token (đo lại, lùi dần 10% cho đến khi vừa)."""
+        if keep_tokens <= 0:
+            return ""
+        cut = int(len(text) * keep_tokens / max(tokens, 1))
+        while cut > 0:
+            candidate = text[:cut]
+            space = candidate.rfind(" ")
+            if space > cut // 2:
+                candidate = candidate[:space]
+            if self.counter.count(candidate) <= keep_tokens:
+                return candidate
+            cut = int(cut * 0.9)
+        return ""
+
+    def fit(self, builder: Tools_Prompt_Builder.PromptBuilder, max_new_tokens: int) -> Dict[str, Any]:
+        """
+        Sửa builder tại chỗ (cắt segment) và trả về:
+            {"n_predict", "prompt_tokens", "segments": {name: tokens}, "trimmed": {name: tokens_removed}}
+        """
+        overhead = self.counter.count(Tools_Prompt_Builder.CHAT_OPEN + Tools_Prompt_Builder.CHAT_CLOSE)
+        counts = {id(s): self.counter.count(s.text) for s in builder.segments}
+        prompt_tokens = overhead + sum(counts.values())
+        limit = self.n_ctx - self.safety_margin
+        trimmed: Dict[str, int] = {}
+
+        need = prompt_tokens + min(self.min_new_tokens, max_new_tokens) - limit
+        if need > 0:
+            # priority thấp trước; cùng priority → segment đứng sau trước (tất định)
+            order = sorted(enumerate(builder.segments), key=lambda p: (p[1].priority, -p[0]))
+            for _, seg in order:
+                if need <= 0 or seg.priority >= PROTECTED:
+                    break
+                before = counts[id(seg)]
+                seg.text = self._trim_text(seg.text, before, before - need)
+                after = self.counter.count(seg.text)
+                counts[id(seg)] = after
+                trimmed[seg.name] = before - after
+                need -= before - after
+
+            prompt_tokens = overhead + sum(counts.values())
+
+        n_predict = max(1, min(max_new_tokens, limit - prompt_tokens))
+        return {
+            "n_predict": n_predict,
+            "prompt_tokens": prompt_tokens,
+            "segments": {s.name: counts[id(s)] for s in builder.segments},
+            "trimmed": trimmed,
+        }
@@ -18,39 +18,53 @@ with open(CONFIG, "r", encoding="utf-8") as f:
 
 # CONFIG ======================================================
 model_dir = cfg['paths']['local_model_dir']
-publisher = cfg['models']['reasoning_model']['publisher']
-model_type = cfg['models']['reasoning_model']['model_type']
-hf_repo_id = cfg['models']['reasoning_model']['hf_repo_id']
-hf_filename = cfg['models']['reasoning_model']['hf_filename']
-
-MODEL_DIR = Path(BASE/model_dir/publisher/model_type)
-MODEL_FILE = hf_filename
-PORT = "8080"
+server_params = cfg.get('server_params', {})
+
 CONTAINER_NAME = "local-llama-gpu"
 IMAGE = "ghcr.io/ggerganov/llama.cpp:server-cuda"
-# ============================================================
 
-# Ensure model directory exists
-MODEL_DIR.mkdir(parents=True, exist_ok=True)
+# Mặc định chỉ chạy server của reasoning_model; critic dùng chung (một GPU).
+# models.critical_model.server_params.ports (+ client_params.hosts) → thêm server critic riêng,
+# chạy song song với reasoner (cần đủ VRAM cho hai model + KV cache, xem README).
+SERVERS = [("reasoning_model", "", [str(p) for p in server_params.get('ports', [8080])])]
+critic_ports = cfg['models'].get('critical_model', {}).get('server_params', {}).get('ports')
+if critic_ports:
+    SERVERS.append(("critical_model", "-critic", [str(p) for p in critic_ports]))
 
-model_path = MODEL_DIR / MODEL_FILE
+def role_server_params(role: str) -> dict:
+    # server_params chung, ghi đè bởi models.<role>.server_params (như Processor_Models.model_server_params)
+    return {**server_params, **cfg['models'].get(role, {}).get('server_params', {})}
 
-# Auto-download if missing
-if not model_path.exists():
-    print(f"❗ Model not found locally, downloading from HuggingFace: {hf_repo_id}")
-    try:
-        downloaded = hf_hub_download(
-            repo_id=hf_repo_id,
-            filename=hf_filename,
-            local_dir=MODEL_DIR,
-            local_dir_use_symlinks=False
-        )
-        print(f"✅ Downloaded model to: {downloaded}")
-    except Exception as e:
-        print(f"❌ Failed to download model: {e}")
-        sys.exit(1)
-else:
-    print(f"✅ Model found: {model_path}")
+# --ctx-size là tổng của mọi slot: mỗi slot (--parallel) có ctx_size / parallel token
+# → TokenBudget dùng Processor_Models.slot_context, client pool_size nên bằng parallel
+# ============================================================
+
+def ensure_model(model_cfg: dict) -> Path:
+    model_dir_path = Path(BASE/model_dir/model_cfg['publisher']/model_cfg['model_type'])
+    # Ensure model directory exists
+    model_dir_path.mkdir(parents=True, exist_ok=True)
+
+    model_path = model_dir_path / model_cfg['hf_filename']
+
+    # Auto-download if missing
+    if not model_path.exists():
+        print(f"❗ Model not found locally, downloading from HuggingFace: {model_cfg['hf_repo_id']}")
+        try:
+            downloaded = hf_hub_download(
+                repo_id=model_cfg['hf_repo_id'],
+                filename=model_cfg['hf_filename'],
+                local_dir=model_dir_path,
+                local_dir_use_symlinks=False
+            )
+            print(f"✅ Downloaded model to: {downloaded}")
+        except Exception as e:
+            print(f"❌ Failed to download model: {e}")
+            sys.exit(1)
+    else:
+        print(f"✅ Model found: {model_path}")
+    return model_path
+
+MODEL_PATHS = {role: ensure_model(cfg['models'][role]) for role, _, _ in SERVERS}
 
 # Ensure Docker Desktop is running
 def is_docker_running():
@@ -77,25 +91,41 @@ if not is_docker_running():
 
 print("✅ Docker is ready")
 
-print("🛑 Removing previous container (if any)")
-os.system(f"docker rm -f {CONTAINER_NAME} >nul 2>&1")
-
-cmd = (
-    f'docker run --gpus all --name {CONTAINER_NAME} -p {PORT}:8080 '
-    f'-e GGML_CUDA=1 -e GGML_CUDA_FORCE_MMQ=1 -e GGML_CUDA_SCRATCH_SIZE_MB=4096 '
-    f'-v "{MODEL_DIR}:/models" {IMAGE} '
-    f'--model /models/{MODEL_FILE} --n-gpu-layers 999 --ctx-size 4096'
-)
+def container_name(suffix: str, i: int) -> str:
+    # Giữ tên cũ cho server đầu tiên, các server sau thêm hậu tố
+    base = f"{CONTAINER_NAME}{suffix}"
+    return base if i == 0 else f"{base}-{i}"
+
+for role, suffix, ports in SERVERS:
+    model_path = MODEL_PATHS[role]
+    params = role_server_params(role)
+    ctx_size = params.get('ctx_size', 4096)
+    parallel = params.get('parallel', 1)
+    for i, port in enumerate(ports):
+        name = container_name(suffix, i)
+
+        print(f"🛑 Removing previous container {name} (if any)")
+        os.system(f"docker rm -f {name} >nul 2>&1")
+
+        cmd = (
+            f'docker run --gpus all --name {name} -p {port}:8080 '
+            f'-e GGML_CUDA=1 -e GGML_CUDA_FORCE_MMQ=1 -e GGML_CUDA_SCRATCH_SIZE_MB=4096 '
+            f'-v "{model_path.parent}:/models" {IMAGE} '
+            f'--model /models/{model_path.name} --n-gpu-layers 999 --ctx-size {ctx_size} --parallel {parallel}'
+        )
 
-print("🚀 Starting Llama server...")
-print(cmd)
+        print(f"🚀 Starting Llama server ({role}) on port {port} "
+              f"({parallel} slots × {ctx_size // max(1, parallel)} ctx)...")
+        print(cmd)
 
-subprocess.Popen(cmd, shell=True)
-time.sleep(3)
+        subprocess.Popen(cmd, shell=True)
+        time.sleep(3)
 
+urls = "\n".join(f"URL ({role}): http://localhost:{port}" for role, _, ports in SERVERS for port in ports)
+models = "\n".join(f"Model ({role}): {MODEL_PATHS[role].name}" for role, _, _ in SERVERS)
 print(f"""
 ✅ Llama server started!
-URL: http://localhost:{PORT}
-Model: {MODEL_FILE}
+{urls}
+{models}
 Press Ctrl+C to stop.
 """)
@@ -0,0 +1,78 @@
+# tests/test_analytics.py
+
+import random
+
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from Libraries import Common_Helpers as helpers
+from Libraries import Processor_Analytics
+
+# ==============================
+
+# RunAnalytics (vector) phải cho đúng số liệu như stage2_sort_and_count / helpers.average_score (từng mẫu)
+
+_STATS = ["reason_success_count", "reason_stable_count", "reason_fail_count",
+          "critic_success_count", "critic_stable_count", "critic_fail_count"]
+
+
+def _history(n=40, seed=0, duplicates=True):
+    """Lịch sử tổng hợp: số vòng khác nhau, vòng trùng số (duplicates), vòng lỗi, thiếu tiêu chí."""
+    rng = random.Random(seed)
+    history = {}
+    for i in range(n):
+        rounds = []
+        for step in range(rng.randint(1, 5)):
+            if rng.random() < 0.1:
+                rounds.append({"round": step, "error": "critic failed"})
+                continue
+            evaluation = {k: rng.randint(1, 5) for k in Processor_Analytics.SCORE_KEYS}
+            if rng.random() < 0.15:
+                evaluation.pop(rng.choice(Processor_Analytics.SCORE_KEYS))
+            rounds.append({"round": step, "evaluation": evaluation,
+                           "average_score": helpers.average_score({"scoring": evaluation})})
+        if duplicates and len(rounds) > 2 and rng.random() < 0.2:
+            # điểm đã ghi lệch với evaluation → chỉ dùng khi so với điểm đã ghi
+            rounds.append(dict(rounds[1], average_score=round(rng.uniform(1, 5), 4)))
+        rng.shuffle(rounds)
+        history[f"index_{i}"] = rounds
+    return history
+
+
+@pytest.fixture(scope="module")
+def history():
+    return _history()
+
+def test_stats_match_stage2(history):
+    expected = helpers.stage2_sort_and_count(OrderedDict(history))
+    stats = Processor_Analytics.RunAnalytics(history).stats()
+    assert list(stats.index) == sorted(history, key=helpers._get_sort_key)
+    for key, entry in expected.items():
+        assert stats.loc[key, _STATS].tolist() == [entry["stats"][c] for c in _STATS], key
+
+@pytest.mark.parametrize("min_improve", [0.0, 0.05, 0.5])
+def test_stats_follow_min_improve(history, min_improve):
+    stats = Processor_Analytics.RunAnalytics(history).stats(min_improve=min_improve)
+    for key, rounds in history.items():
+        scores = [r.get("average_score", 0.0) for r in sorted(rounds, key=lambda r: (r["round"], r.get("average_score", 0.0)))
+                  if r["round"] >= 1]
+        diffs = [b - a for a, b in zip(scores, scores[1:])]
+        assert stats.loc[key, "critic_success_count"] == sum(d >= min_improve for d in diffs)
+        assert stats.loc[key, "critic_fail_count"] == sum(d < 0 for d in diffs)
+
+def test_weighted_scores_match_average_score(history):
+    ra = Processor_Analytics.RunAnalytics(history)
+    frame = ra.frame
+    scores = ra.weighted_scores(helpers.WEIGHTS)
+    for (_, row), score in zip(frame.iterrows(), scores):
+        scoring = {k: row[k] for k in Processor_Analytics.SCORE_KEYS if not np.isnan(row[k])}
+        expected = helpers.average_score({"scoring": scoring}) if scoring else 0.0
+        assert score == pytest.approx(expected, abs=1e-4)
+
+def test_recorded_weights_change_nothing():
+    ra = Processor_Analytics.RunAnalytics(_history(duplicates=False))
+    swept = ra.sweep({"base": helpers.WEIGHTS}, min_improve=(0.1,))
+    assert swept.loc[0, "changed_best"] == 0
+    assert ra.stats(weights=helpers.WEIGHTS)[_STATS].equals(ra.stats()[_STATS])
@@ -0,0 +1,133 @@
+# tests/test_client_retry.py
+
+import time
+
+from Libraries import Client_Llama
+from Libraries import Client_Retry
+
+from Benchmarks.Fake_Llama_Server import FakeLlamaServer
+
+# ==============================
+
+
+# ---------------- RETRY BUDGET ----------------
+def test_budget_stops_at_max_attempts():
+    policy = Client_Retry.RetryPolicy(max_attempts=3, deadline=None)
+    with policy.scope() as budget:
+        assert [budget.acquire() for _ in range(4)] == [True, True, True, False]
+        assert budget.exhausted == "attempts"
+    stats = policy.stats()
+    assert stats["logical_calls"] == 1 and stats["attempts"] == 3
+    assert stats["exhausted_attempts"] == 1
+
+def test_budget_stops_at_deadline():
+    policy = Client_Retry.RetryPolicy(max_attempts=100, deadline=0.05)
+    with policy.scope() as budget:
+        assert budget.acquire()
+        time.sleep(0.06)
+        assert not budget.has_budget()
+        assert budget.exhausted == "deadline"
+        assert budget.backoff_delay() == 0.0
+
+def test_nested_scopes_share_one_budget():
+    policy = Client_Retry.RetryPolicy(max_attempts=4, deadline=None)
+    with policy.scope() as outer:
+        mark = outer.attempts
+        with policy.scope() as inner:
+            assert inner is outer
+            inner.acquire()
+            inner.acquire()
+        outer.settle(mark)      # tầng trong đã tiêu lượt → không tính thêm
+        assert outer.attempts == 2
+        mark = outer.attempts
+        outer.settle(mark)      # tầng trong không tiêu lượt nào → tính một lượt
+        assert outer.attempts == 3
+    assert Client_Retry.current_budget() is None
+    assert policy.stats()["logical_calls"] == 1
+
+def test_backoff_is_capped_without_jitter():
+    policy = Client_Retry.RetryPolicy(max_attempts=10, deadline=None, base_delay=0.5, max_delay=2.0, jitter=False)
+    with policy.scope() as budget:
+        delays = []
+        for _ in range(5):
+            budget.acquire()
+            delays.append(budget.backoff_delay())
+    assert delays == [0.5, 1.0, 2.0, 2.0, 2.0]
+
+
+# ---------------- CIRCUIT BREAKER ----------------
+def test_breaker_opens_after_threshold():
+    cb = Client_Retry.CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        cb.record_failure()
+        assert cb.state == "closed" and cb.allow()
+    cb.record_failure()
+    assert cb.state == "open"
+    assert not cb.allow()
+
+def test_success_resets_failure_count():
+    cb = Client_Retry.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    cb.record_failure()
+    cb.record_success()
+    cb.record_failure()
+    assert cb.state == "closed"
+
+def test_half_open_allows_one_probe_then_closes():
+    cb = Client_Retry.CircuitBreaker(failure_threshold=1, reset_timeout=0.02)
+    cb.record_failure()
+    assert not cb.allow()
+    time.sleep(0.03)
+    assert cb.allow()            # request thăm dò
+    assert cb.state == "half_open"
+    assert not cb.allow()        # chỉ một request thăm dò
+    cb.record_success()
+    assert cb.state == "closed" and cb.allow()
+
+def test_failed_probe_reopens():
+    cb = Client_Retry.CircuitBreaker(failure_threshold=1, reset_timeout=0.02)
+    cb.record_failure()
+    time.sleep(0.03)
+    assert cb.allow()
+    cb.record_failure()
+    assert cb.state == "open"
+    assert not cb.allow()
+
+def test_release_probe_allows_next_probe():
+    cb = Client_Retry.CircuitBreaker(failure_threshold=1, reset_timeout=0.02)
+    cb.record_failure()
+    time.sleep(0.03)
+    assert cb.allow()
+    cb.release_probe()           # thăm dò kết thúc mà không có kết quả
+    assert cb.state == "half_open"
+    assert cb.allow()
+
+
+# ---------------- CLIENT + BREAKER ----------------
+def _half_open_client(srv, **policy):
+    cb = Client_Retry.CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    client = Client_Llama.LocalLlamaClient(srv.url, wait_timeout=10, breaker=cb,
+                                           retry_policy=Client_Retry.RetryPolicy(**policy))
+    cb.record_failure()
+    time.sleep(0.02)
+    return client, cb
+
+def test_spent_budget_does_not_leak_probe():
+    with FakeLlamaServer().start() as srv:
+        client, cb = _half_open_client(srv, max_attempts=2, deadline=3)
+        with client.retry_policy.scope() as budget:
+            budget.acquire()
+            budget.acquire()
+            assert client("x", max_tokens=8)["error"] == Client_Retry.BUDGET_EXHAUSTED
+        assert not cb._probing
+        started = time.monotonic()
+        assert "error" not in client("x", max_tokens=8)
+        assert time.monotonic() - started < 1
+        assert cb.state == "closed"
+
+def test_half_open_wait_is_bounded_without_deadline():
+    with FakeLlamaServer().start() as srv:
+        client, cb = _half_open_client(srv, max_attempts=3, deadline=None)
+        assert cb.allow()            # request khác đang giữ lượt thăm dò
+        started = time.monotonic()
+        assert client("x", max_tokens=8)["error"] == Client_Retry.CIRCUIT_OPEN
+        assert time.monotonic() - started < 2
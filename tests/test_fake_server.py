@@ -0,0 +1,60 @@
+# tests/test_fake_server.py
+
+import threading
+
+import pytest
+
+from Libraries import Client_Llama
+from Libraries import Flow_Main as flow_main
+
+from Benchmarks.Bench_Pipeline import GEN_PARAMS, load_prompts, make_articles
+from Benchmarks.Fake_Llama_Server import FakeLlamaServer
+
+# ==============================
+
+# Server giả (CPU, không cần model): kiểm tra client và vòng lặp reasoning/critic đầu-cuối
+
+
+@pytest.fixture
+def server():
+    with FakeLlamaServer(slots=2, n_ctx=2048).start() as srv:
+        yield srv
+
+def _text(res):
+    return res["choices"][0]["text"]
+
+
+# ---------------- CLIENT ----------------
+def test_client_completion_and_props(server):
+    client = Client_Llama.LocalLlamaClient(server.url, wait_timeout=10)
+    res = client("Article: the council approved the budget.", max_tokens=64)
+    assert _text(res)
+    assert client.n_ctx == 2048
+
+def test_client_tokenize(server):
+    client = Client_Llama.LocalLlamaClient(server.url, wait_timeout=10)
+    assert len(client.tokenize("one two three")) > 0
+
+def test_pinned_slot_waits_for_its_own_slot(server):
+    client = Client_Llama.LocalLlamaClient(server.url, wait_timeout=10)
+    server.latency = 0.1
+    # hai request cùng id_slot → request sau chờ dù server còn slot rảnh
+    threads = [threading.Thread(target=client, args=("same article",), kwargs={"max_tokens": 8, "slot_key": "a#0"})
+               for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert server.snapshot()["slot_waits"] == 1
+
+
+# ---------------- FLOW ----------------
+def test_main_flow_end_to_end(server):
+    client = Client_Llama.LocalLlamaClient(server.url, wait_timeout=10)
+    main = flow_main.MainFlow(client, client, load_prompts(), GEN_PARAMS, GEN_PARAMS, verbose=False)
+    result = main.run(make_articles(1)[0], max_iters=2, min_improve=0.0, tag="#0")
+    iterations = result["history"]["iterations"]
+    assert iterations
+    assert not any("error" in r for r in iterations)
+    assert isinstance(result["best_score"], (int, float))
+    assert result["best_reasoning"]
@@ -0,0 +1,133 @@
+# tests/test_flow_batch.py
+
+import os
+import json
+import signal
+import asyncio
+
+import pytest
+
+from Libraries import Flow_Batch
+
+# ==============================
+
+
+class _FakeFlow:
+    """MainFlow giả: tag trong `flaky` lỗi ở lần đầu, trong `broken` luôn lỗi."""
+
+    separate_backends = False
+    reason_client = critic_client = None
+
+    def __init__(self, flaky=(), broken=(), interrupt=()):
+        self.flaky, self.broken, self.interrupt = set(flaky), set(broken), set(interrupt)
+        self.calls = {}
+
+    async def arun(self, source_text, max_iters=3, min_improve=0.1, tag=""):
+        self.calls[tag] = self.calls.get(tag, 0) + 1
+        if tag in self.broken or (tag in self.flaky and self.calls[tag] == 1):
+            raise RuntimeError(f"fail {tag}")
+        if tag in self.interrupt:
+            os.kill(os.getpid(), signal.SIGINT)     # Ctrl+C giữa batch
+            await asyncio.sleep(0.01)
+        return {"history": {"iterations": []}, "best_score": 4.0}
+
+def _articles(n):
+    return [(i, f"text {i}") for i in range(n)]
+
+def _run(flow, tmp_path, n, **kwargs):
+    kwargs.setdefault("max_consecutive_failures", 0)
+    return asyncio.run(Flow_Batch.run_resumable_async(flow, _articles(n), tmp_path / "h.json", **kwargs))
+
+
+# ---------------- MANIFEST ----------------
+def test_manifest_state_machine(tmp_path):
+    path = tmp_path / "m.jsonl"
+    with Flow_Batch.BatchManifest(path, fsync=False) as m:
+        assert m.started(1) == 1
+        m.done(1, score=4.0)
+        m.started(2)
+        m.failed(2, "boom")
+        assert m.started(2) == 2
+        m.started(3)
+    assert m.is_done(1) and not m.is_done(2)
+    assert m.in_progress() == [2, 3]
+    assert m.exhausted(2, max_attempts=2) and not m.exhausted(3, max_attempts=2)
+    assert not m.exhausted(1, max_attempts=1)
+
+def test_manifest_reload_and_truncated_line(tmp_path):
+    path = tmp_path / "m.jsonl"
+    with Flow_Batch.BatchManifest(path, fsync=False) as m:
+        m.started(1)
+        m.done(1)
+        m.started(2)
+        m.failed(2, "boom")
+    with open(path, "ab") as f:
+        f.write(b'{"index": 3, "event": "do')     # tiến trình chết giữa lúc ghi
+    with Flow_Batch.BatchManifest(path, fsync=False) as m:
+        assert m.completed() == [1]
+        assert m.failures() == {2: "boom"}
+        assert m.attempts == {1: 1, 2: 1}
+        assert 3 not in m.status
+        assert m.summary() == {"completed": 1, "failed": 1, "in_progress": 0}
+        assert m.started(2) == 2
+
+def test_done_clears_previous_error(tmp_path):
+    with Flow_Batch.BatchManifest(tmp_path / "m.jsonl", fsync=False) as m:
+        m.started(1)
+        m.failed(1, "boom")
+        m.started(1)
+        m.done(1)
+        assert m.failures() == {}
+        assert m.completed() == [1]
+
+
+# ---------------- RESUME ----------------
+def test_retries_until_success(tmp_path):
+    flow = _FakeFlow(flaky={"#2", "#5"}, broken={"#7"})
+    summary = _run(flow, tmp_path, 10, max_attempts=2)
+    assert summary["successful"] == 9
+    assert sorted(summary["retried"]) == [2, 5, 7]
+    assert set(summary["failed"]) == {7}
+    assert set(summary["remaining_failed"]) == {7}
+    assert flow.calls["#7"] == 2
+
+def test_resume_skips_done_and_exhausted(tmp_path):
+    _run(_FakeFlow(broken={"#3"}), tmp_path, 5, max_attempts=1)
+
+    flow = _FakeFlow()
+    summary = _run(flow, tmp_path, 6, max_attempts=1)
+    assert summary["skipped_done"] == 4
+    assert summary["skipped_exhausted"] == [3]
+    assert set(flow.calls) == {"#5"}
+
+    flow = _FakeFlow()
+    summary = _run(flow, tmp_path, 6, max_attempts=1, retry_exhausted=True)
+    assert set(flow.calls) == {"#3"}
+    assert summary["remaining_failed"] == {}
+
+def test_interrupted_item_is_rerun(tmp_path):
+    manifest = Flow_Batch.manifest_path_for(tmp_path / "h.json")
+    with Flow_Batch.BatchManifest(manifest, fsync=False) as m:
+        m.started(0)
+        m.done(0)
+        m.started(1)        # chết giữa chừng: không có done / failed
+    flow = _FakeFlow()
+    summary = _run(flow, tmp_path, 2)
+    assert summary["resumed_from"]["in_progress"] == 1
+    assert set(flow.calls) == {"#1"}
+    lines = [json.loads(line) for line in manifest.read_text(encoding="utf-8").splitlines()]
+    assert [ev["attempt"] for ev in lines if ev["index"] == 1 and ev["event"] == "started"] == [1, 2]
+
+def test_consecutive_failures_abort(tmp_path):
+    flow = _FakeFlow(broken={f"#{i}" for i in range(10)})
+    with pytest.raises(Flow_Batch.BatchAborted):
+        _run(flow, tmp_path, 10, max_attempts=1, max_consecutive_failures=3, max_in_flight=1)
+    assert len(flow.calls) < 10
+
+def test_ctrl_c_after_failure_returns_summary(tmp_path):
+    # max_consecutive_failures=0 (tắt ngưỡng) → dừng vì Ctrl+C không phải BatchAborted
+    flow = _FakeFlow(broken={"#0"}, interrupt={"#1"})
+    summary = _run(flow, tmp_path, 10, max_attempts=1, max_in_flight=1, handle_sigint=True)
+    assert summary["stopped_early"]
+    assert set(summary["remaining_failed"]) == {0}
+    assert len(flow.calls) < 10
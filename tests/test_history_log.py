@@ -0,0 +1,89 @@
+# tests/test_history_log.py
+
+import json
+
+import pytest
+
+from Libraries import Common_Helpers as helpers
+from Libraries import Store_History_Log
+
+# ==============================
+
+# compact() phải cho ra đúng từng byte như update_json_dict (đọc/ghi lại cả file mỗi mẫu)
+
+
+def _rounds(i, scores=(2.5, 3.0, 3.5)):
+    article = f"Article {i}: the council approved a budget of {1000 + i} units."
+    out = []
+    for step, score in enumerate(scores):
+        out.append({
+            "round": step,
+            "article:": article,
+            "reasoning": json.dumps({"reasoning": {"topic": f"t{i}", "key_ideas": "k", "filtered_ideas": "f"},
+                                     "summary": f"Tóm tắt {i}.{step}"}, ensure_ascii=False),
+            "evaluation": {"factuality": 3, "clarity": 4},
+            "average_score": score,
+            "feedback": "ok",
+        })
+    return out
+
+# index_10 trước index_2 → kiểm tra cả thứ tự sắp xếp theo số; index_2 được ghi lại (thay mẫu cũ)
+_WRITES = [("index_10", _rounds(10)), ("index_2", _rounds(2)), ("index_1", _rounds(1, (4.0, 3.0))),
+           ("index_2", _rounds(2, (3.0, 4.5)))]
+
+def _legacy(path):
+    for key, data in _WRITES:
+        helpers.update_json_dict(key, data, path)
+    return path.read_bytes()
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"segment_bytes": 1},           # mỗi mẫu một segment
+    {"dedup": True},
+    {"dedup": True, "compression": "gzip", "segment_bytes": 1},
+])
+def test_compaction_matches_update_json_dict(tmp_path, options):
+    expected = _legacy(tmp_path / "legacy.json")
+    path = tmp_path / "log.json"
+    log = Store_History_Log.HistoryLog(path, **options)
+    for key, data in _WRITES:
+        log.write(key, data)
+    log.close()
+    assert path.read_bytes() == expected
+    assert not log.sealed_segments()
+
+def test_compaction_appends_to_existing_history(tmp_path):
+    expected = _legacy(tmp_path / "legacy.json")
+    path = tmp_path / "log.json"
+    helpers.update_json_dict(*_WRITES[0], path)
+    log = Store_History_Log.HistoryLog(path)
+    for key, data in _WRITES[1:]:
+        log.write(key, data)
+    log.close()
+    assert path.read_bytes() == expected
+
+def test_load_sees_unsealed_writes(tmp_path):
+    path = tmp_path / "log.json"
+    log = Store_History_Log.HistoryLog(path)
+    for key, data in _WRITES:
+        log.write(key, data)
+    history = log.load()
+    assert list(history) == ["index_1", "index_2", "index_10"]
+    assert history["index_2"]["rounds"][-1]["average_score"] == 4.5
+    log.close()
+
+def test_truncated_last_line_is_skipped_after_crash(tmp_path):
+    path = tmp_path / "log.json"
+    log = Store_History_Log.HistoryLog(path)
+    log.write("index_1", _rounds(1))
+    log.write("index_2", _rounds(2))
+    active = log._active
+    log._file.close()           # giả lập tiến trình chết giữa lúc ghi dòng cuối
+    data = active.read_bytes()
+    active.write_bytes(data[: len(data) - 20])
+
+    recovered = Store_History_Log.HistoryLog(path)
+    recovered.close()
+    history = json.loads(path.read_text(encoding="utf-8"))
+    assert list(history) == ["index_1"]
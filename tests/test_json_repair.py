@@ -0,0 +1,97 @@
+# tests/test_json_repair.py
+
+import json
+
+import pytest
+
+from Libraries import Tools_Json_Repair
+
+# ==============================
+
+
+# ---------------- REPAIR_JSON ----------------
+def test_valid_json_needs_no_repair():
+    raw = '{"a": 1, "b": ["x", {"c": null}]}'
+    res = Tools_Json_Repair.repair_json(raw)
+    assert res.clean
+    assert res.value == json.loads(raw)
+
+@pytest.mark.parametrize("raw, repair, expected", [
+    ('```json\n{"a": 1}\n```', "code_fence", {"a": 1}),
+    ('Here it is: {"a": 1}', "prose_prefix", {"a": 1}),
+    ('{"a": 1} hope it helps', "trailing_text", {"a": 1}),
+    ('{"a": 1, "b": [1, 2,],}', "trailing_comma", {"a": 1, "b": [1, 2]}),
+    ('{“a”: “hi”}', "smart_quotes", {"a": "hi"}),
+    ("{'a': 'x'}", "single_quotes", {"a": "x"}),
+    ('{a: 1}', "unquoted_key", {"a": 1}),
+    ('{"a": two}', "unquoted_value", {"a": "two"}),
+    ('{"a": 1 "b": 2}', "missing_comma", {"a": 1, "b": 2}),
+    ('"a": 1, "b": 2}', "missing_open_brace", {"a": 1, "b": 2}),
+    ('{"a": True, "b": None}', "python_literal", {"a": True, "b": None}),
+    ('{"a": "say "hi" now", "b": 1}', "inner_quote", {"a": 'say "hi" now', "b": 1}),
+    ('{"a": "hello', "truncated", {"a": "hello"}),
+    ('{"a": {"b": [1, 2', "truncated", {"a": {"b": [1, 2]}}),
+])
+def test_corrupt_inputs_are_repaired(raw, repair, expected):
+    res = Tools_Json_Repair.repair_json(raw)
+    assert res.ok and not res.clean
+    assert repair in res.repairs
+    assert res.value == expected
+
+@pytest.mark.parametrize("raw", [
+    '{"a":' + "[" * 5000,
+    '{"a":' + "[" * 5000 + "]" * 5000 + "}",
+    '{"a": ' + '{"b": ' * 3000,
+])
+def test_deep_nesting_is_truncated_not_raised(raw):
+    res = Tools_Json_Repair.repair_json(raw)
+    assert res.ok and "truncated" in res.repairs
+    critic = Tools_Json_Repair.parse_critic(raw)
+    assert critic.value["scoring"] == {k: 3 for k in Tools_Json_Repair.SCORE_KEYS}
+    assert Tools_Json_Repair.parse_reasoning(raw).value["summary"] == ""
+
+@pytest.mark.parametrize("raw", ["", "no json here", None])
+def test_no_json(raw):
+    res = Tools_Json_Repair.repair_json(raw)
+    assert not res.ok
+    assert res.value == {}
+
+
+# ---------------- SCHEMAS ----------------
+def test_parse_critic_normalizes_keys_and_scores():
+    raw = ('{"scoring": {"factualty": "4/5", "Clarity": 5, "logical coherence": 3, '
+           '"coverage": "four", "utility": 9}, "feedback_text": "ok"')
+    res = Tools_Json_Repair.parse_critic(raw)
+    assert res.value == {
+        "scoring": {"factuality": 4, "clarity": 5, "logical_coherence": 3,
+                    "coverage": 4, "utility": 3, "consistency": 3},
+        "feedback_text": "ok",
+    }
+    for step in ("truncated", "fuzzy_key", "coerced:factuality", "coerced:coverage",
+                 "default:utility", "default:consistency"):
+        assert step in res.repairs
+
+def test_parse_critic_clean_only_for_exact_schema():
+    scoring = {k: 4 for k in Tools_Json_Repair.SCORE_KEYS}
+    raw = json.dumps({"scoring": scoring, "feedback_text": "fine"})
+    assert Tools_Json_Repair.parse_critic(raw).clean
+    assert not Tools_Json_Repair.parse_critic(f"```json\n{raw}\n```").clean
+
+def test_parse_reasoning_flattens_and_keeps_lists():
+    raw = '{"reasoning": {"Topic": "T", "key_ideas": ["a", "b"], "filtered ideas": "f"}, "summary": "S"'
+    res = Tools_Json_Repair.parse_reasoning(raw)
+    assert res.value == {"reasoning": {"topic": "T", "key_ideas": ["a", "b"], "filtered_ideas": "f"},
+                         "summary": "S"}
+    assert "truncated" in res.repairs
+
+def test_parse_reasoning_missing_fields_are_empty():
+    res = Tools_Json_Repair.parse_reasoning("sorry, I cannot help")
+    assert not res.ok
+    assert res.value == {"reasoning": {"topic": "", "key_ideas": "", "filtered_ideas": ""}, "summary": ""}
+
+def test_key_matcher_cache_is_bounded():
+    matcher = Tools_Json_Repair.KeyMatcher({"summary": "summ"})
+    for i in range(Tools_Json_Repair._KEY_CACHE_SIZE * 3):
+        matcher(f"unknown_{i}")
+    assert len(matcher._cache) <= Tools_Json_Repair._KEY_CACHE_SIZE
+    assert matcher("Summary") == "summary"
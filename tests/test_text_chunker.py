@@ -0,0 +1,46 @@
+# tests/test_text_chunker.py
+
+from Libraries import Tools_Text_Chunker
+
+# ==============================
+
+# Đếm token theo từ (tất định): mỗi từ = 1 token
+
+def _words(text):
+    return len(text.split())
+
+def _article(n_sentences=40):
+    return " ".join(f"Sentence {i} talks about item {i} in the report." for i in range(n_sentences))
+
+
+def test_chunks_stay_within_limit_and_keep_all_text():
+    text = _article()
+    chunks = Tools_Text_Chunker.chunk_text(text, 50, count=_words)
+    assert len(chunks) > 1
+    assert all(_words(c) <= 50 for c in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+def test_chunks_end_on_sentence_boundaries():
+    chunks = Tools_Text_Chunker.chunk_text(_article(), 50, count=_words)
+    assert all(c.endswith(".") for c in chunks)
+
+def test_short_text_is_one_chunk():
+    text = "One sentence. Another one."
+    assert Tools_Text_Chunker.chunk_text(text, 100, count=_words) == [text]
+
+def test_long_sentence_is_split_by_words():
+    text = " ".join(f"w{i}" for i in range(95)) + "."
+    chunks = Tools_Text_Chunker.chunk_text(text, 20, count=_words)
+    assert all(_words(c) <= 20 for c in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+def test_overlap_repeats_sentences_without_exceeding_limit():
+    text = _article(12)
+    chunks = Tools_Text_Chunker.chunk_text(text, 30, count=_words, overlap_sentences=1)
+    assert all(_words(c) <= 30 for c in chunks)
+    for prev, nxt in zip(chunks, chunks[1:]):
+        last = Tools_Text_Chunker.split_sentences(prev)[-1]
+        assert nxt.startswith(last)
+
+def test_empty_text():
+    assert Tools_Text_Chunker.chunk_text("", 10, count=_words) == []
@@ -0,0 +1,68 @@
+# tests/test_token_budget.py
+
+from Libraries import Tools_Prompt_Builder
+from Libraries import Tools_Token_Budget
+
+# ==============================
+
+# Đếm token theo từ (tất định, không cần server): mỗi từ = 1 token
+
+class _WordClient:
+    def tokenize(self, text):
+        return text.split()
+
+def _budget(n_ctx, min_new_tokens=16, safety_margin=0):
+    return Tools_Token_Budget.TokenBudget(Tools_Token_Budget.TokenCounter(_WordClient()), n_ctx=n_ctx,
+                                          min_new_tokens=min_new_tokens, safety_margin=safety_margin)
+
+def _builder(source_words, feedback_words=0):
+    b = Tools_Prompt_Builder.PromptBuilder("prefix")
+    b.add("system", "sys " * 10, stable=True)
+    if feedback_words:
+        b.add("feedback", " fb" * feedback_words)
+    b.add("source", " src" * source_words, stable=True)
+    return b
+
+
+def test_fits_without_trimming():
+    b = _builder(50)
+    before = b.build()
+    info = _budget(1000).fit(b, max_new_tokens=200)
+    assert info["trimmed"] == {}
+    assert info["n_predict"] == 200
+    assert b.build() == before
+
+def test_n_predict_shrinks_to_remaining_context():
+    budget = _budget(200)
+    b = _builder(100)
+    info = budget.fit(b, max_new_tokens=512)
+    assert info["trimmed"] == {}
+    assert info["prompt_tokens"] + info["n_predict"] == 200
+
+def test_trims_lowest_priority_first_and_keeps_min_new_tokens():
+    budget = _budget(150, min_new_tokens=32)
+    b = _builder(200, feedback_words=20)
+    info = budget.fit(b, max_new_tokens=512)
+    # source (40) bị cắt trước feedback (80); system (PROTECTED) không bao giờ bị cắt
+    assert set(info["trimmed"]) == {"source"}
+    assert info["segments"]["feedback"] == 20
+    assert info["segments"]["system"] == 10
+    assert info["n_predict"] >= 32
+    assert info["prompt_tokens"] + info["n_predict"] <= 150
+
+def test_protected_segments_are_never_trimmed():
+    budget = _budget(20, min_new_tokens=16)
+    b = Tools_Prompt_Builder.PromptBuilder("prefix")
+    b.add("system", "sys " * 30, stable=True)
+    info = budget.fit(b, max_new_tokens=64)
+    assert info["trimmed"] == {}
+    assert info["segments"]["system"] == 30
+    assert info["n_predict"] >= 1
+
+def test_trimming_is_deterministic():
+    results = []
+    for _ in range(2):
+        b = _builder(300, feedback_words=40)
+        _budget(120).fit(b, max_new_tokens=64)
+        results.append(b.build())
+    assert results[0] == results[1]